@@ -1,5 +1,10 @@
 # app.py
 import streamlit as st
+from utils.startup import boot, first_render
+
+# Landing page needs no openai/pydantic/yaml: warm them (and modules/prompts) in the
+# background while the user picks a tool
+boot()
 
 # --- Page config ---
 st.set_page_config(
@@ -94,3 +99,5 @@ st.markdown(
     "<small>💡 Use the in-page sidebars to switch modules (audit) or enter context (finance).</small>",
     unsafe_allow_html=True,
 )
+
+first_render("home")
@@ -1,10 +1,23 @@
 # pages/10_Audit_Clarity_Assistant.py
 
 import os
+import time
 import streamlit as st
-from openai import AzureOpenAI
+from utils.openai_client import POOL_MAX_CONNECTIONS, get_async_client, get_client
+from utils.batch import build_report, parse_notes, run_batch
+from utils.chunking import needs_chunking, run_long_review
+from utils.router import routed_completion, routed_stream
+from utils import diagnostics
+from utils.demos import lookup as demo_lookup, remember as demo_remember
+from utils.jobs import POLL_SECONDS, QueueFull, get_queue
+from utils.metrics import ensure_metrics_server, finish_trace, stage, start_trace, timed_fragment
 from utils.module_loader import load_module
-from utils.prompt_builder import build_prompt
+from utils.prescan import clean_review, highlight_html, is_trivially_clean, scan_note
+from utils.prompt_builder import build_prompt, prompt_version
+from utils.similarity import get_index
+from utils.startup import boot, first_render
+
+boot()  # background preload of openai/pydantic/modules/prompts (once per process)
 
 # Hide Streamlit's default multipage sidebar links on this page
 st.markdown(
@@ -54,12 +67,16 @@ def render_global_nav(active: str):
 st.title("Nonprofit Audit Clarity Assistant")
 render_global_nav(active="audit")  # show cross-links at the top of the sidebar
 
-# 🔐 Azure OpenAI client
-client = AzureOpenAI(
-    api_key=os.environ["AZURE_OPENAI_KEY"],
-    api_version=os.environ["AZURE_OPENAI_API_VERSION"],
-    azure_endpoint=os.environ["AZURE_OPENAI_ENDPOINT"]
-)
+# 🔐 Azure OpenAI client (process-wide, pooled; shared with the finance page).
+# Created on first use so the page renders without waiting on the openai import.
+def llm_client():
+    return get_client(
+        api_key=os.environ["AZURE_OPENAI_KEY"],
+        api_version=os.environ["AZURE_OPENAI_API_VERSION"],
+        endpoint=os.environ["AZURE_OPENAI_ENDPOINT"]
+    )
+
+ensure_metrics_server()  # serves /metrics when CLARITY_METRICS_PORT is set
 
 # ─────────────────────────────────────────────────────────────
 # Session state
@@ -74,6 +91,20 @@ if "selected_module_label" not in st.session_state:
     st.session_state.selected_module_label = "General Note Review"
 if "last_module_id" not in st.session_state:
     st.session_state.last_module_id = None
+if "audit_timing" not in st.session_state:
+    st.session_state.audit_timing = None
+if "audit_batch_results" not in st.session_state:
+    st.session_state.audit_batch_results = None
+if "audit_fanout_results" not in st.session_state:
+    st.session_state.audit_fanout_results = None
+if "audit_job_id" not in st.session_state:
+    st.session_state.audit_job_id = None
+
+def cancel_audit_job():
+    # A queued/running review is stale once the note or module changes
+    if st.session_state.get("audit_job_id"):
+        get_queue().cancel(st.session_state.audit_job_id)
+        st.session_state.audit_job_id = None
 
 # ─────────────────────────────────────────────────────────────
 # Module options
@@ -98,6 +129,16 @@ module_icons = {
 # ─────────────────────────────────────────────────────────────
 # Page-specific sidebar: Module selector
 # ─────────────────────────────────────────────────────────────
+def select_module(label: str):
+    # on_click callback: state is updated before the rerun the click already
+    # triggers, so no second st.rerun() pass is needed
+    st.session_state.selected_module_label = label
+    st.session_state.selected_module_id = module_options[label]
+    # Clear inputs/outputs on module switch
+    st.session_state.audit_user_text = ""
+    st.session_state.audit_result = None
+    cancel_audit_job()
+
 def render_sidebar_modules():
     with st.sidebar:
         # ⬇️ spacer to separate the global nav ("Clarity Assistant") from the audit section
@@ -127,13 +168,7 @@ def render_sidebar_modules():
                     unsafe_allow_html=True
                 )
             else:
-                if st.button(f"{icon} {label}", key=f"module_{label}"):
-                    st.session_state.selected_module_label = label
-                    st.session_state.selected_module_id = module_options[label]
-                    # Clear inputs/outputs on module switch
-                    st.session_state.audit_user_text = ""
-                    st.session_state.audit_result = None
-                    st.rerun()
+                st.button(f"{icon} {label}", key=f"module_{label}", on_click=select_module, args=(label,))
 
         st.markdown("---")
         st.markdown("<small><center>Built for clarity, simplicity, and action.</center></small>", unsafe_allow_html=True)
@@ -153,6 +188,7 @@ render_sidebar_modules()
 # ─────────────────────────────────────────────────────────────
 selected_id = st.session_state.selected_module_id
 selected_label = st.session_state.selected_module_label
+trace = start_trace("audit", module_id=selected_id)  # per-stage timings for this run
 module_data = load_module(selected_id)
 
 sample_note = module_data.get("sample_note", "").strip()
@@ -183,13 +219,43 @@ with col2:
             "which may or may not be recognized in the financial statements."
         )
         st.session_state.audit_result = None
+        st.session_state.audit_fanout_results = None
+        cancel_audit_job()
         st.rerun()
 with col3:
     if st.button("Reset", use_container_width=True, key="audit_reset"):
         st.session_state.audit_user_text = ""
         st.session_state.audit_result = None
+        st.session_state.audit_fanout_results = None
+        cancel_audit_job()
         st.rerun()
 
+opt1, opt2, opt3 = st.columns([1, 1, 1])
+with opt1:
+    stream_output = st.toggle(
+        "Stream output",
+        value=True,
+        key="audit_stream",
+        help="Render the review as it is generated instead of waiting for the full answer.",
+    )
+with opt2:
+    bypass_cache = st.checkbox(
+        "Skip cached result",
+        key="audit_bypass_cache",
+        help="Always call the model, even if this exact or a near-identical note was reviewed before.",
+    )
+with opt3:
+    all_modules = st.toggle(
+        "All modules",
+        key="audit_all_modules",
+        help="Review this note against every module at once; results appear in tabs as they finish.",
+    )
+
+# "Run a fresh review" on a reused near-duplicate review re-runs without the lookup
+force_fresh = st.session_state.pop("audit_force_fresh", False)
+run = run or force_fresh
+bypass_cache = bypass_cache or force_fresh
+
 # ─────────────────────────────────────────────────────────────
 # Main input (bind only by key; no value= to avoid conflicts)
 # ─────────────────────────────────────────────────────────────
@@ -199,26 +265,373 @@ user_text = st.text_area(
     key="audit_user_text"
 )
 
+# Local vague-language pre-scan (offline, microseconds; refreshed on every edit)
+spans = []
+if user_text.strip():
+    scan_started = time.perf_counter()
+    with stage("prescan"):
+        spans = scan_note(user_text)
+    scan_us = (time.perf_counter() - scan_started) * 1e6
+    if spans:
+        st.markdown(f"🔎 **{len(spans)} vague phrase(s)** flagged locally ({scan_us:.0f} µs) — hover for hints:")
+        with st.container(border=True):
+            st.markdown(highlight_html(user_text, spans), unsafe_allow_html=True)
+    else:
+        st.caption(f"🔎 No vague phrases flagged by the local pre-scan ({scan_us:.0f} µs).")
+
 # ─────────────────────────────────────────────────────────────
 # Call model (stores output in session_state.audit_result)
 # ─────────────────────────────────────────────────────────────
-if run and user_text.strip():
-    messages = build_prompt(module_data, user_text)
-    try:
-        with st.spinner("Reviewing…"):
-            response = client.chat.completions.create(
-                model=os.environ["AZURE_OPENAI_DEPLOYMENT"],
-                messages=messages
+def render_timing(timing):
+    if not timing:
+        return
+    ttft = timing.get("ttft")
+    parts = []
+    if ttft is not None:
+        parts.append(f"first token {ttft:.2f}s")
+    parts.append(f"total {timing.get('total', 0):.2f}s")
+    if timing.get("parts"):
+        parts.append(f"{timing['parts']} parts")
+    if timing.get("escalated"):
+        parts.append(f"escalated to the large model ({timing['escalated']})")
+    elif timing.get("tier") == "small":
+        parts.append("small model")
+    if timing.get("prescan"):
+        parts.append("local pre-scan, no model call")
+    elif timing.get("demo"):
+        parts.append("precomputed demo")
+    elif timing.get("similar") is not None:
+        parts.append(f"reused {timing['similar']:.0%} match")
+    elif timing.get("cached"):
+        parts.append("cached")
+    elif timing.get("coalesced"):
+        parts.append("shared an identical in-flight request")
+    st.caption("⏱️ " + " · ".join(parts))
+
+def render_fanout_tab(row):
+    if row["status"] != "ok":
+        st.error(f"❌ {row['review']}")
+        return
+    st.write(row["review"])
+    st.caption(
+        f"⏱️ {row['seconds']:.2f}s"
+        + (" · cached" if row.get("cached") else "")
+        + (" · small model" if row.get("tier") == "small" else "")
+    )
+
+def review_job(client, module_data, module_id, note, *, model, stream, bypass_cache, demo=False):
+    """
+    Build the job body for one review. It runs on a job worker thread, so it
+    never touches st.*: partial output goes to job.progress for the poller.
+    With demo=True (the module's sample_note) the answer is written back to
+    the precomputed demo artifact.
+    """
+    def run(job):
+        started = time.perf_counter()
+        if needs_chunking(note):
+            # Long note: review overlapping chunks concurrently, then merge the findings
+            review = run_long_review(
+                get_async_client,
+                module_data,
+                note,
+                model=model,
+                bypass_cache=bypass_cache,
+                on_chunk=lambda done, total: job.progress.update(done=done, total=total),
+            )
+            text = review["text"]
+            if review["failed"]:
+                text += (
+                    f"\n_⚠️ {review['failed']} of {review['chunks']} parts could not be reviewed; "
+                    "findings for those parts are missing._\n"
+                )
+            elapsed = time.perf_counter() - started
+            timing = {"ttft": elapsed, "total": elapsed, "cached": False, "parts": review["chunks"]}
+        elif stream:
+            messages = build_prompt(module_data, note)
+            s = routed_stream(
+                client,
+                kind="audit",
+                note=note,
+                model=model,
+                module_id=module_id,
+                messages=messages,
+                bypass_cache=bypass_cache,
+                # Small tier's answer failed the section check: drop it, the large tier's follows
+                on_escalate=lambda reason: job.progress.update(text="", escalated=reason),
             )
-        st.session_state.audit_result = response.choices[0].message.content
+            for delta in s:
+                job.check()
+                job.progress["text"] = job.progress.get("text", "") + delta
+            text = s.text
+            timing = {
+                "ttft": s.ttft, "total": s.elapsed, "cached": s.cached, "coalesced": s.coalesced,
+                "tier": s.tier, "escalated": s.escalated,
+            }
+        else:
+            messages = build_prompt(module_data, note)
+            result = routed_completion(
+                client,
+                kind="audit",
+                note=note,
+                model=model,
+                module_id=module_id,
+                messages=messages,
+                bypass_cache=bypass_cache,
+            )
+            text = result.text
+            # Non-streamed: the first visible token *is* the full answer
+            elapsed = time.perf_counter() - started
+            timing = {
+                "ttft": elapsed, "total": elapsed, "cached": result.cached, "coalesced": result.coalesced,
+                "tier": result.tier, "escalated": result.escalated,
+            }
+        if demo and "parts" not in timing:
+            demo_remember(messages, text, kind="audit", model=model, module_id=module_id)
+        return {"text": text, "timing": timing, "module_id": module_id, "note": note,
+                "version": prompt_version(module_data)}
+    return run
+
+# Fragment: only the status panel reruns on each poll; a finished job
+# triggers one full rerun so the persisted output below renders it
+@st.fragment(run_every=POLL_SECONDS)
+@timed_fragment("audit", "job_poll")
+def render_audit_job():
+    queue = get_queue()
+    job = queue.get(st.session_state.audit_job_id)
+    if job is None:  # expired from the registry (or the server restarted)
+        st.session_state.audit_job_id = None
+        st.rerun()
+    if not job.done:
+        st.markdown("### 🤖 GPT-4o Output")
+        status_col, cancel_col = st.columns([4, 1])
+        with status_col:
+            verb = "Queued" if job.status == "queued" else "Reviewing"
+            st.caption(f"⏳ {verb}… {job.elapsed:.1f}s · job `{job.id}`")
+        with cancel_col:
+            if st.button("Cancel", key="audit_job_cancel", use_container_width=True):
+                cancel_audit_job()
+                st.rerun()
+        progress = dict(job.progress)
+        if progress.get("total"):
+            st.progress(progress["done"] / progress["total"], text=f"{progress['done']} / {progress['total']} parts reviewed")
+        elif progress.get("text"):
+            st.markdown(progress["text"] + " ▌")
+        if progress.get("escalated"):
+            st.caption(f"↗️ Retrying on the large model: the quick draft was {progress['escalated']}.")
+        return
+
+    st.session_state.audit_job_id = None
+    if job.status == "done":
+        st.session_state.audit_result = job.result["text"]
+        st.session_state.audit_timing = job.result["timing"]
+        get_index().add(job.result["module_id"], job.result["note"], job.result["text"], job.result["version"])
         st.toast("Review complete.")
-    except Exception as e:
-        st.error(f"❌ Error calling Azure OpenAI: {e}")
+    elif job.status == "timeout":
+        st.session_state.audit_job_notice = ("warning", f"⌛ The review timed out after {job.timeout:.0f}s. Please try again.")
+    elif job.status == "error":
+        st.session_state.audit_job_notice = ("error", f"❌ Error calling Azure OpenAI: {job.error}")
+    st.rerun()
+
+fanout_now = False
+if run and user_text.strip() and all_modules:
+    # One note × every module: all calls in flight at once, so wall time ≈ slowest call
+    items = [{"id": label, "module_id": mid, "note": user_text} for label, mid in module_options.items()]
+    st.markdown("### 🤖 GPT-4o Output · all modules")
+    tabs = st.tabs([f"{module_icons[label]} {label}" for label in module_options])
+    slots = {}
+    for tab, label in zip(tabs, module_options):
+        with tab:
+            slots[label] = st.empty()
+            slots[label].info("⏳ Reviewing…")
+
+    def on_module_result(row):
+        with slots[row["id"]].container():
+            render_fanout_tab(row)
+
+    started = time.perf_counter()
+    with stage("fanout"):
+        rows = run_batch(
+            get_async_client,
+            items,
+            model=os.environ["AZURE_OPENAI_DEPLOYMENT"],
+            concurrency=len(items),
+            bypass_cache=bypass_cache,
+            on_result=on_module_result,
+        )
+    elapsed = time.perf_counter() - started
+    st.session_state.audit_fanout_results = rows
+    st.session_state.audit_result = None
+    st.session_state.audit_timing = {"ttft": None, "total": elapsed, "cached": all(r.get("cached") for r in rows)}
+    render_timing(st.session_state.audit_timing)
+    fanout_now = True
+    st.toast("All module reviews complete.")
+elif run and user_text.strip():
+    st.session_state.audit_fanout_results = None
+    # Opt-in (PRESCAN_SKIP_CLEAN=1): no listed vague phrase and already specific? Answer locally.
+    # Otherwise: near-duplicate of a note reviewed before (boilerplate with small edits)?
+    lookup_started = time.perf_counter()
+    clean = not force_fresh and is_trivially_clean(user_text, spans)
+    # The module's sample_note ("Try Demo"): served from the precomputed demo artifact
+    is_demo = bool(sample_note) and user_text.strip() == sample_note
+    demo = None
+    if is_demo and not (clean or bypass_cache or force_fresh):
+        demo = demo_lookup(build_prompt(module_data, user_text))
+    match = None if (clean or demo or bypass_cache or force_fresh) else get_index().lookup(
+        selected_id, user_text, prompt_version(module_data))
+    if clean:
+        st.session_state.audit_result = clean_review()
+        elapsed = time.perf_counter() - lookup_started
+        st.session_state.audit_timing = {"ttft": elapsed, "total": elapsed, "cached": False, "prescan": True}
+        trace.attrs["prescan"] = "clean"
+    elif demo is not None:
+        st.session_state.audit_result = demo["text"]
+        elapsed = time.perf_counter() - lookup_started
+        st.session_state.audit_timing = {"ttft": elapsed, "total": elapsed, "cached": True, "demo": True}
+        trace.attrs["demo"] = True
+    elif match is not None:
+        lookup_s = time.perf_counter() - lookup_started
+        st.session_state.audit_result = match.review
+        st.session_state.audit_timing = {
+            "ttft": lookup_s, "total": lookup_s, "cached": True,
+            "similar": match.score, "similar_preview": match.note_preview,
+        }
+        trace.attrs["similar"] = round(match.score, 3)
+    else:
+        try:
+            cancel_audit_job()
+            job = get_queue().submit("audit", review_job(
+                llm_client(),
+                module_data,
+                selected_id,
+                user_text,
+                model=os.environ["AZURE_OPENAI_DEPLOYMENT"],
+                stream=stream_output,
+                bypass_cache=bypass_cache,
+                demo=is_demo,
+            ), module_id=selected_id)
+            st.session_state.audit_job_id = job.id
+            st.session_state.audit_result = None
+            trace.attrs["job_id"] = job.id
+        except QueueFull as e:
+            st.error(f"⏳ The review queue is full ({e}). Please try again in a moment.")
+        except Exception as e:
+            st.error(f"❌ Error calling Azure OpenAI: {e}")
+
+# Queued/running review: poll it without blocking the rest of the page
+if st.session_state.audit_job_id:
+    render_audit_job()
+
+notice = st.session_state.pop("audit_job_notice", None)
+if notice:
+    getattr(st, notice[0])(notice[1])
 
 # ─────────────────────────────────────────────────────────────
 # Render persisted output (doesn't vanish on reruns)
 # ─────────────────────────────────────────────────────────────
 if st.session_state.audit_result:
-    with st.container():
+    with st.container(), stage("render"):
         st.markdown("### 🤖 GPT-4o Output")
+        timing = st.session_state.audit_timing or {}
+        if timing.get("prescan"):
+            st.info("🔎 No listed vague phrases found by the local pre-scan; the model was not called "
+                    "and the note was not reviewed for disclosure gaps.")
+        elif timing.get("similar") is not None:
+            st.info(
+                f"🔁 Reused the review of a {timing['similar']:.0%} similar note reviewed earlier: "
+                f"“{timing.get('similar_preview', '')}…”"
+            )
+        if timing.get("prescan") or timing.get("similar") is not None:
+            st.button(
+                "Run a fresh review" if timing.get("similar") is not None else "Review with GPT-4o anyway",
+                key="audit_fresh",
+                on_click=lambda: st.session_state.update(audit_force_fresh=True),
+            )
         st.write(st.session_state.audit_result)
+        render_timing(st.session_state.audit_timing)
+
+if st.session_state.audit_fanout_results and not fanout_now:
+    with st.container(), stage("render"):
+        st.markdown("### 🤖 GPT-4o Output · all modules")
+        rows = st.session_state.audit_fanout_results
+        for tab, row in zip(st.tabs([f"{module_icons[r['id']]} {r['id']}" for r in rows]), rows):
+            with tab:
+                render_fanout_tab(row)
+        render_timing(st.session_state.audit_timing)
+
+# ─────────────────────────────────────────────────────────────
+# Bulk review: upload many notes, review them concurrently
+# ─────────────────────────────────────────────────────────────
+BATCH_COLUMNS = ["#", "id", "module_id", "status", "seconds", "cached", "tier", "review"]
+
+# Fragment: slider/uploader changes and bulk runs redraw only this panel
+@st.fragment
+@timed_fragment("audit", "bulk_review")
+def render_bulk_review():
+    with st.expander("📦 Bulk review (CSV / JSONL / Markdown)"):
+        st.caption(
+            "CSV/JSONL: one note per row with a `note` column and optional `id` and `module` "
+            "(module ID or name). Markdown: one note per heading; the heading may name a module. "
+            f"Notes without a module use **{selected_label}**."
+        )
+        upload = st.file_uploader("Notes file", type=["csv", "jsonl", "ndjson", "md", "markdown", "txt"], key="audit_batch_file")
+        concurrency = st.slider(
+            "Concurrent requests",
+            min_value=1,
+            max_value=POOL_MAX_CONNECTIONS,  # more would only queue for a pooled connection
+            value=min(int(os.environ.get("AUDIT_BATCH_CONCURRENCY", "8")), POOL_MAX_CONNECTIONS),
+            key="audit_batch_concurrency",
+        )
+        run_bulk = st.button("Review all notes", key="audit_batch_run", disabled=upload is None)
+
+        if run_bulk and upload is not None:
+            try:
+                items = parse_notes(upload.name, upload.getvalue(), module_options, selected_id)
+            except Exception as e:
+                items = None  # unreadable: the error below is the whole message
+                st.error(f"❌ Could not read {upload.name}: {e}")
+
+            if items:
+                progress = st.progress(0.0, text=f"0 / {len(items)} reviewed")
+                table = st.empty()
+                done = []
+
+                def on_result(row):
+                    done.append(row)
+                    progress.progress(len(done) / len(items), text=f"{len(done)} / {len(items)} reviewed")
+                    table.dataframe(sorted(done, key=lambda r: r["#"]), column_order=BATCH_COLUMNS, use_container_width=True)
+
+                st.session_state.audit_batch_results = run_batch(
+                    get_async_client,
+                    items,
+                    model=os.environ["AZURE_OPENAI_DEPLOYMENT"],
+                    concurrency=concurrency,
+                    bypass_cache=bypass_cache,
+                    on_result=on_result,
+                )
+                table.empty()
+                progress.empty()
+            elif items is not None:
+                st.warning("No notes found in the uploaded file.")
+
+        rows = st.session_state.audit_batch_results
+        if rows:
+            failed = sum(1 for r in rows if r["status"] != "ok")
+            st.markdown(f"**{len(rows)} notes reviewed** ({failed} failed)")
+            st.dataframe(rows, column_order=BATCH_COLUMNS, use_container_width=True)
+            titles = {mid: label for label, mid in module_options.items()}
+            st.download_button(
+                "Download report (Markdown)",
+                data=build_report(rows, titles),
+                file_name="audit_review_report.md",
+                mime="text/markdown",
+                key="audit_batch_download",
+            )
+
+render_bulk_review()
+
+# ─────────────────────────────────────────────────────────────
+# Close this run's trace (metrics / JSONL) and optional debug panel
+# ─────────────────────────────────────────────────────────────
+finish_trace(trace)
+diagnostics.render_debug_panel(trace)
+first_render("audit")
@@ -3,10 +3,22 @@
 import os
 import json
 import datetime
+import time
+import traceback
 import streamlit as st
 from utils import diagnostics
-from openai import AzureOpenAI
-from utils.module_loader import load_module  # loads .md files by dotted path (e.g., "prompts.finance.clarifier.system")
+from utils.demos import FINANCE_DEMO_TEXT
+from utils.demos import lookup as demo_lookup, remember as demo_remember
+from utils.finance_sim import month_label, parse_inputs, simulate, sweep
+from utils.jobs import POLL_SECONDS, QueueFull, get_queue
+from utils.openai_client import get_client
+from utils.router import routed_completion, routed_stream
+from utils.json_stream import PlanStreamParser
+from utils.metrics import REGISTRY, annotate, ensure_metrics_server, finish_trace, stage, start_trace, timed_fragment
+from utils.prompt_builder import finance_request  # loads prompts/finance/clarifier/* via load_module
+from utils.startup import boot, first_render
+
+boot()  # background preload of openai/pydantic/modules/prompts (once per process)
 
 # Hide Streamlit's default multipage sidebar links on this page
 st.markdown(
@@ -59,6 +71,20 @@ if "finance_user_text" not in st.session_state:
 # optional: will hold values the user enters in the refinement expander (applied on next run)
 if "finance_pending" not in st.session_state:
     st.session_state.finance_pending = None
+if "finance_job_id" not in st.session_state:
+    st.session_state.finance_job_id = None
+# payoff/savings report computed locally from the context numbers (utils.finance_sim)
+if "finance_sim" not in st.session_state:
+    st.session_state.finance_sim = None
+# what-if scenario the user committed to ({"cut", "extra", "rate"}); applied to the next plan
+if "finance_scenario" not in st.session_state:
+    st.session_state.finance_scenario = None
+
+def cancel_finance_job():
+    # A queued/running plan is stale once the inputs are reset or re-run
+    if st.session_state.get("finance_job_id"):
+        get_queue().cancel(st.session_state.finance_job_id)
+        st.session_state.finance_job_id = None
 
 # If we have pending refined values, apply them BEFORE widgets are created
 if st.session_state.finance_pending:
@@ -75,7 +101,7 @@ if st.session_state.finance_pending:
     st.session_state.finance_pending = None  # clear handoff
 
 # ---------- Small UI helpers ----------
-def render_action_card(a: dict):
+def render_action_card(a: dict, interactive: bool = True):
     step = a.get("step", "")
     title = (a.get("title") or "").strip()
     details = (a.get("details") or "").strip()
@@ -105,7 +131,9 @@ def render_action_card(a: dict):
                     row += "<span style='padding:2px 8px;border-radius:9999px;background:#dcfce7;color:#166534;font-size:12px;margin-right:6px'>Due: " + due + "</span>"
                 st.markdown(row, unsafe_allow_html=True)
         with cols[2]:
-            st.checkbox("Done", key=f"done_{step}_{title}")
+            # Streaming previews skip the widget so keys don't clash with the final render
+            if interactive:
+                st.checkbox("Done", key=f"done_{step}_{title}")
 
         if details:
             st.markdown(
@@ -134,11 +162,17 @@ def _safe_api_version(v: str) -> str:
 
 api_version = _safe_api_version(api_version_env)
 
-client = AzureOpenAI(
-    api_key=os.environ["AZURE_OPENAI_KEY"],
-    api_version=api_version,
-    azure_endpoint=endpoint,
-)
+# Process-wide pooled client (reused across reruns, sessions and pages); created on
+# first use so the page renders without waiting on the openai import
+def llm_client():
+    return get_client(
+        api_key=os.environ["AZURE_OPENAI_KEY"],
+        api_version=api_version,
+        endpoint=endpoint,
+    )
+
+ensure_metrics_server()  # serves /metrics when CLARITY_METRICS_PORT is set
+trace = start_trace("finance")  # per-stage timings for this run
 
 # Optional context in sidebar (helps produce more specific plans)
 with st.sidebar:
@@ -166,28 +200,41 @@ with st.sidebar:
     )
 
 # ── Controls (place BEFORE the textarea so we can safely set session state) ──
-col1, col2, col3, col4 = st.columns([1,1,1,1])
+col1, col2, col3 = st.columns([1,1,1])
 with col1:
     run = st.button("Clarify Plan", type="primary", use_container_width=True, key="finance_run")
 with col2:
-    show_raw = st.toggle("Show raw JSON", value=False, key="finance_raw")
-with col3:
     if st.button("Try Demo", use_container_width=True, key="finance_demo"):
-        st.session_state.finance_user_text = (
-            "I want to save more but my credit card balance keeps growing. "
-            "Maybe cut dining? Not sure."
-        )
+        st.session_state.finance_user_text = FINANCE_DEMO_TEXT
         st.rerun()
-with col4:
+with col3:
     if st.button("Reset", use_container_width=True, key="finance_reset"):
         st.session_state.finance_plan = None
+        st.session_state.finance_sim = None
+        st.session_state.finance_scenario = None
         st.session_state.finance_user_text = ""
+        cancel_finance_job()
         # also clear any refined values
         for k in ("finance_income", "finance_expenses", "finance_goals", "finance_constraints"):
             if k in st.session_state:
                 del st.session_state[k]
         st.rerun()
 
+opt1, opt2 = st.columns([1, 1])
+with opt1:
+    stream_plan = st.toggle(
+        "Stream plan",
+        value=True,
+        key="finance_stream",
+        help="Show the summary and each action as soon as it is generated.",
+    )
+with opt2:
+    bypass_cache = st.checkbox(
+        "Skip cached result",
+        key="finance_bypass_cache",
+        help="Always call the model, even if this exact note and context were used before.",
+    )
+
 # Main input (binds to session state AFTER any Try Demo/Reset changes)
 user_text = st.text_area(
     "Paste a note (messy is fine):",
@@ -196,70 +243,193 @@ user_text = st.text_area(
     key="finance_user_text"
 )
 
+def parse_plan(raw: str) -> dict:
+    """
+    Validate the raw JSON straight into FinancePlan; count parse failures.
+    Timing and validity go to the current trace: the job's own for a planned
+    answer (plan_job calls this on the worker), the page's for a demo.
+    """
+    from utils.schema_finance import parse_finance_plan  # pydantic: deferred until the first plan
+
+    try:
+        with stage("validation"):
+            plan = parse_finance_plan(raw).model_dump()
+    except Exception:
+        annotate(valid=False)
+        REGISTRY.inc("clarity_finance_parse_total", help="Finance plan parse attempts", outcome="error")
+        return {"summary": "Parse issue", "raw": raw}
+    annotate(valid=True)
+    REGISTRY.inc("clarity_finance_parse_total", help="Finance plan parse attempts", outcome="ok")
+    return plan
+
+def plan_job(client, call: dict, note: str, stream: bool, demo: bool = False):
+    """
+    Build the job body for one plan. It runs on a job worker thread (no st.*):
+    while streaming, the summary and each action are published to
+    job.progress as soon as their JSON value closes. The finished answer is
+    validated here too, so its timing lands on the job's trace. With
+    demo=True the plan is written back to the precomputed demo artifact.
+    """
+    def remember(raw):
+        if demo:
+            params = {k: call[k] for k in ("temperature", "max_tokens", "response_format")}
+            demo_remember(call["messages"], raw, kind="finance", model=call["model"], **params)
+
+    def run(job):
+        if not stream:
+            result = routed_completion(client, kind="finance", note=note, **call)
+            remember(result.text)
+            return {"plan": parse_plan(result.text), "tier": result.tier, "escalated": result.escalated}
+        parser = PlanStreamParser()
+        started = time.perf_counter()
+
+        def restart(reason):
+            # Small tier's plan failed FinancePlan validation: the large tier's replaces it
+            nonlocal parser
+            parser = PlanStreamParser()
+            job.progress.clear()
+            job.progress["escalated"] = reason
+
+        s = routed_stream(client, kind="finance", note=note, on_escalate=restart, **call)
+        for delta in s:
+            job.check()
+            if parser is None:
+                continue  # preview gave up; keep draining so the full text is cached
+            try:
+                events = parser.feed(delta)
+            except ValueError:
+                parser = None  # malformed JSON: parse_plan() reports it at the end
+                continue
+            for key, value in events:
+                if key == "summary":
+                    job.progress["summary_ms"] = round((time.perf_counter() - started) * 1000, 1)
+                    job.progress["summary"] = value
+                elif key == "actions[]" and isinstance(value, dict):
+                    job.progress.setdefault("first_action_ms", round((time.perf_counter() - started) * 1000, 1))
+                    job.progress["actions"] = [*job.progress.get("actions", ()), value]
+        remember(s.text)
+        # Recorded on this job's own trace (finance_job); the router has already annotated the tier
+        annotate(**{k: job.progress[k] for k in ("summary_ms", "first_action_ms") if k in job.progress})
+        return {"plan": parse_plan(s.text), "tier": s.tier, "escalated": s.escalated}
+    return run
+
+def render_plan_preview(progress: dict):
+    """Summary and action cards published so far by a streaming plan job."""
+    if progress.get("summary"):
+        with st.container(border=True):
+            st.subheader("Summary")
+            st.write(progress["summary"])
+    if progress.get("actions"):
+        with st.container(border=True):
+            st.subheader("Actions")
+            for a in progress["actions"]:
+                render_action_card(a, interactive=False)
+
+# Fragment: only the status/preview reruns on each poll; a finished job
+# triggers one full rerun so the plan panels below render it
+@st.fragment(run_every=POLL_SECONDS)
+@timed_fragment("finance", "job_poll")
+def render_finance_job():
+    job = get_queue().get(st.session_state.finance_job_id)
+    if job is None:  # expired from the registry (or the server restarted)
+        st.session_state.finance_job_id = None
+        st.rerun()
+    if not job.done:
+        status_col, cancel_col = st.columns([4, 1])
+        with status_col:
+            verb = "Queued" if job.status == "queued" else "Drafting your plan"
+            st.caption(f"✍️ {verb}… {job.elapsed:.1f}s · job `{job.id}`")
+        with cancel_col:
+            if st.button("Cancel", key="finance_job_cancel", use_container_width=True):
+                cancel_finance_job()
+                st.rerun()
+        progress = dict(job.progress)
+        if progress.get("escalated"):
+            st.caption(f"↗️ Retrying on the large model: the quick draft was an {progress['escalated']}.")
+        render_plan_preview(progress)
+        return
+
+    st.session_state.finance_job_id = None
+    if job.status == "done":
+        st.session_state.finance_plan = job.result["plan"]
+    elif job.status == "timeout":
+        st.session_state.finance_job_notice = ("warning", f"⌛ Planning timed out after {job.timeout:.0f}s. Please try again.")
+    elif job.status == "error":
+        st.session_state.finance_job_notice = ("error", f"Error calling Azure OpenAI: {job.error}")
+    st.rerun()
+
+# "Plan with this scenario" in the what-if panel re-runs the plan without a second click
+run = run or st.session_state.pop("finance_autorun", False)
+
 # Invoke model (updates session state only)
 if run and user_text.strip():
     try:
-        # --- Load prompt modules (defensively coerce to str) ---
-        system_raw = load_module("prompts.finance.clarifier.system")
-        developer_raw = load_module("prompts.finance.clarifier.developer")
-        user_tmpl_raw = load_module("prompts.finance.clarifier.user.tmpl")
-
-        system = system_raw if isinstance(system_raw, str) else str(system_raw)
-        developer = developer_raw if isinstance(developer_raw, str) else str(developer_raw)
-        user_tmpl = user_tmpl_raw if isinstance(user_tmpl_raw, str) else str(user_tmpl_raw)
-
-        # Build the user message
-        user_msg = user_tmpl.format(
-            user_text=user_text.strip(),
-            income=income or "TBD",
-            goals=goals or "TBD",
-            debts=debts or "TBD",
-            time_horizon=horizon or "TBD",
-            constraints=constraints or "None"
+        # --- Payoff/savings math done locally, then messages from prompts/finance/clarifier/*
+        # + sidebar context with the results as facts (shared with tools/replay.py) ---
+        request = finance_request(
+            user_text,
+            income=income,
+            goals=goals,
+            debts=debts,
+            time_horizon=horizon,
+            constraints=constraints,
+            expenses=st.session_state.get("finance_expenses"),
+            scenario=st.session_state.finance_scenario,
         )
-
+        st.session_state.finance_sim = request.pop("sim")
+        trace.attrs["facts"] = bool(request.pop("facts"))
+        messages = request["messages"]
         dep = os.environ.get("AZURE_OPENAI_DEPLOYMENT", "").strip()
-        ver = os.environ.get("AZURE_OPENAI_API_VERSION", "").strip()
-        
-        # Diagnostics toggle on or off using '#'
-#        try:
-#            diagnostics.assert_valid(system, developer, user_msg)
-#            diagnostics.show_prompts(system, developer, user_msg, dep, ver)
-#        except Exception:
-            # never let diagnostics crash the app
-#            pass
-
-        with st.spinner("Thinking…"):
-            resp = client.chat.completions.create(
-                model=dep,                  # Azure *deployment* name
-                temperature=float(0.2),     # force numeric
-                max_tokens=int(900),        # force numeric
-                messages=[
-                    {"role": "system", "content": system},
-                    {"role": "system", "content": developer},
-                    {"role": "user", "content": user_msg},
-                ],
-            )
 
-        raw = resp.choices[0].message.content
+        # Prompt snippets and timings now live in the debug panel (?debug=1)
+        if diagnostics.debug_enabled():
+            diagnostics.assert_valid(*(m["content"] for m in messages))
 
-        try:
-            plan = json.loads(raw)
-        except Exception:
-            plan = {"summary": "Parse issue", "raw": raw}
-
-        st.session_state.finance_plan = plan
+        call = dict(
+            model=dep,                  # Azure *deployment* name
+            **request,
+            bypass_cache=bypass_cache,
+        )
+        cancel_finance_job()
+        # The demo text with no extra context: served from (and written back to) the shared
+        # demo artifact, so any sidebar or refinement number makes it a private request
+        context = (income, goals, debts, horizon, constraints, st.session_state.get("finance_expenses"))
+        is_demo = user_text.strip() == FINANCE_DEMO_TEXT and not any(str(v or "").strip() for v in context)
+        demo = None
+        if is_demo and not bypass_cache:
+            demo = demo_lookup(messages, **{k: call[k] for k in ("temperature", "max_tokens", "response_format")})
+        if demo is not None:
+            st.session_state.finance_plan = parse_plan(demo["text"])
+            trace.attrs["demo"] = True
+            st.toast("Loaded the precomputed demo plan.")
+        else:
+            job = get_queue().submit("finance", plan_job(llm_client(), call, user_text, stream_plan, demo=is_demo))
+            st.session_state.finance_job_id = job.id
+            trace.attrs["job_id"] = job.id
 
+    except QueueFull as e:
+        st.error(f"⏳ The planning queue is full ({e}). Please try again in a moment.")
     except Exception as e:
         # Do not touch `resp` here—it may not exist.
         st.error(f"Error calling Azure OpenAI: {e}")
         st.code(traceback.format_exc())
 
+# Queued/running plan: poll it without blocking the rest of the page
+if st.session_state.finance_job_id:
+    render_finance_job()
+
+notice = st.session_state.pop("finance_job_notice", None)
+if notice:
+    getattr(st, notice[0])(notice[1])
+
 # --- Render stored plan (persists across reruns) ---
-plan = st.session_state.get("finance_plan")
-if plan:
+# Each panel is an st.fragment: ticking "Done", toggling raw JSON or typing a
+# refinement number reruns only that panel instead of the whole page.
+@st.fragment
+@timed_fragment("finance", "summary")
+def render_summary_panel(plan: dict):
     # Optional raw JSON
-    if show_raw:
+    if st.toggle("Show raw JSON", value=False, key="finance_raw"):
         st.code(json.dumps(plan, indent=2), language="json")
 
     # Summary / Risks / Questions
@@ -279,6 +449,9 @@ if plan:
             for q in qs:
                 st.write(f"- {q}")
 
+@st.fragment
+@timed_fragment("finance", "actions")
+def render_actions_panel(plan: dict):
     # Actions & Budget Adjustments
     with st.container(border=True):
         st.subheader("Actions")
@@ -307,6 +480,136 @@ if plan:
                     f"({b.get('period')}) — {b.get('rationale')}"
                 )
 
+def _months(n: int) -> str:
+    return f"{n} mo" if n >= 0 else "not within the horizon"
+
+@st.fragment
+@timed_fragment("finance", "payoff")
+def render_payoff_panel(sim: dict):
+    # Exact numbers from utils.finance_sim (the plan above quotes the same facts)
+    with st.container(border=True):
+        st.subheader("Payoff & Savings Math")
+        st.caption("Computed locally from your context numbers, month by month.")
+        strategies = sim.get("strategies") or {}
+        if strategies:
+            cols = st.columns(len(strategies))
+            for col, (name, s) in zip(cols, strategies.items()):
+                with col:
+                    st.metric(f"{name.title()}: debt-free", s["debt_free"] or "—", _months(s["months"]), delta_color="off")
+                    st.caption(f"Total interest **${s['interest']:,.2f}**")
+                    for o in s["order"]:
+                        st.write(f"- {o['name']}: {_months(o['month'])} · ${o['interest']:,.2f} interest")
+        if not sim["minimums_only"]:
+            st.caption(
+                f"Budget: ${sim['available']:,.0f}/mo available · ${sim['minimums']:,.0f} minimums · "
+                f"${sim['debt_budget'] - sim['minimums']:,.0f} extra to debt · ${sim['savings_budget']:,.0f} to savings"
+            )
+        if sim.get("scenario"):
+            st.caption(f"What-if scenario: ${sim['scenario']['extra_payment']:,.0f}/mo extra toward debt, "
+                       f"{sim['scenario']['savings_rate']:.1%} of income to savings.")
+        sv = sim.get("savings") or {}
+        if "target" in sv:
+            when = sv["reached_label"] or "not within the horizon"
+            st.write(f"Savings target **${sv['target']:,.0f}** reached: **{when}**")
+        st.write(f"Savings after 12 months: **${sv.get('after_12_months', 0):,.0f}**")
+        for note in sim.get("assumptions", []) + [f"Could not read: {u}" for u in sim.get("unparsed", [])]:
+            st.caption(f"ℹ️ {note}")
+
+def _signed(v: float) -> str:
+    return f"{'-' if v < 0 else '+'}${abs(v):,.0f}"
+
+def _fit(key: str, options: list):
+    # A new grid (inputs changed) may not contain the slider's old value: snap to the nearest option
+    if key in st.session_state and st.session_state[key] not in options:
+        st.session_state[key] = min(options, key=lambda o: abs(o - st.session_state[key]))
+
+def current_sweep():
+    """The what-if grid for the current context numbers, computed once per change of inputs."""
+    key = tuple(str(st.session_state.get(k) or "") for k in ("finance_debts", "finance_income", "finance_goals", "finance_expenses"))
+    cached = st.session_state.get("finance_sweep")
+    if cached is None or cached[0] != key:
+        with stage("sweep"):
+            inputs = parse_inputs(*key[:3], st.session_state.get("finance_expenses"))
+            cached = (key, inputs, sweep(inputs))
+        st.session_state.finance_sweep = cached
+    return cached[1], cached[2]
+
+@st.fragment
+@timed_fragment("finance", "whatif")
+def render_whatif_panel():
+    # Sliders only index the precomputed grid; the model is called only on "Plan with this scenario"
+    inputs, sw = current_sweep()
+    with st.container(border=True):
+        st.subheader("What-if Explorer")
+        if sw is None:
+            st.info("Add monthly income and expenses (below) to explore extra payments and savings rates.")
+            return
+        st.caption(f"{sw.size:,} scenarios simulated locally in {sw.elapsed_ms:.0f} ms (avalanche order, "
+                   f"{sw.horizon // 12}-year horizon). Moving a slider does not call the model.")
+        extras, rates = sw.extras.tolist(), sw.rates.tolist()
+        plan_sim = st.session_state.finance_sim
+        if plan_sim and not plan_sim["minimums_only"] and inputs.income:
+            # Start the sliders at the current plan's split
+            st.session_state.setdefault("finance_whatif_extra", plan_sim["debt_budget"] - plan_sim["minimums"])
+            st.session_state.setdefault("finance_whatif_rate", plan_sim["savings_budget"] / inputs.income)
+        for key, options in (("finance_whatif_extra", extras), ("finance_whatif_rate", rates)):
+            _fit(key, options)
+        c1, c2 = st.columns(2)
+        with c1:
+            extra = st.select_slider("Extra toward debt", options=extras, key="finance_whatif_extra",
+                                     format_func=lambda v: f"${v:,.0f}/mo", disabled=len(extras) < 2)
+        with c2:
+            rate = st.select_slider("Savings rate", options=rates, key="finance_whatif_rate",
+                                    format_func=lambda v: f"{v:.1%} of income")
+        j, k = extras.index(extra), rates.index(rate)
+        cut = float(sw.cut[j, k])
+
+        months, base = int(sw.months[j, k]), int(sw.months[0, k])
+        m1, m2, m3 = st.columns(3)
+        with m1:
+            delta = f"{months - base:+d} mo vs no extra payment" if months >= 0 and base >= 0 and inputs.debts else None
+            st.metric("Debt-free", (month_label(months) if months >= 0 else "not within horizon") if inputs.debts else "no debts",
+                      delta, delta_color="inverse")
+        with m2:
+            st.metric("Total interest", f"${sw.interest[j, k]:,.0f}",
+                      _signed(sw.interest[j, k] - sw.interest[0, k]) if inputs.debts else None, delta_color="inverse")
+        with m3:
+            st.metric(f"Savings after {sw.horizon // 12} yrs", f"${sw.savings[j, k]:,.0f}")
+        if not sw.feasible[j, k]:
+            st.warning(f"Over budget by ${cut:,.0f}/mo, more than the ${sw.max_cut:,.0f}/mo expense cut this explorer "
+                       "proposes: lower the extra payment or savings rate.")
+        elif cut > 0:
+            st.info(f"Fits the budget with a **${cut:,.0f}/mo** expense cut "
+                    f"(expenses ${inputs.expenses:,.0f} → ${inputs.expenses - cut:,.0f}/mo).")
+
+        # Curves: this scenario over time, and payoff/savings across extra payments at this rate
+        sim = simulate(inputs.debts, sum(d.minimum for d in inputs.debts) + extra, rate * inputs.income,
+                       months=sw.horizon, min_months=sw.horizon,
+                       savings_target=inputs.goal.target if inputs.goal else None)
+        st.caption("Debt and savings balance by month")
+        st.line_chart({"Debt": sim.debt[:, 0], "Savings": sim.savings[:, 0]})
+        if len(extras) > 1:
+            payoff = [float(m) if m >= 0 else None for m in sw.months[:, k]]
+            st.caption("Months to debt-free and savings after the horizon, by extra payment")
+            p1, p2 = st.columns(2)
+            with p1:
+                st.line_chart({"extra ($/mo)": extras, "months to debt-free": payoff}, x="extra ($/mo)")
+            with p2:
+                st.line_chart({"extra ($/mo)": extras, "savings ($)": sw.savings[:, k]}, x="extra ($/mo)")
+
+        if st.button("Plan with this scenario", type="primary", key="finance_whatif_commit",
+                     disabled=not bool(sw.feasible[j, k])):
+            if cut > 0:
+                st.session_state.finance_pending = {"expenses": float(inputs.expenses - cut)}
+            st.session_state.finance_scenario = {"cut": cut, "extra": extra, "rate": rate}
+            st.session_state.finance_autorun = True
+            for key in ("finance_whatif_extra", "finance_whatif_rate"):
+                st.session_state.pop(key, None)  # the next plan's split seeds them again
+            st.rerun()
+
+@st.fragment
+@timed_fragment("finance", "refine")
+def render_refine_panel():
     # --- Refinement prompt: collect missing numbers and refine the plan ---
     needs_income = not (st.session_state.get("finance_income") and str(st.session_state["finance_income"]).strip())
     has_savings_baseline = bool(st.session_state.get("finance_goals") and str(st.session_state["finance_goals"]).strip())
@@ -365,6 +668,7 @@ if plan:
             pass
 
         if st.button("Save numbers (then click Clarify Plan)", type="primary", key="finance_refine_save"):
+            st.session_state.finance_scenario = None  # new numbers replace a committed what-if scenario
             # hand off refined values to next run (so we apply them BEFORE widgets)
             st.session_state.finance_pending = {
                 "income": income_refine.strip() or None,
@@ -374,3 +678,19 @@ if plan:
             }
             st.toast("Numbers saved. Now click **Clarify Plan** to re-run with updated context.")
             st.rerun()
+
+plan = st.session_state.get("finance_plan")
+render_started = time.perf_counter()
+if plan:
+    render_summary_panel(plan)
+    render_actions_panel(plan)
+    if st.session_state.finance_sim:
+        render_payoff_panel(st.session_state.finance_sim)
+    render_whatif_panel()
+    render_refine_panel()
+
+# Close this run's trace (metrics / JSONL) and optional debug panel
+trace.add("render", time.perf_counter() - render_started)
+finish_trace(trace)
+diagnostics.render_debug_panel(trace)
+first_render("finance")
@@ -0,0 +1,55 @@
+# tests/test_finance_sim.py
+import datetime
+
+import pytest
+
+from utils.finance_sim import Debt, parse_amount, parse_debts, parse_goal, parse_inputs, simulate, sweep
+
+def balances(text):
+    return [(d.name, d.balance, d.apr) for d in parse_debts(text).debts]
+
+@pytest.mark.parametrize("text, expected", [
+    ("Card 1 $3,000 @ 20%; Card 2 $1,500 @ 15%", [("Card 1", 3000.0, 20.0), ("Card 2", 1500.0, 15.0)]),
+    ("Visa 4421 balance $3,000 at 20%", [("Visa 4421", 3000.0, 20.0)]),
+    ("Visa 4421 balance 3000 at 20%", [("Visa 4421", 3000.0, 20.0)]),
+    ("Card A $3.2k @ 23%, Card B $1.1k @ 18%", [("Card A", 3200.0, 23.0), ("Card B", 1100.0, 18.0)]),
+    ("Card 15% $2,000", [("Card", 2000.0, 15.0)]),
+])
+def test_parse_debts_balance_is_the_amount_not_the_name(text, expected):
+    assert balances(text) == expected
+
+def test_parse_debts_keeps_a_stated_minimum():
+    (debt,) = parse_debts("Car loan 12000 at 6%, min 250").debts
+    assert (debt.name, debt.balance, debt.minimum) == ("Car loan", 12000.0, 250.0)
+
+def test_percentages_are_never_dollars():
+    assert parse_amount("15%") is None
+    assert parse_amount("4.5 %") is None
+    assert parse_goal("save 15% of income") is None
+
+@pytest.mark.parametrize("text", ["emergency fund by Dec 2027", "save for a house in 2 years"])
+def test_deadline_numbers_are_not_goal_targets(text):
+    assert parse_goal(text, today=datetime.date(2026, 10, 1)) is None
+
+def test_goal_target_next_to_a_deadline():
+    goal = parse_goal("$20k for a house in 2 years")
+    assert (goal.target, goal.months) == (20000.0, 24)
+
+def test_percentage_goal_uses_income():
+    goal = parse_inputs(income="5000", goals="save 15% of income").goal
+    assert goal.monthly == 750.0 and goal.target is None
+
+def test_parse_goal_target_and_deadline():
+    goal = parse_goal("$5k emergency fund by Dec 2027", today=datetime.date(2026, 10, 1))
+    assert (goal.target, goal.months) == (5000.0, 14)
+
+def test_simulate_single_debt_payoff_months():
+    assert simulate([Debt("x", 10000, 12, 200)], 200).months.tolist() == [70]
+
+def test_sweep_grid_is_extras_by_rates_with_the_cut_each_needs():
+    inputs = parse_inputs(debts="Card $3,000 @ 20% min $100", income="5000", expenses=4500)
+    sw = sweep(inputs)
+    assert sw.months.shape == (sw.extras.size, sw.rates.size)
+    assert sw.cut[0, 0] == 0  # minimums fit in the $500 left over
+    assert sw.cut[-1, 0] == sw.extras[-1] - 400  # the rest comes out of expenses
+    assert not sw.feasible[-1, -1]
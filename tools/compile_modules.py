@@ -0,0 +1,49 @@
+# tools/compile_modules.py
+"""
+Build step: validate modules/prompts and write the compiled bundle.
+
+Every modules/module*.yaml is checked against utils.schema_modules.ModuleSpec
+(unknown or mistyped keys fail the build) and every addressable prompts/**
+file is checked for emptiness and unknown template placeholders. The stable
+prompt parts are pre-rendered and everything lands in CLARITY_BUNDLE
+(default build/modules.bundle), which the app memory-maps at startup.
+
+  python tools/compile_modules.py            # validate and write the bundle
+  python tools/compile_modules.py --check    # exit 1 on errors or an out-of-date bundle (CI)
+
+Run from the repo root.
+"""
+from __future__ import annotations
+import argparse
+import json
+import sys
+from pathlib import Path
+from typing import List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from utils import bundle  # noqa: E402
+
+def main(argv: Optional[List[str]] = None) -> None:
+    ap = argparse.ArgumentParser(description="Compile modules and prompts into the runtime bundle")
+    ap.add_argument("--check", action="store_true", help="validate only; exit 1 on errors or if the bundle is out of date")
+    ap.add_argument("--out", default=bundle.BUNDLE_PATH or "build/modules.bundle")
+    args = ap.parse_args(argv)
+
+    blob, report = bundle.compile_bundle()
+    summary = {"bundle": args.out, **report}
+    if report["errors"]:
+        print(json.dumps(summary, indent=2))
+        raise SystemExit(1)
+
+    if args.check:
+        current = bundle.Bundle(args.out, mode="bundle")
+        summary["up_to_date"] = current.meta.get("digest") == report["digest"]
+        print(json.dumps(summary, indent=2))
+        raise SystemExit(0 if summary["up_to_date"] else 1)
+
+    bundle.write_bundle(blob, args.out)
+    print(json.dumps(summary, indent=2))
+
+if __name__ == "__main__":
+    main()
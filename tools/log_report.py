@@ -0,0 +1,72 @@
+# tools/log_report.py
+"""
+Summarize the request log written by utils.request_log.
+
+  python tools/log_report.py                 # logs/, everything
+  python tools/log_report.py logs --hours 24 --json
+
+Reports cache status mix, outcomes, token totals and latency percentiles per
+page, plus how many distinct prompt hashes were seen (repeat traffic the
+response cache could absorb).
+"""
+from __future__ import annotations
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from utils.metrics import percentile  # noqa: E402
+from utils.request_log import LOG_DIR, read_records  # noqa: E402
+
+def report(records: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    pages: Dict[str, Dict[str, Any]] = {}
+    hashes = set()
+    total = 0
+    for r in records:
+        total += 1
+        hashes.add(r.get("prompt_hash"))
+        p = pages.setdefault(r.get("page") or "-", {
+            "requests": 0, "cache": {}, "outcome": {}, "prompt_tokens": 0,
+            "completion_tokens": 0, "cached_tokens": 0, "_latency": [],
+        })
+        p["requests"] += 1
+        for field in ("cache", "outcome"):
+            p[field][r.get(field)] = p[field].get(r.get(field), 0) + 1
+        # Only upstream calls spend tokens; cache hits replay the stored usage
+        if r.get("cache") in ("miss", "bypass"):
+            for k in ("prompt_tokens", "completion_tokens", "cached_tokens"):
+                p[k] += r.get(k) or 0
+        if r.get("latency_ms") is not None:
+            p["_latency"].append(r["latency_ms"])
+    for p in pages.values():
+        lat: List[float] = p.pop("_latency")
+        p["latency_ms_p50"] = percentile(lat, 50)
+        p["latency_ms_p95"] = percentile(lat, 95)
+    return {"requests": total, "distinct_prompts": len(hashes), "pages": pages}
+
+def main(argv: Optional[List[str]] = None) -> None:
+    ap = argparse.ArgumentParser(description="Summarize the request log")
+    ap.add_argument("dir", nargs="?", default=LOG_DIR or "logs", help="request log directory")
+    ap.add_argument("--hours", type=float, default=0, help="only the last N hours")
+    ap.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = ap.parse_args(argv)
+
+    since = time.time() - args.hours * 3600 if args.hours else None
+    rep = report(read_records(args.dir, since=since))
+    if args.json:
+        print(json.dumps(rep, indent=2))
+        return
+    print(f"requests {rep['requests']}  distinct prompts {rep['distinct_prompts']}")
+    for page, p in sorted(rep["pages"].items()):
+        print(f"\n[{page}] {p['requests']} requests")
+        print(f"  cache      {p['cache']}")
+        print(f"  outcome    {p['outcome']}")
+        print(f"  tokens     prompt {p['prompt_tokens']}  completion {p['completion_tokens']}  cached {p['cached_tokens']}")
+        print(f"  latency    p50 {p['latency_ms_p50']} ms  p95 {p['latency_ms_p95']} ms")
+
+if __name__ == "__main__":
+    main()
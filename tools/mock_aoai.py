@@ -0,0 +1,261 @@
+# tools/mock_aoai.py
+"""
+Local Azure OpenAI stand-in for load tests.
+
+Implements the chat-completions route AzureOpenAI calls:
+  POST /openai/deployments/{deployment}/chat/completions?api-version=...
+
+Run:
+  python tools/mock_aoai.py --port 8089 --latency lognormal --mean 1.5 --sigma 0.5 --rate-429 0.05
+
+Point the app (or tools/replay.py) at it with
+  AZURE_OPENAI_ENDPOINT=http://127.0.0.1:8089  AZURE_OPENAI_KEY=mock
+"""
+from __future__ import annotations
+import argparse
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+ROUTE = re.compile(r"^/openai/deployments/(?P<dep>[^/]+)/chat/completions$")
+
+FINANCE_JSON = {
+    "summary": "You want to grow savings while stopping credit card balance growth.",
+    "actions": [
+        {"step": 1, "title": "Debt: freeze new card spending", "details": "Move recurring charges to debit for the next 3 months."},
+        {"step": 2, "title": "Budget: cap dining", "details": "Set a TBD monthly dining limit and track it weekly."},
+        {"step": 3, "title": "Debt: pay above minimum", "details": "Send an extra TBD per month to the highest-APR card."},
+        {"step": 4, "title": "Savings: automate a transfer", "details": "Schedule a TBD transfer on payday."},
+    ],
+    "budget_adjustments": [
+        {"category": "Dining", "change": "-100", "period": "monthly", "rationale": "Frees cash for card paydown."},
+    ],
+    "risks_or_considerations": ["Irregular expenses may break the plan; keep a small buffer."],
+    "clarifying_questions": ["What is your monthly income?", "What are the card balances and APRs?"],
+    "tone": "supportive",
+}
+
+AUDIT_MARKDOWN = """**Summary of issues**
+- "various activities" and "multiple sources" are vague and do not identify programs or funding types.
+
+**Improved wording (before → after)**
+- "engaged in various activities" → "operated three programs: {program_1}, {program_2} and {program_3}"
+- "funded by multiple sources" → "funded by contributions ({amount}), government grants ({amount}) and program fees ({amount})"
+
+**Clarifying questions**
+- Which programs and supporting services were active during the year?
+- What were the amounts by revenue source?
+
+**Risks / compliance considerations**
+- Vague descriptions may not meet ASC 958-205 functional and nature disclosure expectations.
+
+**Recommendations**
+- Name each program, quantify each funding source, and state the reporting period.
+"""
+
+# ---------- latency ----------
+class Latency:
+    """Sampled total response time (seconds) from a named distribution."""
+
+    def __init__(self, dist: str, mean: float, sigma: float, low: float, high: float):
+        self.dist, self.mean, self.sigma, self.low, self.high = dist, mean, sigma, low, high
+
+    def sample(self) -> float:
+        if self.dist == "fixed":
+            value = self.mean
+        elif self.dist == "uniform":
+            value = random.uniform(self.low, self.high)
+        elif self.dist == "normal":
+            value = random.gauss(self.mean, self.sigma)
+        else:  # lognormal with the requested arithmetic mean
+            mu = math.log(max(self.mean, 1e-6)) - self.sigma ** 2 / 2
+            value = random.lognormvariate(mu, self.sigma)
+        return max(0.0, value)
+
+# ---------- canned responses ----------
+def _is_finance(messages: List[Dict[str, Any]]) -> bool:
+    text = " ".join(str(m.get("content") or "") for m in messages[:2])
+    return "JSON" in text or "Financial Note Clarifier" in text
+
+def _reply_text(messages: List[Dict[str, Any]]) -> str:
+    return json.dumps(FINANCE_JSON, indent=2) if _is_finance(messages) else AUDIT_MARKDOWN
+
+def _tokens(messages: List[Dict[str, Any]]) -> int:
+    return sum(len(str(m.get("content") or "")) for m in messages) // 4 + 4 * len(messages)
+
+def _usage(messages: List[Dict[str, Any]], text: str, cached: int = 0) -> Dict[str, Any]:
+    prompt = _tokens(messages)
+    completion = max(1, len(text) // 4)
+    return {
+        "prompt_tokens": prompt,
+        "completion_tokens": completion,
+        "total_tokens": prompt + completion,
+        "prompt_tokens_details": {"cached_tokens": cached},
+    }
+
+def _chunks(text: str, size: int = 16) -> List[str]:
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+class MockState:
+    def __init__(self, args: argparse.Namespace):
+        self.latency = Latency(args.latency, args.mean, args.sigma, args.low, args.high)
+        self.ttft_fraction = args.ttft_fraction
+        self.rate_429 = args.rate_429
+        self.retry_after = args.retry_after
+        self.prompt_cache = args.prompt_cache
+        self.seen_prefixes: set = set()
+        self.lock = threading.Lock()
+        self.counts = {"requests": 0, "streamed": 0, "throttled": 0, "prefix_hits": 0}
+
+    def cached_tokens(self, messages: List[Dict[str, Any]]) -> int:
+        """
+        Mimic Azure prompt caching: a repeated prefix (all but the last message)
+        of at least 1024 tokens is served from cache in 128-token increments.
+        """
+        if not self.prompt_cache or len(messages) < 2:
+            return 0
+        prefix = json.dumps(messages[:-1], sort_keys=True)
+        tokens = _tokens(messages[:-1])
+        with self.lock:
+            hit = prefix in self.seen_prefixes
+            self.seen_prefixes.add(prefix)
+            if hit and tokens >= 1024:
+                self.counts["prefix_hits"] += 1
+                return 1024 + (tokens - 1024) // 128 * 128
+        return 0
+
+    def count(self, key: str) -> None:
+        with self.lock:
+            self.counts[key] += 1
+
+def make_handler(state: MockState):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, like the real endpoint
+
+        def log_message(self, fmt, *args):  # quiet by default
+            pass
+
+        def _json(self, status: int, body: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> None:
+            blob = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(blob)))
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(blob)
+
+        def do_GET(self):
+            if self.path.startswith("/stats"):
+                with state.lock:
+                    return self._json(200, dict(state.counts))
+            self._json(404, {"error": {"code": "NotFound", "message": self.path}})
+
+        def do_POST(self):
+            path = self.path.split("?", 1)[0]
+            m = ROUTE.match(path)
+            length = int(self.headers.get("Content-Length") or 0)
+            body = json.loads(self.rfile.read(length) or b"{}")
+            if not m:
+                return self._json(404, {"error": {"code": "DeploymentNotFound", "message": path}})
+
+            state.count("requests")
+            if random.random() < state.rate_429:
+                state.count("throttled")
+                return self._json(
+                    429,
+                    {"error": {"code": "429", "message": "Requests to the deployment have exceeded the rate limit (mock)."}},
+                    {"Retry-After": str(int(state.retry_after)), "retry-after-ms": str(int(state.retry_after * 1000))},
+                )
+
+            messages = body.get("messages") or []
+            text = _reply_text(messages)
+            usage = _usage(messages, text, state.cached_tokens(messages))
+            total = state.latency.sample()
+            rid = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+            base = {"id": rid, "created": int(time.time()), "model": "gpt-4o", "system_fingerprint": "mock"}
+            ratelimit = {"x-ratelimit-remaining-requests": "1000", "x-ratelimit-remaining-tokens": "1000000"}
+
+            if body.get("stream"):
+                state.count("streamed")
+                return self._stream(base, text, usage, total, body, ratelimit)
+
+            time.sleep(total)
+            self._json(200, {
+                **base,
+                "object": "chat.completion",
+                "choices": [{
+                    "index": 0,
+                    "finish_reason": "stop",
+                    "message": {"role": "assistant", "content": text},
+                }],
+                "usage": usage,
+            }, ratelimit)
+
+        def _stream(self, base, text, usage, total, body, headers) -> None:
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Connection", "close")
+            for k, v in headers.items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.close_connection = True
+
+            def send(obj: Any) -> None:
+                data = obj if isinstance(obj, str) else json.dumps(obj)
+                self.wfile.write(f"data: {data}\n\n".encode("utf-8"))
+                self.wfile.flush()
+
+            pieces = _chunks(text)
+            ttft = total * state.ttft_fraction
+            gap = (total - ttft) / max(1, len(pieces))
+            time.sleep(ttft)
+            for i, piece in enumerate(pieces):
+                delta = {"content": piece} if i else {"role": "assistant", "content": piece}
+                send({**base, "object": "chat.completion.chunk",
+                      "choices": [{"index": 0, "delta": delta, "finish_reason": None}]})
+                time.sleep(gap)
+            send({**base, "object": "chat.completion.chunk",
+                  "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+            if (body.get("stream_options") or {}).get("include_usage"):
+                send({**base, "object": "chat.completion.chunk", "choices": [], "usage": usage})
+            send("[DONE]")
+
+    return Handler
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    ap = argparse.ArgumentParser(description="Local Azure OpenAI chat-completions stand-in")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8089)
+    ap.add_argument("--latency", choices=["fixed", "uniform", "normal", "lognormal"], default="lognormal")
+    ap.add_argument("--mean", type=float, default=1.5, help="mean response time (s)")
+    ap.add_argument("--sigma", type=float, default=0.5, help="spread for normal/lognormal")
+    ap.add_argument("--low", type=float, default=0.5, help="uniform lower bound (s)")
+    ap.add_argument("--high", type=float, default=3.0, help="uniform upper bound (s)")
+    ap.add_argument("--ttft-fraction", type=float, default=0.2, help="share of latency before the first streamed token")
+    ap.add_argument("--rate-429", type=float, default=0.0, help="probability of answering 429")
+    ap.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds sent with 429s")
+    ap.add_argument("--no-prompt-cache", dest="prompt_cache", action="store_false",
+                    help="never report cached_tokens (default: simulate Azure prompt caching)")
+    return ap.parse_args(argv)
+
+def serve(args: argparse.Namespace) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(MockState(args)))
+    server.daemon_threads = True
+    return server
+
+if __name__ == "__main__":
+    args = parse_args()
+    server = serve(args)
+    print(f"Mock Azure OpenAI listening on http://{args.host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
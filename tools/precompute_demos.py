@@ -0,0 +1,52 @@
+# tools/precompute_demos.py
+"""
+Build step: precompute the "Try Demo" results into the demo artifact.
+
+Reviews every module's sample_note and the finance demo text with the large
+deployment and stores them in DEMO_ARTIFACT (default
+artifacts/demo_results.json), keyed by prompt hash. Only entries whose
+prompt changed (or is new) are generated; obsolete ones are dropped.
+
+  python tools/precompute_demos.py            # generate what is missing
+  python tools/precompute_demos.py --check    # exit 1 if any demo is stale (CI)
+  python tools/precompute_demos.py --force    # regenerate everything
+
+Run from the repo root with the usual AZURE_OPENAI_* variables set.
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+from typing import List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from utils import demos  # noqa: E402
+
+def main(argv: Optional[List[str]] = None) -> None:
+    ap = argparse.ArgumentParser(description="Precompute demo results into the demo artifact")
+    ap.add_argument("--check", action="store_true", help="only report stale demos; exit 1 if any")
+    ap.add_argument("--force", action="store_true", help="regenerate every demo, bypassing the response cache")
+    ap.add_argument("--deployment", default=os.environ.get("AZURE_OPENAI_DEPLOYMENT", "gpt-4o"))
+    args = ap.parse_args(argv)
+
+    if args.check:
+        stale = demos.stale()
+        print(json.dumps({"artifact": demos.ARTIFACT_PATH, "stale": stale}, indent=2))
+        raise SystemExit(1 if stale else 0)
+
+    from utils.openai_client import get_client
+
+    client = get_client(
+        api_key=os.environ["AZURE_OPENAI_KEY"],
+        api_version=os.environ["AZURE_OPENAI_API_VERSION"],
+        endpoint=os.environ["AZURE_OPENAI_ENDPOINT"],
+    )
+    report = demos.refresh(client, args.deployment, force=args.force)
+    print(json.dumps({"artifact": demos.ARTIFACT_PATH, **report}, indent=2))
+    raise SystemExit(1 if report["failed"] else 0)
+
+if __name__ == "__main__":
+    main()
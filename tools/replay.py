@@ -0,0 +1,183 @@
+# tools/replay.py
+"""
+Replay a JSONL request log through the app's real prompt code at a target RPS.
+
+Each line is one request. Audit records use build_prompt():
+  {"page": "audit", "module_id": 3, "note": "..."}
+Finance records use finance_request(), like the page (simulator facts and
+the matching max_tokens included):
+  {"page": "finance", "user_text": "...", "income": "5200", "debts": "...", "expenses": 4300}
+Missing notes fall back to the module's sample_note / the finance demo text.
+Requests are routed (utils.router) the same way the pages route them.
+
+Run from the repo root (module/prompt paths are cwd-relative), e.g. against
+tools/mock_aoai.py:
+  AZURE_OPENAI_ENDPOINT=http://127.0.0.1:8089 AZURE_OPENAI_KEY=mock \\
+  AZURE_OPENAI_API_VERSION=2025-01-01-preview \\
+  python tools/replay.py traffic.jsonl --rps 5 --duration 60
+
+The log may also be a utils.request_log directory (e.g. logs/). Those records
+carry module IDs and prompt hashes but no note text, so they replay each
+module's sample_note with the recorded traffic mix.
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from utils import demos, rate_limiter  # noqa: E402
+from utils.metrics import percentile  # noqa: E402
+from utils.module_loader import load_module  # noqa: E402
+from utils.openai_client import get_async_client  # noqa: E402
+from utils.prompt_builder import build_prompt, finance_request  # noqa: E402
+from utils.request_log import read_records  # noqa: E402
+from utils.router import arouted_completion  # noqa: E402
+
+FINANCE_DEMO = demos.FINANCE_DEMO_TEXT
+NOTE_KEYS = ("note", "audit_note", "text", "body")
+
+# ---------- request building ----------
+def build_request(record: Dict[str, Any], default_module_id: int) -> Dict[str, Any]:
+    """
+    Map one log record to {"page", "note", "module_id", "messages",
+    "temperature", "max_tokens", "response_format"}.
+    """
+    page = record.get("page") or record.get("kind") or ("finance" if "user_text" in record else "audit")
+    if page.startswith("finance"):  # also "finance_job" records from utils.request_log
+        note = record.get("user_text") or FINANCE_DEMO
+        request = finance_request(
+            note,
+            income=record.get("income", ""),
+            goals=record.get("goals", ""),
+            debts=record.get("debts", ""),
+            time_horizon=record.get("time_horizon", ""),
+            constraints=record.get("constraints", ""),
+            expenses=record.get("expenses"),
+            scenario=record.get("scenario"),
+        )
+        request.pop("sim")
+        request.pop("facts")
+        return {"page": "finance", "note": note, "module_id": None, **request}
+
+    module_id = int(record.get("module_id") or default_module_id)
+    module_data = load_module(module_id)
+    note = next((record[k] for k in NOTE_KEYS if record.get(k)), None) or module_data.get("sample_note", "")
+    return {"page": "audit", "note": str(note), "module_id": module_id, "messages": build_prompt(module_data, str(note)),
+            "temperature": None, "max_tokens": None, "response_format": None}
+
+def load_records(path: str) -> List[Dict[str, Any]]:
+    if Path(path).is_dir():  # a utils.request_log directory (rotated/gzipped segments included)
+        return list(read_records(path))
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+# ---------- stats ----------
+def summarize(results: List[Dict[str, Any]], wall: float) -> Dict[str, Any]:
+    ok = [r["latency"] for r in results if r["ok"]]
+    errors: Dict[str, int] = {}
+    for r in results:
+        if not r["ok"]:
+            errors[r["error"]] = errors.get(r["error"], 0) + 1
+    return {
+        "requests": len(results),
+        "succeeded": len(ok),
+        "error_rate": round((len(results) - len(ok)) / len(results), 4) if results else 0.0,
+        "errors": errors,
+        "throughput_rps": round(len(ok) / wall, 3) if wall > 0 else 0.0,
+        "wall_seconds": round(wall, 3),
+        "latency_p50": percentile(ok, 50),
+        "latency_p95": percentile(ok, 95),
+        "latency_p99": percentile(ok, 99),
+        "latency_max": max(ok) if ok else None,
+        "limiter": rate_limiter.get_limiter().stats(),
+    }
+
+# ---------- replay ----------
+async def replay(args: argparse.Namespace) -> Dict[str, Any]:
+    records = load_records(args.log)
+    if not records:
+        raise SystemExit(f"No records in {args.log}")
+    total = args.count or int(args.rps * args.duration)
+    requests = [build_request(r, args.module) for r in itertools.islice(itertools.cycle(records), total)]
+
+    sem = asyncio.Semaphore(args.max_inflight)
+    results: List[Dict[str, Any]] = []
+
+    async with get_async_client() as client:
+        async def one(req: Dict[str, Any], scheduled: float) -> None:
+            async with sem:
+                try:
+                    await arouted_completion(
+                        client,
+                        kind=req["page"],
+                        note=req["note"],
+                        module_id=req["module_id"],
+                        model=args.deployment,
+                        messages=req["messages"],
+                        temperature=req["temperature"],
+                        max_tokens=req["max_tokens"],
+                        response_format=req["response_format"],
+                        bypass_cache=not args.use_cache,
+                    )
+                    results.append({"ok": True, "latency": time.perf_counter() - scheduled})
+                except Exception as e:
+                    results.append({"ok": False, "latency": time.perf_counter() - scheduled, "error": type(e).__name__})
+
+        # Open-loop schedule: latency is measured from the planned send time,
+        # so client-side queueing shows up in the percentiles.
+        start = time.perf_counter()
+        tasks = []
+        for i, req in enumerate(requests):
+            scheduled = start + i / args.rps
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(one(req, scheduled)))
+        await asyncio.gather(*tasks)
+        wall = time.perf_counter() - start
+
+    return summarize(results, wall)
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    ap = argparse.ArgumentParser(description="Replay a JSONL request log at a target RPS")
+    ap.add_argument("log", help="JSONL request log")
+    ap.add_argument("--rps", type=float, default=2.0, help="target requests per second")
+    ap.add_argument("--duration", type=float, default=30.0, help="seconds of traffic (ignored with --count)")
+    ap.add_argument("--count", type=int, default=0, help="exact number of requests to send")
+    ap.add_argument("--max-inflight", type=int, default=64)
+    ap.add_argument("--module", type=int, default=6, help="module ID for audit records without one")
+    ap.add_argument("--deployment", default=os.environ.get("AZURE_OPENAI_DEPLOYMENT", "gpt-4o"))
+    ap.add_argument("--use-cache", action="store_true", help="allow response-cache hits")
+    ap.add_argument("--no-limiter", action="store_true", help="disable the client-side RPM/TPM limiter")
+    ap.add_argument("--json", action="store_true", help="print the report as JSON")
+    return ap.parse_args(argv)
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    if args.no_limiter:
+        rate_limiter._LIMITER = rate_limiter.RateLimiter(rpm=0, tpm=0)
+    report = asyncio.run(replay(args))
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    fmt = lambda v: "-" if v is None else f"{v * 1000:.0f} ms"  # noqa: E731
+    print(f"requests     {report['requests']}  (ok {report['succeeded']}, error rate {report['error_rate']:.2%})")
+    print(f"throughput   {report['throughput_rps']} req/s over {report['wall_seconds']} s")
+    print(f"latency      p50 {fmt(report['latency_p50'])}  p95 {fmt(report['latency_p95'])}  "
+          f"p99 {fmt(report['latency_p99'])}  max {fmt(report['latency_max'])}")
+    if report["errors"]:
+        print(f"errors       {report['errors']}")
+    lim = report["limiter"]
+    print(f"limiter      throttled {lim['throttled']}  retries {lim['retries']}  "
+          f"queued {lim['queued']}  wait {lim['wait_seconds']} s")
+
+if __name__ == "__main__":
+    main()
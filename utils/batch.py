@@ -0,0 +1,207 @@
+# utils/batch.py
+from __future__ import annotations
+import asyncio
+import csv
+import io
+import json
+import re
+import time
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence
+
+from utils.chunking import CHUNK_CONCURRENCY, needs_chunking, review_long_note
+from utils.router import arouted_completion
+from utils.metrics import finish_trace, start_trace
+from utils.module_loader import load_module
+from utils.openai_client import POOL_MAX_CONNECTIONS
+from utils.prompt_builder import build_prompt
+
+# Column / key names accepted for the note text and the module selector
+NOTE_KEYS = ("note", "audit_note", "text", "content")
+MODULE_KEYS = ("module", "module_id", "module_label")
+ID_KEYS = ("id", "note_id", "ref", "reference")
+
+_HEADING = re.compile(r"^#{1,6}\s+(.*)$")
+
+# ---------- parsing ----------
+def _resolve_module(value: Any, module_options: Mapping[str, int], default_id: int) -> int:
+    """Accept a module ID ('3'), a label ('Expense Allocations') or nothing."""
+    text = str(value or "").strip()
+    if not text:
+        return default_id
+    if text.isdigit() and int(text) in module_options.values():
+        return int(text)
+    by_label = {k.lower(): v for k, v in module_options.items()}
+    return by_label.get(text.lower(), default_id)
+
+def _pick(row: Mapping[str, Any], keys: Sequence[str]) -> Any:
+    lowered = {str(k).strip().lower(): v for k, v in row.items()}
+    for k in keys:
+        if lowered.get(k) not in (None, ""):
+            return lowered[k]
+    return None
+
+def _rows_from_markdown(text: str) -> List[Dict[str, Any]]:
+    """
+    Markdown uploads: each heading starts a note (heading text may name a
+    module), and '---' lines separate notes that have no heading.
+    """
+    rows: List[Dict[str, Any]] = []
+    heading: Optional[str] = None
+    buf: List[str] = []
+
+    def flush():
+        body = "\n".join(buf).strip()
+        if body:
+            rows.append({"id": heading or f"note-{len(rows) + 1}", "module": heading, "note": body})
+        buf.clear()
+
+    for line in text.splitlines():
+        m = _HEADING.match(line.strip())
+        if m:
+            flush()
+            heading = m.group(1).strip()
+        elif line.strip() == "---":
+            flush()
+            heading = None
+        else:
+            buf.append(line)
+    flush()
+    return rows
+
+def parse_notes(
+    filename: str,
+    data: bytes,
+    module_options: Mapping[str, int],
+    default_module_id: int,
+) -> List[Dict[str, Any]]:
+    """
+    Turn an uploaded CSV / JSONL / Markdown file into review items:
+      [{"id": str, "module_id": int, "note": str}, ...]
+    """
+    text = data.decode("utf-8-sig")
+    name = (filename or "").lower()
+
+    if name.endswith(".csv"):
+        rows = list(csv.DictReader(io.StringIO(text)))
+    elif name.endswith((".jsonl", ".ndjson")):
+        rows = [json.loads(line) for line in text.splitlines() if line.strip()]
+    elif name.endswith((".md", ".markdown", ".txt")):
+        rows = _rows_from_markdown(text)
+    else:
+        raise ValueError(f"Unsupported file type: {filename} (use .csv, .jsonl or .md)")
+
+    items: List[Dict[str, Any]] = []
+    for i, row in enumerate(rows, start=1):
+        note = _pick(row, NOTE_KEYS)
+        if not note or not str(note).strip():
+            continue
+        items.append({
+            "id": str(_pick(row, ID_KEYS) or f"note-{i}"),
+            "module_id": _resolve_module(_pick(row, MODULE_KEYS), module_options, default_module_id),
+            "note": str(note).strip(),
+        })
+    return items
+
+# ---------- running ----------
+async def review_notes(
+    client: Any,
+    items: List[Dict[str, Any]],
+    *,
+    model: str,
+    concurrency: int = 8,
+    bypass_cache: bool = False,
+    on_result: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Review every item with at most `concurrency` notes in flight.
+
+    Concurrency is clamped to the client's connection pool
+    (AOAI_POOL_MAX_CONNECTIONS), and a long note's chunk calls share the
+    pool with the other notes, so requests never wait out the pool timeout.
+
+    on_result is called (in completion order) with each finished row so the
+    caller can update a table as results arrive. Returns rows in input order.
+    """
+    concurrency = max(1, min(int(concurrency), POOL_MAX_CONNECTIONS))
+    chunk_concurrency = max(1, min(CHUNK_CONCURRENCY, POOL_MAX_CONNECTIONS // concurrency))
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(idx: int, item: Dict[str, Any]) -> Dict[str, Any]:
+        async with sem:
+            started = time.perf_counter()
+            # Each task runs in its own context copy, so this trace is per note
+            trace = start_trace("audit_batch", module_id=item["module_id"])
+            row = {"#": idx + 1, "id": item["id"], "module_id": item["module_id"]}
+            try:
+                module_data = load_module(item["module_id"])
+                if needs_chunking(item["note"]):
+                    long = await review_long_note(
+                        client, module_data, item["note"], model=model, bypass_cache=bypass_cache,
+                        concurrency=chunk_concurrency,
+                    )
+                    row.update(status="ok", review=long["text"], cached=False, tier="large")
+                else:
+                    messages = build_prompt(module_data, item["note"])
+                    result = await arouted_completion(
+                        client,
+                        kind="audit",
+                        note=item["note"],
+                        model=model,
+                        module_id=item["module_id"],
+                        messages=messages,
+                        bypass_cache=bypass_cache,
+                    )
+                    row.update(status="ok", review=result.text, cached=result.cached, tier=result.tier)
+            except Exception as e:
+                row.update(status="error", review=f"{type(e).__name__}: {e}", cached=False)
+            row["seconds"] = round(time.perf_counter() - started, 2)
+            row["note"] = item["note"]
+            trace.attrs["status"] = row["status"]
+            finish_trace(trace)
+            return row
+
+    tasks = [asyncio.create_task(one(i, it)) for i, it in enumerate(items)]
+    results: List[Optional[Dict[str, Any]]] = [None] * len(items)
+    for fut in asyncio.as_completed(tasks):
+        row = await fut
+        results[row["#"] - 1] = row
+        if on_result is not None:
+            on_result(row)
+    return [r for r in results if r is not None]
+
+def run_batch(
+    client_factory: Callable[[], Any],
+    items: List[Dict[str, Any]],
+    **kwargs: Any,
+) -> List[Dict[str, Any]]:
+    """Synchronous entry point for Streamlit: one event loop + client per batch."""
+
+    async def main() -> List[Dict[str, Any]]:
+        async with client_factory() as client:
+            return await review_notes(client, items, **kwargs)
+
+    return asyncio.run(main())
+
+# ---------- report ----------
+def build_report(rows: List[Dict[str, Any]], module_titles: Mapping[int, str]) -> str:
+    """One Markdown document with every note and its review, in input order."""
+    out = ["# Audit Note Review Report", ""]
+    ok = sum(1 for r in rows if r.get("status") == "ok")
+    out.append(f"_{ok} of {len(rows)} notes reviewed._")
+    for r in rows:
+        title = module_titles.get(r["module_id"], f"Module {r['module_id']}")
+        out += [
+            "",
+            "---",
+            "",
+            f"## {r['id']} — {title}",
+            "",
+            "**Original note**",
+            "",
+            "> " + r["note"].replace("\n", "\n> "),
+            "",
+            "**Review**" if r.get("status") == "ok" else "**Error**",
+            "",
+            r.get("review", ""),
+        ]
+    return "\n".join(out) + "\n"
@@ -0,0 +1,273 @@
+# utils/bundle.py
+"""
+Compiled module/prompt bundle.
+
+tools/compile_modules.py validates every modules/module*.yaml (against
+utils.schema_modules.ModuleSpec) and every addressable prompts/** file,
+pre-renders the stable prompt parts (each module's audit system prompt and
+the finance system+developer prefix) and writes them into one file:
+
+    header   <8s magic><u16 version><u16 flags><u32 entries><u64 index offset><u64 index length>
+    payload  UTF-8 records back to back (prompt text, or compact JSON for modules)
+    index    JSON {"meta": {...}, "entries": {key: [offset, length, encoding, sources]}}
+
+The app memory-maps the file once per process. A lookup is a dict probe in
+the index plus a slice of the map, and decoded values are kept, so repeated
+lookups cost one dict get. Keys are "module:<id>", "prompt:<dotted path>"
+(without the leading "prompts.") and "rendered:<name>".
+
+CLARITY_BUNDLE_MODE:
+  bundle  trust the bundle; bundled keys never touch the source files
+  auto    serve an entry only while its source files still match what was
+          compiled, else read the sources (so editing a YAML in dev needs
+          no rebuild). A file whose (mtime, size) differs from the build's
+          is hashed once and still matches if its content is unchanged, so
+          a deploy that rewrites mtimes keeps the bundle in use.
+  source  ignore the bundle
+Keys missing from the bundle, or no bundle at all, fall back to the source
+files through utils.module_loader in every mode.
+"""
+from __future__ import annotations
+import hashlib
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from config import env
+
+# ✅ Bundle knobs (override via env vars)
+BUNDLE_PATH = env("CLARITY_BUNDLE", "build/modules.bundle")  # empty = always read the source files
+BUNDLE_MODE = env("CLARITY_BUNDLE_MODE", "auto")  # bundle | auto | source
+
+MAGIC = b"CLARITYB"
+FORMAT_VERSION = 2  # 2: source signatures carry a content hash
+HEADER = struct.Struct("<8sHHIQQ")
+ROOT = Path(os.getcwd())  # source paths in the index are relative to this (same root as module_loader)
+RENDER_SOURCES = ("utils/prompt_builder.py",)  # rendered entries also go stale when this code changes
+
+def module_key(module_id: int) -> str:
+    return f"module:{int(module_id)}"
+
+def prompt_key(dotted: str) -> str:
+    parts = (dotted or "").strip().split(".")
+    if parts[0] == "prompts":
+        parts = parts[1:]
+    return "prompt:" + ".".join(parts)
+
+def _rel(path: Path) -> str:
+    try:
+        return path.resolve().relative_to(ROOT.resolve()).as_posix()
+    except ValueError:
+        return str(path)
+
+def _sha256(path: Path) -> str:
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+def _sig(path: Path) -> List[Any]:
+    st = path.stat()
+    return [_rel(path), st.st_mtime_ns, st.st_size, _sha256(path)]
+
+# (path, mtime_ns, size) -> content hash, so a file with a new mtime is read once, not per lookup
+_HASHED: Dict[Tuple[str, int, int], str] = {}
+_HASHED_LOCK = threading.Lock()
+
+def _sources_unchanged(sources: Sequence[Sequence[Any]]) -> bool:
+    for rel, mtime_ns, size, sha in sources:
+        path = ROOT / rel
+        try:
+            st = path.stat()
+        except OSError:
+            return False
+        if st.st_size != size:
+            return False
+        if st.st_mtime_ns == mtime_ns:
+            continue
+        key = (rel, st.st_mtime_ns, st.st_size)
+        with _HASHED_LOCK:
+            digest = _HASHED.get(key)
+        if digest is None:
+            try:
+                digest = _sha256(path)
+            except OSError:
+                return False
+            with _HASHED_LOCK:
+                _HASHED[key] = digest
+        if digest != sha:
+            return False
+    return True
+
+class Bundle:
+    """Read-only view of a compiled bundle; an unreadable file behaves like an empty bundle."""
+
+    def __init__(self, path: str, mode: str = BUNDLE_MODE):
+        self.path = Path(path)
+        self.mode = mode
+        self.meta: Dict[str, Any] = {}
+        self.error: Optional[str] = None
+        self._map: Optional[mmap.mmap] = None
+        self._index: Dict[str, List[Any]] = {}
+        self._decoded: Dict[str, Any] = {}
+        self._stats = {"hits": 0, "stale": 0, "misses": 0}
+        self._open()
+
+    def _open(self) -> None:
+        try:
+            with self.path.open("rb") as f:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError) as e:  # missing, or empty (mmap refuses length 0)
+            self.error = f"{type(e).__name__}: {e}"
+            return
+        try:
+            magic, version, _flags, count, index_off, index_len = HEADER.unpack_from(mm, 0)
+            if magic != MAGIC or version != FORMAT_VERSION:
+                raise ValueError(f"not a version {FORMAT_VERSION} bundle")
+            index = json.loads(mm[index_off:index_off + index_len])
+            if len(index["entries"]) != count:
+                raise ValueError("index does not match the header")
+        except (struct.error, KeyError, ValueError) as e:
+            mm.close()
+            self.error = f"{type(e).__name__}: {e}"
+            return
+        self._map, self._index, self.meta = mm, index["entries"], index.get("meta", {})
+
+    def _decode(self, entry: List[Any]) -> Any:
+        from utils.module_loader import _freeze
+
+        offset, length, encoding = entry[:3]
+        raw = self._map[offset:offset + length].decode("utf-8")
+        return _freeze(json.loads(raw)) if encoding == "json" else raw
+
+    def get(self, key: str) -> Any:
+        """The bundled value for key, or None (not bundled, or stale in auto mode)."""
+        entry = self._index.get(key)
+        if entry is None:
+            self._stats["misses"] += 1
+            return None
+        if self.mode == "auto" and not _sources_unchanged(entry[3]):
+            self._stats["stale"] += 1
+            return None
+        value = self._decoded.get(key)
+        if value is None:
+            value = self._decoded[key] = self._decode(entry)
+        self._stats["hits"] += 1
+        return value
+
+    def keys(self) -> List[str]:
+        return sorted(self._index)
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self._stats, "loaded": int(self._map is not None), "entries": len(self._index),
+                "bytes": len(self._map) if self._map is not None else 0}
+
+_BUNDLE: Optional[Bundle] = None
+_BUNDLE_LOCK = threading.Lock()
+
+def get_bundle() -> Optional[Bundle]:
+    """Process-wide bundle (mapped on first use), or None when disabled."""
+    global _BUNDLE
+    if not BUNDLE_PATH or BUNDLE_MODE == "source":
+        return None
+    if _BUNDLE is not None:
+        return _BUNDLE
+    with _BUNDLE_LOCK:
+        if _BUNDLE is None:
+            _BUNDLE = Bundle(BUNDLE_PATH)
+        return _BUNDLE
+
+def rendered(name: str) -> Optional[str]:
+    """A pre-rendered prompt part, or None (callers render it themselves)."""
+    bundle = get_bundle()
+    return bundle.get(f"rendered:{name}") if bundle else None
+
+# ---------- build side ----------
+def _pack(records: List[Tuple[str, bytes, str, List[Path]]]) -> Tuple[bytes, str]:
+    body = bytearray()
+    entries: Dict[str, List[Any]] = {}
+    digest = hashlib.sha256()
+    for key, payload, encoding, sources in sorted(records, key=lambda r: r[0]):
+        entries[key] = [HEADER.size + len(body), len(payload), encoding, [_sig(p) for p in sources]]
+        body += payload
+        digest.update(key.encode("utf-8") + b"\0" + payload + b"\0")
+    meta = {"format": FORMAT_VERSION, "built_at": round(time.time(), 3), "digest": digest.hexdigest()}
+    index = json.dumps({"meta": meta, "entries": entries}, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, 0, len(entries), HEADER.size + len(body), len(index))
+    return header + bytes(body) + index, meta["digest"]
+
+def compile_bundle() -> Tuple[bytes, Dict[str, Any]]:
+    """
+    Validate and pre-render every module and prompt. Returns (bundle bytes,
+    report); the digest in the report covers keys and payloads only, so it is
+    stable across checkouts. Do not ship a bundle whose report has errors.
+    """
+    from utils import prompt_builder
+    from utils.module_loader import (MODULE_DIR, PROMPT_EXTS, PROMPTS_DIR, _module_fields, _read_yaml,
+                                     _resolve_dotted_prompt)
+    from utils.schema_modules import validate_module, validate_prompt
+
+    records: List[Tuple[str, bytes, str, List[Path]]] = []
+    report: Dict[str, Any] = {"modules": [], "prompts": [], "rendered": [], "skipped": [], "errors": {}}
+    code = [ROOT / p for p in RENDER_SOURCES]
+
+    for path in sorted(MODULE_DIR.glob("module*.yaml")):
+        suffix = path.stem[len("module"):]
+        if not suffix.isdigit():
+            continue
+        module_id = int(suffix)
+        try:
+            data = _read_yaml(path)
+        except Exception as e:
+            report["errors"][_rel(path)] = [f"{type(e).__name__}: {e}"]
+            continue
+        _, errors = validate_module(module_id, data)
+        if errors:
+            report["errors"][_rel(path)] = errors
+            continue
+        fields = _module_fields(module_id, data)
+        fields["system_prompt"] = prompt_builder.audit_system_prompt(fields)
+        records.append((module_key(module_id), json.dumps(fields, ensure_ascii=False, separators=(",", ":")).encode("utf-8"),
+                        "json", [path, *code]))
+        report["modules"].append(module_id)
+
+    texts: Dict[str, Tuple[str, Path]] = {}
+    for path in sorted(PROMPTS_DIR.rglob("*")):
+        if not path.is_file() or path.suffix not in PROMPT_EXTS:
+            continue
+        dotted = ".".join(path.relative_to(PROMPTS_DIR).with_suffix("").parts)
+        try:
+            addressable = _resolve_dotted_prompt(dotted) == path
+        except FileNotFoundError:
+            addressable = False
+        if not addressable:
+            report["skipped"].append(_rel(path))  # load_module() cannot reach it by dotted name
+            continue
+        text = path.read_text(encoding="utf-8")
+        errors = validate_prompt(dotted, text)
+        if errors:
+            report["errors"][_rel(path)] = errors
+            continue
+        texts[dotted] = (text, path)
+        records.append((prompt_key(dotted), text.encode("utf-8"), "text", [path]))
+        report["prompts"].append(dotted)
+
+    system, developer = texts.get("finance.clarifier.system"), texts.get("finance.clarifier.developer")
+    if system and developer:
+        prefix = prompt_builder.finance_system_prompt(system[0], developer[0])
+        records.append(("rendered:finance.system", prefix.encode("utf-8"), "text", [system[1], developer[1], *code]))
+        report["rendered"].append("finance.system")
+
+    blob, report["digest"] = _pack(records)
+    report["bytes"] = len(blob)
+    return blob, report
+
+def write_bundle(blob: bytes, path: str = BUNDLE_PATH) -> None:
+    """Atomic replace; processes that already mapped the old file keep reading it."""
+    target = Path(path)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp = target.with_name(f"{target.name}.{os.getpid()}.tmp")
+    tmp.write_bytes(blob)
+    os.replace(tmp, target)
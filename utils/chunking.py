@@ -0,0 +1,239 @@
+# utils/chunking.py
+from __future__ import annotations
+import asyncio
+import re
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
+
+from config import env
+from utils.llm import achat_completion
+from utils.metrics import annotate
+from utils.prompt_builder import build_prompt
+
+# ✅ Long-note knobs (approximate tokens, ~4 chars each)
+CHUNK_THRESHOLD_TOKENS = int(env("AUDIT_CHUNK_THRESHOLD_TOKENS", "1500"))  # single call at or below this
+CHUNK_TOKENS           = int(env("AUDIT_CHUNK_TOKENS", "900"))
+CHUNK_OVERLAP_TOKENS   = int(env("AUDIT_CHUNK_OVERLAP_TOKENS", "60"))
+CHUNK_CONCURRENCY      = int(env("AUDIT_CHUNK_CONCURRENCY", "6"))
+
+_PARAGRAPHS = re.compile(r"\n\s*\n")
+_SENTENCES = re.compile(r"(?<=[.!?;])\s+(?=[A-Z0-9(\"“])")
+_BULLET = re.compile(r"^\s*(?:[-*•]|\d+[.)])\s+")
+_WORDS = re.compile(r"[a-z0-9$%]+")
+
+def approx_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+def needs_chunking(note: str, threshold: int = CHUNK_THRESHOLD_TOKENS) -> bool:
+    return approx_tokens(note) > threshold
+
+# ---------- split ----------
+def _units(text: str, max_tokens: int) -> List[str]:
+    """Paragraphs, falling back to sentences, then word runs, so no unit exceeds max_tokens."""
+    units: List[str] = []
+    for para in (p.strip() for p in _PARAGRAPHS.split(text)):
+        if not para:
+            continue
+        if approx_tokens(para) <= max_tokens:
+            units.append(para)
+            continue
+        for sent in (s.strip() for s in _SENTENCES.split(para)):
+            if approx_tokens(sent) <= max_tokens:
+                units.append(sent)
+                continue
+            words, buf = sent.split(), []
+            for w in words:
+                if buf and approx_tokens(" ".join(buf + [w])) > max_tokens:
+                    units.append(" ".join(buf))
+                    buf = []
+                buf.append(w)
+            if buf:
+                units.append(" ".join(buf))
+    return units
+
+def _tail_sentences(unit: str, max_tokens: int) -> List[str]:
+    tail: List[str] = []
+    for sent in reversed(_SENTENCES.split(unit)):
+        if approx_tokens(" ".join([sent] + tail)) > max_tokens:
+            break
+        tail.insert(0, sent)
+    return [" ".join(tail)] if tail else []
+
+def split_note(
+    text: str,
+    max_tokens: int = CHUNK_TOKENS,
+    overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+) -> List[str]:
+    """
+    Greedy token-aware split on paragraph/sentence boundaries. Each chunk
+    after the first starts with the trailing units of the previous chunk
+    (up to overlap_tokens) so findings that straddle a cut keep context.
+    """
+    chunks: List[str] = []
+    current: List[str] = []
+    size = 0
+    for unit in _units(text, max_tokens):
+        t = approx_tokens(unit)
+        if current and size + t > max_tokens:
+            chunks.append("\n\n".join(current))
+            carry: List[str] = []
+            carried = 0
+            for prev in reversed(current):
+                pt = approx_tokens(prev)
+                if carried + pt > overlap_tokens:
+                    if not carry:  # long last unit: carry its trailing sentences instead
+                        carry = _tail_sentences(prev, overlap_tokens)
+                        carried = sum(approx_tokens(c) for c in carry)
+                    break
+                carry.insert(0, prev)
+                carried += pt
+            current, size = carry, carried
+        current.append(unit)
+        size += t
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+# ---------- merge ----------
+# Sections in the order build_prompt's "Output format" asks for them
+SECTIONS: Tuple[Tuple[str, Tuple[str, ...]], ...] = (
+    ("Summary of issues", ("summary",)),
+    ("Improved wording (before → after)", ("wording", "redline", "before", "rewrite", "revised")),
+    ("Clarifying questions", ("question",)),
+    ("Risks / compliance considerations", ("risk", "compliance")),
+    ("Recommendations", ("recommend", "action", "next step")),
+)
+OTHER = "Other findings"
+
+def _section_for(line: str) -> Optional[str]:
+    """Return a canonical section name if `line` looks like a section heading."""
+    stripped = line.strip()
+    heading = (
+        stripped.startswith("#")
+        or (stripped.startswith("**") and stripped.rstrip(":").endswith("**"))
+        or (stripped.endswith(":") and len(stripped) < 60 and not _BULLET.match(stripped))
+    )
+    if not heading:
+        return None
+    lowered = stripped.lower()
+    for name, keywords in SECTIONS:
+        if any(k in lowered for k in keywords):
+            return name
+    return OTHER
+
+def _parse_review(text: str) -> Dict[str, List[str]]:
+    sections: Dict[str, List[str]] = {}
+    current = OTHER
+    item: List[str] = []
+
+    def flush():
+        if item:
+            sections.setdefault(current, []).append("\n".join(item).strip())
+            item.clear()
+
+    for line in text.splitlines():
+        name = _section_for(line)
+        if name is not None:
+            flush()
+            current = name
+        elif not line.strip():
+            flush()
+        elif _BULLET.match(line) and not line.startswith((" ", "\t")):
+            flush()
+            item.append(_BULLET.sub("", line, count=1))
+        else:
+            item.append(line.rstrip())
+    flush()
+    return sections
+
+# The four sections AUDIT_PREAMBLE's "Output format" asks for; recommendations
+# are often folded into the wording section, so they are not required.
+REQUIRED_SECTIONS = tuple(name for name, _ in SECTIONS[:4])
+
+def missing_sections(review: str) -> List[str]:
+    """Required sections with no content in a review (structural check, no model)."""
+    found = _parse_review(review)
+    return [name for name in REQUIRED_SECTIONS if not found.get(name)]
+
+def _signature(text: str) -> frozenset:
+    return frozenset(_WORDS.findall(text.lower()))
+
+def _is_duplicate(sig: frozenset, seen: List[frozenset], threshold: float = 0.8) -> bool:
+    for other in seen:
+        union = len(sig | other)
+        if union and len(sig & other) / union >= threshold:
+            return True
+    return False
+
+def merge_reviews(reviews: List[str]) -> str:
+    """Combine per-chunk reviews section by section, dropping near-duplicate findings."""
+    merged: Dict[str, List[str]] = {}
+    seen: Dict[str, List[frozenset]] = {}
+    for review in reviews:
+        for section, items in _parse_review(review).items():
+            for it in items:
+                sig = _signature(it)
+                if not sig or _is_duplicate(sig, seen.setdefault(section, [])):
+                    continue
+                seen[section].append(sig)
+                merged.setdefault(section, []).append(it)
+
+    out: List[str] = []
+    for name in [s for s, _ in SECTIONS] + [OTHER]:
+        items = merged.get(name)
+        if not items:
+            continue
+        out.append(f"**{name}**")
+        out.extend(f"- {it}" for it in items)
+        out.append("")
+    return "\n".join(out).strip() + "\n"
+
+# ---------- map-reduce ----------
+async def review_long_note(
+    client: Any,
+    module_data: Mapping[str, Any],
+    note: str,
+    *,
+    model: str,
+    concurrency: int = CHUNK_CONCURRENCY,
+    bypass_cache: bool = False,
+    on_chunk: Optional[Callable[[int, int], None]] = None,
+) -> Dict[str, Any]:
+    """
+    Review each chunk concurrently with the same module context, then merge.
+    Returns {"text", "chunks", "failed"}.
+    """
+    chunks = split_note(note)
+    annotate(chunks=len(chunks))
+    sem = asyncio.Semaphore(max(1, concurrency))
+    done = 0
+
+    async def one(i: int, chunk: str) -> Optional[str]:
+        nonlocal done
+        async with sem:
+            part = f"(Part {i + 1} of {len(chunks)} of a longer note.)\n\n{chunk}"
+            try:
+                result = await achat_completion(
+                    client, model=model, messages=build_prompt(module_data, part), bypass_cache=bypass_cache
+                )
+                return result.text
+            except Exception:
+                return None
+            finally:
+                done += 1
+                if on_chunk is not None:
+                    on_chunk(done, len(chunks))
+
+    reviews = await asyncio.gather(*(one(i, c) for i, c in enumerate(chunks)))
+    ok = [r for r in reviews if r]
+    if not ok:
+        raise RuntimeError("Every chunk of the note failed to review.")
+    return {"text": merge_reviews(ok), "chunks": len(chunks), "failed": len(chunks) - len(ok)}
+
+def run_long_review(client_factory: Callable[[], Any], module_data: Mapping[str, Any], note: str, **kwargs: Any) -> Dict[str, Any]:
+    """Synchronous entry point for Streamlit: one event loop + async client per review."""
+
+    async def main() -> Dict[str, Any]:
+        async with client_factory() as client:
+            return await review_long_note(client, module_data, note, **kwargs)
+
+    return asyncio.run(main())
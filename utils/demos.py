@@ -0,0 +1,218 @@
+# utils/demos.py
+"""
+Precomputed results for the "Try Demo" inputs.
+
+Every module's `sample_note` and the finance demo text are reviewed once and
+stored in a versioned JSON artifact keyed by prompt hash (the rendered
+messages plus generation parameters). Because the key is the prompt itself,
+editing a module YAML or a prompt file simply produces a new hash: the old
+entry stops matching, the page falls back to a live call, and the fresh
+answer is written back. refresh() (run by tools/precompute_demos.py at build
+time and, with DEMO_AUTO_REFRESH=1, by the startup preload) regenerates
+missing entries and drops obsolete ones ahead of time.
+"""
+from __future__ import annotations
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from config import env
+
+# ✅ Demo knobs (override via env vars)
+ARTIFACT_PATH = env("DEMO_ARTIFACT", "artifacts/demo_results.json")  # empty = no precomputed demos
+AUTO_REFRESH  = env("DEMO_AUTO_REFRESH", "0") == "1"  # also regenerate stale entries after the startup preload (CI precomputes them)
+
+ARTIFACT_VERSION = 1
+
+FINANCE_DEMO_TEXT = (
+    "I want to save more but my credit card balance keeps growing. "
+    "Maybe cut dining? Not sure."
+)
+# Generation parameters of the finance page's call (part of the prompt hash)
+FINANCE_TEMPERATURE = 0.2
+FINANCE_MAX_TOKENS = 900
+
+def prompt_hash(
+    messages: List[Dict[str, str]],
+    temperature: Optional[float] = None,
+    max_tokens: Optional[int] = None,
+    response_format: Optional[Dict[str, Any]] = None,
+) -> str:
+    """Deployment-independent hash of everything that shapes the answer."""
+    blob = json.dumps(
+        {"messages": messages, "temperature": temperature, "max_tokens": max_tokens,
+         "response_format": response_format},
+        sort_keys=True, ensure_ascii=False, separators=(",", ":"),
+    )
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+def demo_specs() -> List[Dict[str, Any]]:
+    """The current demo requests (one per module with a sample_note, plus finance)."""
+    from utils.module_loader import load_module, module_ids
+    from utils.prompt_builder import build_finance_prompt, build_prompt
+    from utils.schema_finance import finance_response_format
+
+    specs = []
+    for module_id in module_ids():
+        try:
+            module_data = load_module(module_id)
+        except FileNotFoundError:
+            continue
+        note = (module_data.get("sample_note") or "").strip()
+        if not note:
+            continue
+        messages = build_prompt(module_data, note)
+        specs.append({"kind": "audit", "module_id": module_id, "label": module_data.get("title", ""),
+                      "messages": messages, "params": {}, "hash": prompt_hash(messages)})
+
+    structured = os.environ.get("FINANCE_STRUCTURED_OUTPUT", "1") == "1"  # same switch as prompt_builder.finance_request
+    params = {"temperature": FINANCE_TEMPERATURE, "max_tokens": FINANCE_MAX_TOKENS,
+              "response_format": finance_response_format() if structured else None}
+    messages = build_finance_prompt(FINANCE_DEMO_TEXT)
+    specs.append({"kind": "finance", "module_id": None, "label": "Financial Clarity demo",
+                  "messages": messages, "params": params, "hash": prompt_hash(messages, **params)})
+    return specs
+
+class DemoStore:
+    """The artifact file, re-read whenever its mtime changes and written atomically."""
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._mtime: Optional[float] = None
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._stats = {"hits": 0, "misses": 0, "writes": 0}
+
+    def _load(self) -> None:
+        try:
+            mtime = self.path.stat().st_mtime
+        except FileNotFoundError:
+            self._mtime, self._entries = None, {}
+            return
+        if mtime == self._mtime:
+            return
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            data = {}
+        # An artifact from another format version is ignored (and rewritten on the next put)
+        self._entries = data.get("entries", {}) if data.get("version") == ARTIFACT_VERSION else {}
+        self._mtime = mtime
+
+    def _save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(
+            {"version": ARTIFACT_VERSION, "updated_at": round(time.time(), 3), "entries": self._entries},
+            indent=1, sort_keys=True, ensure_ascii=False,
+        ), encoding="utf-8")
+        os.replace(tmp, self.path)
+        self._mtime = self.path.stat().st_mtime
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            self._load()
+            entry = self._entries.get(key)
+            self._stats["hits" if entry else "misses"] += 1
+            return entry
+
+    def put(self, key: str, entry: Dict[str, Any]) -> None:
+        with self._lock:
+            self._load()
+            self._entries[key] = {**entry, "generated_at": round(time.time(), 3)}
+            self._stats["writes"] += 1
+            self._save()
+
+    def keys(self) -> List[str]:
+        with self._lock:
+            self._load()
+            return list(self._entries)
+
+    def prune(self, keep: List[str]) -> int:
+        """Drop entries whose prompt no longer exists; returns how many."""
+        with self._lock:
+            self._load()
+            stale = [k for k in self._entries if k not in set(keep)]
+            for k in stale:
+                del self._entries[k]
+            if stale:
+                self._save()
+            return len(stale)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {**self._stats, "entries": len(self._entries)}
+
+_STORE: Optional[DemoStore] = None
+_STORE_LOCK = threading.Lock()
+
+def get_demo_store() -> Optional[DemoStore]:
+    """Process-wide store, or None when DEMO_ARTIFACT is empty."""
+    global _STORE
+    if not ARTIFACT_PATH:
+        return None
+    with _STORE_LOCK:
+        if _STORE is None:
+            _STORE = DemoStore(ARTIFACT_PATH)
+        return _STORE
+
+def lookup(messages: List[Dict[str, str]], **params: Any) -> Optional[Dict[str, Any]]:
+    store = get_demo_store()
+    return store.get(prompt_hash(messages, **params)) if store else None
+
+def remember(messages: List[Dict[str, str]], text: str, *, kind: str, model: str, source: str = "live",
+             module_id: Optional[int] = None, **params: Any) -> None:
+    """Write a demo answer back so the next visitor gets it instantly (if it passes the output check)."""
+    from utils.router import check_output
+
+    store = get_demo_store()
+    if store is None or check_output(kind, text):
+        return
+    store.put(prompt_hash(messages, **params),
+              {"kind": kind, "module_id": module_id, "model": model, "source": source, "text": text})
+
+def refresh(client: Any, model: str, *, force: bool = False, prune: bool = True) -> Dict[str, Any]:
+    """
+    Generate every missing (or, with force, every) demo result and drop
+    obsolete ones. Answers go through the router's output check, so a
+    malformed result is reported instead of stored.
+    """
+    from utils.llm import chat_completion
+    from utils.router import check_output
+
+    store = get_demo_store()
+    report: Dict[str, Any] = {"fresh": 0, "generated": [], "failed": {}, "pruned": 0}
+    if store is None:
+        return report
+    specs = demo_specs()
+    existing = set(store.keys())
+    for spec in specs:
+        name = f"{spec['kind']}:{spec['module_id'] or spec['label']}"
+        if spec["hash"] in existing and not force:
+            report["fresh"] += 1
+            continue
+        try:
+            result = chat_completion(client, model=model, messages=spec["messages"], bypass_cache=force, **spec["params"])
+        except Exception as e:
+            report["failed"][name] = f"{type(e).__name__}: {e}"
+            continue
+        problem = check_output(spec["kind"], result.text)
+        if problem:
+            report["failed"][name] = problem
+            continue
+        store.put(spec["hash"], {"kind": spec["kind"], "module_id": spec["module_id"], "model": result.model,
+                                 "source": "build", "text": result.text, "usage": result.usage})
+        report["generated"].append(name)
+    if prune:
+        report["pruned"] = store.prune([s["hash"] for s in specs])
+    return report
+
+def stale() -> List[str]:
+    """Demo names whose current prompt has no stored result."""
+    store = get_demo_store()
+    keys = set(store.keys()) if store else set()
+    return [f"{s['kind']}:{s['module_id'] or s['label']}" for s in demo_specs() if s["hash"] not in keys]
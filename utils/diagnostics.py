@@ -1,21 +1,54 @@
 # utils/diagnostics.py
+import os
 import streamlit as st
 
-def show_prompts(system: str, developer: str, user_msg: str, dep: str, ver: str):
-    """Dump quick diagnostic info into the Streamlit UI."""
-    st.write("🔎 Types:", type(system), type(developer), type(user_msg))
-    st.write("🔎 Deployment:", repr(dep))
-    st.write("🔎 API version:", repr(ver))
-    st.write("🧩 system[:60]:", repr(system[:60]))
-    st.write("🧩 developer[:60]:", repr(developer[:60]))
+from utils import metrics
+from utils.startup import startup_profile
 
-def assert_valid(system: str, developer: str, user_msg: str):
-    """Ensure values are strings and not dotted paths."""
-    assert isinstance(system, str), f"system is not str: {type(system)}"
-    assert isinstance(developer, str), f"developer is not str: {type(developer)}"
-    assert isinstance(user_msg, str), f"user_msg is not str: {type(user_msg)}"
+def debug_enabled() -> bool:
+    """Debug panel is on with CLARITY_DEBUG=1 or ?debug=1 in the page URL."""
+    if os.environ.get("CLARITY_DEBUG", "") == "1":
+        return True
+    try:
+        return st.query_params.get("debug") == "1"
+    except Exception:
+        return False
+
+def render_debug_panel(trace):
+    """Per-run stage timings, usage, prompt snippets and process-wide metrics."""
+    if trace is None or not debug_enabled():
+        return
+    with st.expander("🔎 Debug: timings & metrics"):
+        data = trace.to_dict()
+        st.markdown(f"**Trace** `{data['trace_id']}` · total {data['total_ms'] or 0:.1f} ms"
+                    + (f" · TTFT {data['ttft_ms']:.1f} ms" if data["ttft_ms"] is not None else ""))
+        if data["stages_ms"]:
+            st.table([{"stage": k, "ms": v} for k, v in data["stages_ms"].items()])
+        attrs = {k: v for k, v in data.items() if k not in ("stages_ms", "ttft_ms", "total_ms", "usage")}
+        st.json({"attrs": attrs, "usage": data["usage"]}, expanded=False)
+
+        for i, m in enumerate(trace.messages):
+            content = m.get("content") or ""
+            st.write(f"🧩 [{i}] {m.get('role')} ({len(content)} chars):", repr(content[:120]))
+
+        ratios = metrics.prompt_cache_ratios()
+        if ratios:
+            st.markdown("**Prompt-cache hit ratio (cached / prompt tokens)**")
+            st.table([{"series": k, "ratio": v} for k, v in ratios.items()])
+
+        st.markdown("**Startup profile** (imports, preload, first render)")
+        st.json(startup_profile(), expanded=False)
+
+        st.markdown("**Process metrics**")
+        st.json(metrics.snapshot(), expanded=False)
+        st.code(metrics.prometheus_text(), language="text")
+
+def assert_valid(*parts: str):
+    """Ensure message contents are strings and not dotted paths."""
+    for i, part in enumerate(parts):
+        assert isinstance(part, str), f"message {i} is not str: {type(part)}"
 
     bad = "prompts.finance.clarifier.system"
-    if bad in system or bad in developer or bad in user_msg:
+    if any(bad in part for part in parts):
         st.error(f"❌ Found dotted path literal inside prompts/messages: '{bad}'")
         st.stop()
@@ -0,0 +1,483 @@
+# utils/finance_sim.py
+"""
+Local debt-payoff and savings simulator for the Financial Clarity page.
+
+parse_inputs() turns the free-text context fields ("Card A $3.2k @ 23%",
+"$5k emergency fund by Dec", "5200") into numbers. simulate() runs an
+avalanche or snowball payoff plus savings accumulation month by month with
+NumPy arrays over every debt, and over a batch of budgets, at once.
+analyze() compares both strategies for one set of inputs, and facts_block()
+turns the report into prompt facts, so the model quotes exact timelines and
+interest totals instead of doing arithmetic.
+
+Assumptions (also listed in every report): interest compounds monthly at
+APR/12; a debt without a stated minimum pays interest + MIN_PAYMENT_PCT of
+the starting balance (at least MIN_PAYMENT_FLOOR) as a fixed payment; a
+payment freed by a paid-off debt rolls into the next one, a savings
+contribution toward a target moves to debt once the target is met, and once
+every debt is gone the whole debt budget goes to savings.
+"""
+from __future__ import annotations
+import datetime
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+import numpy as np
+
+from config import env
+
+# ✅ Simulator knobs (override via env vars)
+MAX_MONTHS        = int(env("FINANCE_SIM_MAX_MONTHS", "600"))       # give up on payoff after this long
+SAVINGS_APY       = float(env("FINANCE_SAVINGS_APY", "0"))          # yield on savings (0 = conservative)
+MIN_PAYMENT_PCT   = float(env("FINANCE_MIN_PAYMENT_PCT", "0.01"))   # principal share of an unstated minimum
+MIN_PAYMENT_FLOOR = float(env("FINANCE_MIN_PAYMENT_FLOOR", "25"))
+FACTS_MAX_TOKENS  = int(env("FINANCE_FACTS_MAX_TOKENS", "700"))     # plan budget when the math is supplied
+SWEEP_MONTHS      = int(env("FINANCE_SWEEP_MONTHS", "120"))         # what-if horizon
+SWEEP_STEPS       = int(env("FINANCE_SWEEP_STEPS", "21"))           # grid points per dollar axis
+SWEEP_MAX_CUT     = float(env("FINANCE_SWEEP_MAX_CUT", "0.3"))      # largest expense cut proposed, share of expenses
+
+STRATEGIES = ("avalanche", "snowball")
+_EPS = 0.005  # balances below half a cent count as paid
+
+@dataclass(frozen=True)
+class Debt:
+    name: str
+    balance: float
+    apr: float              # percent, e.g. 23.0
+    minimum: float          # monthly payment
+
+@dataclass
+class Goal:
+    target: Optional[float] = None   # total, e.g. 5000
+    monthly: Optional[float] = None  # contribution, e.g. 300
+    months: Optional[int] = None     # deadline, in months from now
+    label: str = ""
+
+@dataclass
+class Inputs:
+    debts: List[Debt] = field(default_factory=list)
+    income: Optional[float] = None    # monthly
+    expenses: Optional[float] = None  # monthly
+    goal: Optional[Goal] = None
+    extra_payment: Optional[float] = None  # chosen what-if scenario: fixed extra toward debt...
+    savings_rate: Optional[float] = None   # ...and this share of income to savings
+    assumptions: List[str] = field(default_factory=list)
+    unparsed: List[str] = field(default_factory=list)
+
+# ---------- parsing ----------
+# A whole number (never the tail of a longer one, never a percentage), optionally "$"-prefixed or k/m-suffixed
+_MONEY = re.compile(r"(?<![\w.,%$])(\$\s?)?(\d{1,3}(?:,\d{3})+|\d+(?:\.\d+)?)(?!\d|[.,]\d|\s?%)"
+                    r"(?:\s?([kKmM])(?![a-zA-Z]))?")
+_RATE = re.compile(r"(\d+(?:\.\d+)?)\s?%\s?(?:apr|apy|interest)?", re.I)
+_MIN = re.compile(r"\bmin(?:imum)?\.?(?:\s+payment)?\s*(?:of|is|=|:)?\s*", re.I)
+_SEGMENTS = re.compile(r"[;\n]+|,\s+(?=[A-Za-z])(?!min)", re.I)
+_NAME_TAIL = re.compile(r"(?:\s+(?:balance|bal|owed|owe|of|at|is|with))+\s*$", re.I)
+_PER = {
+    r"/\s?(?:yr|year)|\ba year\b|\bper year\b|\bannual(?:ly)?\b|\byearly\b": 1 / 12,
+    r"\bbi-?weekly\b|every (?:two|2) weeks": 26 / 12,
+    r"/\s?(?:wk|week)|\ba week\b|\bper week\b|\bweekly\b": 52 / 12,
+}
+_MONTHS = {m.lower(): i for i in range(1, 13) for m in (datetime.date(2000, i, 1).strftime("%b"),
+                                                        datetime.date(2000, i, 1).strftime("%B"))}
+_BY_MONTH = re.compile(r"\bby\s+(" + "|".join(sorted(_MONTHS, key=len, reverse=True)) + r")\b\.?\s*(\d{4})?", re.I)
+_IN_MONTHS = re.compile(r"\b(?:in|within|over|next)\s+(\d+)\s*(month|mo|year|yr)s?\b", re.I)
+_YEAR = re.compile(r"(?<![$\d,.])\b(?:19|20)\d{2}\b(?![\d,]|\.\d|\s?[kKmM%])")
+_MONTHLY = re.compile(r"/\s?mo(?:nth)?\b|\bper month\b|\ba month\b|\bmonthly\b|\beach month\b", re.I)
+
+def _value(m: re.Match) -> float:
+    suffix = (m.group(3) or "").lower()
+    return float(m.group(2).replace(",", "")) * (1_000 if suffix == "k" else 1_000_000 if suffix == "m" else 1)
+
+def _explicit(m: re.Match) -> bool:
+    return bool(m.group(1) or m.group(3))
+
+def _pick(text: str, before: Optional[int] = None) -> Optional[re.Match]:
+    """
+    The dollar amount in text: the first "$"/k/m-marked one, else the last
+    bare number before position `before` (a rate), else the last one. So
+    "Card 1 $3,000" and "Visa 4421 balance 3000 @ 20%" skip the name's number.
+    """
+    found = list(_MONEY.finditer(text))
+    if not found:
+        return None
+    marked = [m for m in found if _explicit(m)]
+    if marked:
+        return marked[0]
+    ahead = [m for m in found if before is not None and m.end() <= before]
+    return (ahead or found)[-1]
+
+def parse_amount(text: Any) -> Optional[float]:
+    """The dollar amount in text ("$3.2k", "5,200", "1.1K"; never "15%"), or None."""
+    m = _pick(str(text or ""))
+    return _value(m) if m else None
+
+def parse_income(text: Any) -> Optional[float]:
+    """Monthly income; yearly/weekly amounts are converted."""
+    value = parse_amount(text)
+    if value is None:
+        return None
+    for pattern, factor in _PER.items():
+        if re.search(pattern, str(text), re.I):
+            return value * factor
+    return value
+
+def parse_debts(text: Any) -> Inputs:
+    """Split a debt summary into Debts; unparsed pieces and guesses are recorded."""
+    out = Inputs()
+    for seg in (s.strip() for s in _SEGMENTS.split(str(text or ""))):
+        if not seg:
+            continue
+        rate = _RATE.search(seg)
+        rest = seg[:rate.start()] + " " + seg[rate.end():] if rate else seg
+        minimum = None
+        m = _MIN.search(rest)
+        if m:
+            minimum = parse_amount(rest[m.end():])
+            rest = rest[:m.start()]
+        money = _pick(rest, before=rate.start() if rate else None)
+        if not money:
+            out.unparsed.append(seg)
+            continue
+        balance = _value(money)
+        name = _NAME_TAIL.sub("", rest[:money.start()].strip(" :-–—,@")).strip(" :-–—,@")
+        name = name or f"Debt {len(out.debts) + 1}"
+        apr = float(rate.group(1)) if rate else 0.0
+        if not rate:
+            out.assumptions.append(f"{name}: no APR given; simulated at 0%.")
+        if minimum is None:
+            minimum = min(balance, max(MIN_PAYMENT_FLOOR, balance * (apr / 1200 + MIN_PAYMENT_PCT)))
+            out.assumptions.append(f"{name}: no minimum given; assumed ${minimum:,.2f}/mo.")
+        if balance > 0:
+            out.debts.append(Debt(name=name, balance=balance, apr=apr, minimum=minimum))
+    return out
+
+def _months_until(month: int, year: Optional[int], today: datetime.date) -> int:
+    if year is None:
+        year = today.year if month > today.month else today.year + 1
+    return max(1, (year - today.year) * 12 + month - today.month)
+
+def parse_goal(text: Any, today: Optional[datetime.date] = None, income: Optional[float] = None) -> Optional[Goal]:
+    """
+    "$300/mo" -> monthly contribution; "$5k emergency fund by Dec" -> target
+    + deadline (no target when only the deadline has a number, e.g. "house
+    fund in 2 years"); "save 15% of income" -> that share of `income` per month
+    (None without an income: a percentage is never read as dollars).
+    """
+    text = str(text or "").strip()
+    # Deadlines ("by Dec 2027", "in 2 years") and bare years are dates, not dollars
+    money_text = text
+    for pattern in (_BY_MONTH, _IN_MONTHS, _YEAR):
+        money_text = pattern.sub(lambda m: " " * len(m.group(0)), money_text)
+    amount = parse_amount(money_text)
+    if amount is None:
+        share = _RATE.search(text)
+        if share and income:
+            return Goal(monthly=round(income * float(share.group(1)) / 100, 2), label=text)
+        return None
+    today = today or datetime.date.today()
+    if _MONTHLY.search(text):
+        return Goal(monthly=amount, label=text)
+    goal = Goal(target=amount, label=text)
+    by = _BY_MONTH.search(text)
+    within = _IN_MONTHS.search(text)
+    if by:
+        goal.months = _months_until(_MONTHS[by.group(1).lower()], int(by.group(2)) if by.group(2) else None, today)
+    elif within:
+        goal.months = int(within.group(1)) * (12 if within.group(2).lower().startswith("y") else 1)
+    return goal
+
+def parse_inputs(debts: Any = "", income: Any = "", goals: Any = "", expenses: Any = None,
+                 today: Optional[datetime.date] = None) -> Inputs:
+    """Everything the page collects (sidebar + refinement expander) as numbers."""
+    out = parse_debts(debts)
+    out.income = parse_income(income)
+    out.expenses = float(expenses) if expenses not in (None, "") else None
+    out.goal = parse_goal(goals, today, income=out.income)
+    return out
+
+# ---------- simulation ----------
+@dataclass
+class Simulation:
+    """Batched result: B scenarios x N debts over T months (row 0 = today)."""
+    strategy: str
+    names: List[str]
+    payoff: np.ndarray      # (B, N) month each debt hits zero, -1 = not within the horizon
+    interest: np.ndarray    # (B, N) interest paid per debt
+    debt: np.ndarray        # (T+1, B) total debt at each month end
+    savings: np.ndarray     # (T+1, B) savings balance at each month end
+
+    @property
+    def months(self) -> np.ndarray:
+        """(B,) months until debt-free, -1 = not within the horizon."""
+        if self.payoff.shape[1] == 0:
+            return np.zeros(self.payoff.shape[0], dtype=int)
+        return np.where((self.payoff < 0).any(axis=1), -1, self.payoff.max(axis=1))
+
+def priority(debts: Sequence[Debt], strategy: str) -> np.ndarray:
+    """Extra-payment order: avalanche = highest APR first, snowball = smallest balance first."""
+    bal = np.array([d.balance for d in debts])
+    apr = np.array([d.apr for d in debts])
+    if strategy == "avalanche":
+        return np.lexsort((bal, -apr))
+    if strategy == "snowball":
+        return np.lexsort((-apr, bal))
+    raise ValueError(f"unknown strategy: {strategy}")
+
+def simulate(debts: Sequence[Debt], debt_budget: Union[float, np.ndarray], savings_budget: Union[float, np.ndarray] = 0.0,
+             strategy: str = "avalanche", months: int = MAX_MONTHS, min_months: int = 0,
+             apy: float = SAVINGS_APY, savings_target: Optional[float] = None) -> Simulation:
+    """
+    Month-by-month payoff for every debt and every (debt_budget,
+    savings_budget) pair at once. Minimums are always paid; whatever is left
+    of the debt budget goes to debts in priority order, then to savings.
+    Once savings reach `savings_target` the savings budget joins the debt budget.
+    Stops after `months`, or earlier once every debt is paid and at least
+    `min_months` have passed.
+    """
+    debt_budget, savings_budget = np.broadcast_arrays(np.atleast_1d(np.asarray(debt_budget, dtype=float)),
+                                                      np.atleast_1d(np.asarray(savings_budget, dtype=float)))
+    batch, n = debt_budget.shape[0], len(debts)
+    rate = np.array([d.apr for d in debts], dtype=float) / 1200.0
+    mins = np.array([d.minimum for d in debts], dtype=float)
+    order = priority(debts, strategy) if n else np.zeros(0, dtype=int)
+
+    bal = np.tile(np.array([d.balance for d in debts], dtype=float), (batch, 1))
+    sav = np.zeros(batch)
+    interest = np.zeros((batch, n))
+    payoff = np.full((batch, n), -1, dtype=int)
+    growth = apy / 12.0
+    cap = np.inf if savings_target is None else savings_target
+    debt_curve, sav_curve = [bal.sum(axis=1)], [sav.copy()]
+
+    for t in range(1, months + 1):
+        funded = sav >= cap
+        to_debt = np.where(funded, debt_budget + savings_budget, debt_budget)
+        to_savings = np.where(funded, 0.0, savings_budget)
+        charged = bal * rate
+        interest += charged
+        bal = bal + charged
+        pay = np.minimum(mins, bal)
+        extra = np.maximum(to_debt - pay.sum(axis=1), 0.0)
+        rest = (bal - pay)[:, order]
+        before = np.cumsum(rest, axis=1) - rest  # owed on higher-priority debts
+        alloc = np.clip(extra[:, None] - before, 0.0, rest)
+        bal = bal - pay
+        bal[:, order] -= alloc
+        bal[bal < _EPS] = 0.0
+        leftover = extra - alloc.sum(axis=1)
+        sav = sav * (1 + growth) + to_savings + leftover
+        payoff[(payoff < 0) & (bal == 0.0)] = t
+        debt_curve.append(bal.sum(axis=1))
+        sav_curve.append(sav.copy())
+        if t >= min_months and not bal.any():
+            break
+    return Simulation(strategy=strategy, names=[d.name for d in debts], payoff=payoff, interest=interest,
+                      debt=np.array(debt_curve), savings=np.array(sav_curve))
+
+# ---------- single-plan report ----------
+def month_label(n: int, today: Optional[datetime.date] = None) -> str:
+    """'Mar 2027' for n months after today's month."""
+    today = today or datetime.date.today()
+    y, m = divmod(today.month - 1 + n, 12)
+    return datetime.date(today.year + y, m + 1, 1).strftime("%b %Y")
+
+def budgets(inputs: Inputs) -> Dict[str, Any]:
+    """Split income - expenses into minimums, extra debt payment and savings."""
+    minimums = sum(d.minimum for d in inputs.debts)
+    goal = inputs.goal
+    wanted = 0.0
+    if goal is not None:
+        if goal.monthly is not None:
+            wanted = goal.monthly
+        elif goal.target is not None and goal.months:
+            wanted = goal.target / goal.months
+    if inputs.income is None or inputs.expenses is None:
+        # No budget to work with: minimums only, savings as stated
+        return {"available": None, "minimums": minimums, "debt_budget": minimums, "savings_budget": wanted,
+                "shortfall": 0.0, "minimums_only": True}
+    available = inputs.income - inputs.expenses
+    if inputs.extra_payment is not None:
+        # A committed what-if scenario fixes both amounts (same split as sweep())
+        savings = (inputs.savings_rate or 0.0) * inputs.income
+        debt_budget = minimums + inputs.extra_payment
+        return {"available": available, "minimums": minimums, "debt_budget": debt_budget, "savings_budget": savings,
+                "shortfall": max(0.0, debt_budget + savings - available), "minimums_only": False}
+    savings = max(0.0, min(wanted, available - minimums))
+    return {"available": available, "minimums": minimums, "debt_budget": max(minimums, available - savings),
+            "savings_budget": savings, "shortfall": max(0.0, minimums + wanted - available), "minimums_only": False}
+
+def analyze(inputs: Inputs, today: Optional[datetime.date] = None) -> Optional[Dict[str, Any]]:
+    """Avalanche vs snowball (and savings) for one set of inputs; None when there is nothing to compute."""
+    goal = inputs.goal
+    has_budget = inputs.income is not None and inputs.expenses is not None
+    if not inputs.debts and not (goal and (goal.monthly or has_budget)):
+        return None
+    today = today or datetime.date.today()
+    plan = budgets(inputs)
+    horizon = max(12, (goal.months or 0) if goal else 0)
+    report: Dict[str, Any] = {
+        "income": inputs.income, "expenses": inputs.expenses, **plan,
+        "scenario": ({"extra_payment": inputs.extra_payment, "savings_rate": inputs.savings_rate or 0.0}
+                     if inputs.extra_payment is not None else None),
+        "debts": [vars(d) for d in inputs.debts], "strategies": {}, "savings": {},
+        "assumptions": list(inputs.assumptions), "unparsed": list(inputs.unparsed),
+    }
+    target = goal.target if goal is not None else None
+    sims = {s: simulate(inputs.debts, plan["debt_budget"], plan["savings_budget"], strategy=s, min_months=horizon,
+                        savings_target=target)
+            for s in (STRATEGIES if inputs.debts else STRATEGIES[:1])}
+    for name, sim in (sims.items() if inputs.debts else ()):
+        months = int(sim.months[0])
+        report["strategies"][name] = {
+            "months": months,
+            "debt_free": month_label(months, today) if months >= 0 else None,
+            "interest": round(float(sim.interest[0].sum()), 2),
+            "order": [{"name": sim.names[i], "month": int(sim.payoff[0, i]),
+                       "interest": round(float(sim.interest[0, i]), 2)} for i in priority(inputs.debts, name)],
+        }
+
+    base = sims["avalanche"]
+    curve = base.savings[:, 0]
+    savings: Dict[str, Any] = {"after_12_months": round(float(curve[min(12, len(curve) - 1)]), 2)}
+    if goal is not None and goal.target is not None:
+        reached = np.nonzero(curve >= goal.target)[0]
+        savings["target"] = goal.target
+        savings["reached_month"] = int(reached[0]) if reached.size else -1
+        savings["reached_label"] = month_label(int(reached[0]), today) if reached.size else None
+        if goal.months:
+            savings["deadline_months"] = goal.months
+            savings["at_deadline"] = round(float(curve[min(goal.months, len(curve) - 1)]), 2)
+    report["savings"] = savings
+    return report
+
+def facts_block(report: Optional[Dict[str, Any]]) -> str:
+    """The report as short fact lines for the prompt ('' when there is nothing to say)."""
+    if not report:
+        return ""
+    money = lambda v: "$0" if round(v, 2) == 0 else f"${v:,.0f}" if abs(v) >= 100 else f"${v:,.2f}"  # noqa: E731
+    target = report["savings"].get("target")
+    lines: List[str] = []
+    if report["minimums_only"]:
+        lines.append(f"- Income/expenses not both given: debt timelines assume minimum payments only "
+                     f"({money(report['minimums'])}/mo).")
+    else:
+        lines.append(f"- Monthly budget: income {money(report['income'])} - expenses {money(report['expenses'])} "
+                     f"= {money(report['available'])} available; {money(report['minimums'])} minimums, "
+                     f"{money(report['debt_budget'] - report['minimums'])} extra toward debt, "
+                     f"{money(report['savings_budget'])} to savings"
+                     + (f" until the {money(target)} target is met, then to debt." if target and report["debts"] else "."))
+        unallocated = report["available"] - report["debt_budget"] - report["savings_budget"]
+        if report["scenario"]:
+            lines.append(f"- Chosen what-if scenario: {money(report['scenario']['extra_payment'])}/mo extra toward "
+                         f"debt, {report['scenario']['savings_rate']:.1%} of income to savings"
+                         + (f", {money(unallocated)}/mo left unallocated." if unallocated >= 0.01 else "."))
+        if report["shortfall"] > 0:
+            lines.append(f"- Shortfall: planned debt payments and savings exceed what is available by "
+                         f"{money(report['shortfall'])}/mo.")
+    strategies = dict(report["strategies"])
+    if len(strategies) == 2 and strategies["avalanche"]["order"] == strategies["snowball"]["order"]:
+        strategies = {"avalanche and snowball (same order)": strategies["avalanche"]}
+    for name, s in strategies.items():
+        if s["months"] < 0:
+            lines.append(f"- {name.capitalize()}: not debt-free within {MAX_MONTHS} months at this budget "
+                         f"(payments do not outpace interest).")
+            continue
+        order = ", ".join(f"{o['name']} month {o['month']}" if o["month"] >= 0 else f"{o['name']} not paid off"
+                          for o in s["order"])
+        lines.append(f"- {name.capitalize()}: debt-free in {s['months']} months ({s['debt_free']}); "
+                     f"total interest {money(s['interest'])}; payoff order {order}.")
+    strategies = report["strategies"]
+    if len(strategies) == 2 and strategies["avalanche"]["order"] != strategies["snowball"]["order"] and all(s["months"] >= 0 for s in strategies.values()):
+        diff = strategies["snowball"]["interest"] - strategies["avalanche"]["interest"]
+        if abs(diff) >= 0.01:
+            lines.append(f"- Avalanche vs snowball: avalanche pays {money(abs(diff))} "
+                         f"{'less' if diff > 0 else 'more'} interest.")
+    sv = report["savings"]
+    if "target" in sv:
+        reached = (f"reached in month {sv['reached_month']} ({sv['reached_label']})"
+                   if sv["reached_month"] >= 0 else "not reached within the horizon")
+        lines.append(f"- Savings target {money(sv['target'])}: {reached}.")
+        if "at_deadline" in sv:
+            lines.append(f"- Savings at the goal deadline (month {sv['deadline_months']}): {money(sv['at_deadline'])}.")
+    lines.append(f"- Savings after 12 months: {money(sv['after_12_months'])}.")
+    lines += [f"- Assumption: {a}" for a in report["assumptions"]]
+    if report["unparsed"]:
+        lines.append(f"- Could not read: {'; '.join(report['unparsed'])} (ask about it).")
+    return "\n".join(lines)
+
+# ---------- what-if sweep ----------
+@dataclass
+class Sweep:
+    """
+    Outcomes over an extras x rates grid; every array is indexed [extra, rate].
+    An expense cut only funds a scenario (it changes no payment), so it is
+    not an axis: `cut` is the cut each scenario needs to fit the budget.
+    """
+    extras: np.ndarray      # extra toward debt on top of the minimums, $/mo
+    rates: np.ndarray       # share of income to savings
+    months: np.ndarray      # months to debt-free, -1 = not within the horizon
+    interest: np.ndarray    # total interest over the horizon
+    savings: np.ndarray     # savings balance after `horizon` months
+    slack: np.ndarray       # budget left after minimums + extra + savings at today's expenses (< 0 = over)
+    max_cut: float          # largest expense cut the explorer proposes, $/mo
+    horizon: int
+    elapsed_ms: float
+
+    @property
+    def size(self) -> int:
+        return self.months.size
+
+    @property
+    def cut(self) -> np.ndarray:
+        """Expense cut each scenario needs, whole $/mo rounded up; 0 when it already fits."""
+        return np.ceil(np.maximum(-self.slack, 0.0) - _EPS)
+
+    @property
+    def feasible(self) -> np.ndarray:
+        return self.cut <= self.max_cut + _EPS
+
+def _steps(top: float, steps: int) -> np.ndarray:
+    """0..top in `steps` points rounded to whole $10 (deduplicated)."""
+    top = max(0.0, top)
+    return np.unique(np.round(np.linspace(0.0, top, max(2, steps)) / 10.0) * 10.0)
+
+def sweep_axes(inputs: Inputs, steps: int = SWEEP_STEPS) -> Optional[Dict[str, np.ndarray]]:
+    """Default grid: extras up to what a SWEEP_MAX_CUT expense cut would free, 0-30% savings."""
+    if inputs.income is None or inputs.expenses is None:
+        return None
+    minimums = sum(d.minimum for d in inputs.debts)
+    room = inputs.income - inputs.expenses * (1 - SWEEP_MAX_CUT) - minimums
+    extras = _steps(room, steps) if inputs.debts else np.zeros(1)
+    rates = np.round(np.arange(0.0, 0.3001, 0.025), 3)
+    return {"extras": extras, "rates": rates}
+
+def sweep(inputs: Inputs, extras: Optional[np.ndarray] = None, rates: Optional[np.ndarray] = None,
+          horizon: int = SWEEP_MONTHS) -> Optional[Sweep]:
+    """
+    Every combination of extra debt payment and savings rate in one batched
+    simulate() call (avalanche order). Needs income and expenses; scenarios
+    that need more than a SWEEP_MAX_CUT expense cut are simulated too and
+    flagged by `feasible`.
+    """
+    axes = sweep_axes(inputs)
+    if axes is None:
+        return None
+    started = time.perf_counter()
+    extras = axes["extras"] if extras is None else np.asarray(extras, dtype=float)
+    rates = axes["rates"] if rates is None else np.asarray(rates, dtype=float)
+    extra, rate = np.meshgrid(extras, rates, indexing="ij")
+
+    minimums = sum(d.minimum for d in inputs.debts)
+    debt_budget = minimums + extra
+    savings_budget = rate * inputs.income
+    slack = inputs.income - inputs.expenses - debt_budget - savings_budget
+    target = inputs.goal.target if inputs.goal is not None else None
+    sim = simulate(inputs.debts, debt_budget.ravel(), savings_budget.ravel(), months=horizon, min_months=horizon,
+                   savings_target=target)
+    shape = extra.shape
+    return Sweep(extras=extras, rates=rates, months=sim.months.reshape(shape),
+                 interest=sim.interest.sum(axis=1).reshape(shape), savings=sim.savings[-1].reshape(shape),
+                 slack=slack, max_cut=SWEEP_MAX_CUT * inputs.expenses, horizon=horizon,
+                 elapsed_ms=round((time.perf_counter() - started) * 1000, 1))
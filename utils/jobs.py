@@ -0,0 +1,175 @@
+# utils/jobs.py
+from __future__ import annotations
+import contextvars
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional
+
+from config import env
+from utils.metrics import REGISTRY, finish_trace, start_trace
+
+# ✅ Job knobs (override via env vars)
+MAX_WORKERS     = int(env("JOBS_MAX_WORKERS", "8"))
+MAX_PENDING     = int(env("JOBS_MAX_PENDING", "64"))       # queued + running before submit() refuses
+TIMEOUT_SECONDS = float(env("JOBS_TIMEOUT_SECONDS", "180"))
+RETAIN_SECONDS  = float(env("JOBS_RETAIN_SECONDS", "900"))  # finished jobs stay pollable this long
+POLL_SECONDS    = float(env("JOBS_POLL_SECONDS", "0.5"))    # UI poll interval
+
+FINAL = ("done", "error", "cancelled", "timeout")
+
+class JobCancelled(Exception):
+    """Raised inside a job by Job.check() after cancel() or its timeout."""
+
+class QueueFull(RuntimeError):
+    """Too many jobs queued or running; try again shortly."""
+
+@dataclass
+class Job:
+    """
+    One background model call. Workers report partial state in `progress`
+    (e.g. streamed text so far) and call check() between steps so
+    cancellation and timeouts take effect promptly.
+    """
+    id: str
+    kind: str
+    timeout: float
+    status: str = "queued"
+    submitted: float = field(default_factory=time.time)
+    started: Optional[float] = None
+    finished: Optional[float] = None
+    result: Any = None
+    error: Optional[str] = None
+    progress: Dict[str, Any] = field(default_factory=dict)
+    attrs: Dict[str, Any] = field(default_factory=dict)  # copied onto the job's trace
+    _cancel: threading.Event = field(default_factory=threading.Event, repr=False)
+    _future: Optional[Future] = field(default=None, repr=False)
+
+    @property
+    def done(self) -> bool:
+        return self.status in FINAL
+
+    @property
+    def elapsed(self) -> float:
+        start = self.started or self.submitted
+        return (self.finished or time.time()) - start
+
+    def check(self) -> None:
+        if self._cancel.is_set():
+            raise JobCancelled(self.status)
+        if self.started is not None and time.time() - self.started > self.timeout:
+            self.status = "timeout"
+            self._cancel.set()
+            raise JobCancelled("timeout")
+
+class JobQueue:
+    """
+    Bounded worker pool plus a process-wide job registry.
+
+    Jobs outlive the Streamlit run that submitted them: the page keeps only the
+    job ID in session_state and polls get(). A running model call cannot be
+    interrupted mid-request, so cancel/timeout mark the job final at once and
+    its eventual result is discarded.
+    """
+
+    def __init__(self, max_workers: int = MAX_WORKERS, max_pending: int = MAX_PENDING,
+                 timeout: float = TIMEOUT_SECONDS, retain: float = RETAIN_SECONDS):
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.retain = retain
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="clarity-job")
+        self._max_workers = max_workers
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, Job] = {}
+
+    # ---------- worker side ----------
+    def _run(self, job: Job, fn: Callable[[Job], Any]) -> None:
+        if job._cancel.is_set():
+            return
+        job.started = time.time()
+        job.status = "running"
+        trace = start_trace(f"{job.kind}_job", job_id=job.id, **job.attrs)
+        try:
+            result = fn(job)
+            job.check()
+            job.result, job.status = result, "done"
+        except JobCancelled:
+            if job.status not in ("timeout", "cancelled"):
+                job.status = "cancelled"
+        except Exception as e:
+            if not job._cancel.is_set():
+                job.error, job.status = f"{type(e).__name__}: {e}", "error"
+        finally:
+            job.finished = time.time()
+            trace.attrs["status"] = job.status
+            finish_trace(trace)
+            REGISTRY.inc("clarity_jobs_total", help="Background jobs by outcome", kind=job.kind, status=job.status)
+            REGISTRY.observe("clarity_job_seconds", job.finished - job.submitted,
+                             help="Job latency from submit to finish", kind=job.kind, status=job.status)
+
+    # ---------- public API ----------
+    def submit(self, kind: str, fn: Callable[[Job], Any], timeout: Optional[float] = None, **attrs: Any) -> Job:
+        """
+        Queue fn(job) and return its Job; raises QueueFull when the pool is
+        saturated. `attrs` (e.g. module_id) label the job's trace.
+        """
+        self._purge()
+        with self._lock:
+            active = sum(1 for j in self._jobs.values() if not j.done)
+            if active >= self.max_pending:
+                raise QueueFull(f"{active} jobs already queued or running")
+            job = Job(id=uuid.uuid4().hex[:12], kind=kind, timeout=timeout or self.timeout, attrs=attrs)
+            self._jobs[job.id] = job
+        # Fresh context per job: no trace leaks between jobs sharing a worker thread
+        ctx = contextvars.Context()
+        job._future = self._pool.submit(ctx.run, self._run, job, fn)
+        return job
+
+    def get(self, job_id: Optional[str]) -> Optional[Job]:
+        """Look up a job and apply its timeout (so a stuck call is reported promptly)."""
+        if not job_id:
+            return None
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None and job.status == "running" and time.time() - (job.started or 0) > job.timeout:
+            job.status = "timeout"
+            job.finished = time.time()
+            job._cancel.set()
+        return job
+
+    def cancel(self, job_id: str) -> bool:
+        job = self.get(job_id)
+        if job is None or job.done:
+            return False
+        job._cancel.set()
+        if job._future is not None:
+            job._future.cancel()  # succeeds only while still queued
+        job.status = "cancelled"
+        job.finished = time.time()
+        return True
+
+    def _purge(self) -> None:
+        cutoff = time.time() - self.retain
+        with self._lock:
+            for job_id in [j.id for j in self._jobs.values() if j.done and (j.finished or 0) < cutoff]:
+                del self._jobs[job_id]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            counts = {s: 0 for s in ("queued", "running") + FINAL}
+            for j in self._jobs.values():
+                counts[j.status] = counts.get(j.status, 0) + 1
+            return {**counts, "workers": self._max_workers, "max_pending": self.max_pending}
+
+_QUEUE: Optional[JobQueue] = None
+_QUEUE_LOCK = threading.Lock()
+
+def get_queue() -> JobQueue:
+    """Process-wide job queue shared by every session."""
+    global _QUEUE
+    with _QUEUE_LOCK:
+        if _QUEUE is None:
+            _QUEUE = JobQueue()
+        return _QUEUE
@@ -0,0 +1,116 @@
+# utils/json_stream.py
+from __future__ import annotations
+import json
+from typing import Any, List, Optional, Tuple
+
+Event = Tuple[str, Any]
+
+class _Frame:
+    __slots__ = ("kind", "key", "start", "expect_key")
+
+    def __init__(self, kind: str):
+        self.kind = kind                    # "{" or "["
+        self.key: Optional[str] = None      # last key seen (objects only)
+        self.start: Optional[int] = None    # buffer index where the current value began
+        self.expect_key = kind == "{"
+
+class PlanStreamParser:
+    """
+    Incremental parser for a streamed JSON object such as a FinancePlan.
+
+    feed() accepts raw text deltas and returns events as soon as values close:
+      ("summary", "...")               top-level member complete
+      ("actions[]", {...})             one item of a top-level array complete
+      ("__root__", {...})              the whole object is complete
+
+    Anything before the first "{" (e.g. a ```json fence) or after the closing
+    "}" is ignored. Only member values and top-level array items are decoded,
+    so each event costs one small json.loads.
+    """
+
+    def __init__(self):
+        self.buf = ""
+        self.pos = 0
+        self.stack: List[_Frame] = []
+        self.started = False
+        self.done = False
+        self.in_str = False
+        self.str_is_key = False
+        self.str_start = 0
+        self.esc = False
+
+    def feed(self, chunk: str) -> List[Event]:
+        events: List[Event] = []
+        self.buf += chunk
+        buf = self.buf
+        i = self.pos
+        n = len(buf)
+
+        while i < n and not self.done:
+            c = buf[i]
+
+            if self.in_str:
+                if self.esc:
+                    self.esc = False
+                elif c == "\\":
+                    self.esc = True
+                elif c == '"':
+                    self.in_str = False
+                    top = self.stack[-1]
+                    if self.str_is_key:
+                        top.key = json.loads(buf[self.str_start:i + 1])
+                    else:
+                        self._complete(top, buf[top.start:i + 1], events)
+                i += 1
+                continue
+
+            if not self.started:
+                if c == "{":
+                    self.started = True
+                    self.stack.append(_Frame("{"))
+                i += 1
+                continue
+
+            top = self.stack[-1]
+            if c == '"':
+                self.in_str = True
+                self.str_start = i
+                self.str_is_key = top.kind == "{" and top.expect_key
+                if not self.str_is_key and top.start is None:
+                    top.start = i
+            elif c in "{[":
+                if top.start is None:
+                    top.start = i
+                self.stack.append(_Frame(c))
+            elif c in "}]":
+                if top.start is not None:  # pending scalar (number/true/false/null)
+                    self._complete(top, buf[top.start:i].strip(), events)
+                self.stack.pop()
+                if self.stack:
+                    parent = self.stack[-1]
+                    self._complete(parent, buf[parent.start:i + 1], events)
+                else:
+                    self.done = True
+                    events.append(("__root__", json.loads(buf[buf.index("{"):i + 1])))
+            elif c == ",":
+                if top.start is not None:
+                    self._complete(top, buf[top.start:i].strip(), events)
+                if top.kind == "{":
+                    top.expect_key = True
+            elif c == ":":
+                top.expect_key = False
+            elif not c.isspace() and top.start is None:
+                top.start = i
+            i += 1
+
+        self.pos = i
+        return events
+
+    def _complete(self, frame: _Frame, raw: str, events: List[Event]) -> None:
+        # `frame` is always the innermost open container here
+        frame.start = None
+        depth = len(self.stack) - 1
+        if depth == 0 and frame.kind == "{" and frame.key is not None:
+            events.append((frame.key, json.loads(raw)))
+        elif depth == 1 and frame.kind == "[" and self.stack[0].key is not None:
+            events.append((f"{self.stack[0].key}[]", json.loads(raw)))
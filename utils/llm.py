@@ -0,0 +1,396 @@
+# utils/llm.py
+from __future__ import annotations
+import asyncio
+import threading
+import time
+from dataclasses import dataclass, field, replace
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Type
+
+from utils.metrics import annotate, current_trace, record_upstream, stage
+from utils.rate_limiter import MAX_ATTEMPTS, backoff_delay, estimate_request_tokens, get_limiter
+from utils.request_log import log_request
+from utils.response_cache import cache_key, get_cache
+from utils.singleflight import Flight, get_singleflight
+
+def _errors() -> Tuple[Type[Exception], Tuple[Type[Exception], ...]]:
+    """(RateLimitError, errors worth retrying after a backoff); openai is imported on first call."""
+    import openai
+
+    return openai.RateLimitError, (openai.APIConnectionError, openai.APITimeoutError, openai.InternalServerError)
+
+@dataclass
+class Completion:
+    """Plain result of a chat completion (what the pages actually use)."""
+    text: str
+    usage: Dict[str, Any] = field(default_factory=dict)
+    model: str = ""
+    cached: bool = False
+    key: str = ""
+    coalesced: bool = False   # answered by another session's identical in-flight call
+    tier: str = ""            # utils.router tier ("small"/"large") when routed
+    escalated: str = ""       # why the small tier's answer was rejected, if it was
+
+def _usage_dict(usage: Any) -> Dict[str, Any]:
+    if usage is None:
+        return {}
+    if hasattr(usage, "model_dump"):
+        return usage.model_dump(exclude_none=True)
+    return dict(usage)
+
+def api_version_of(client: Any) -> str:
+    return str((getattr(client, "default_query", None) or {}).get("api-version", ""))
+
+def _params(
+    model: str,
+    messages: List[Dict[str, str]],
+    temperature: Optional[float],
+    max_tokens: Optional[int],
+    response_format: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    params: Dict[str, Any] = {"model": model, "messages": messages}
+    if temperature is not None:
+        params["temperature"] = temperature
+    if max_tokens is not None:
+        params["max_tokens"] = max_tokens
+    if response_format is not None:
+        params["response_format"] = response_format
+    return params
+
+def _error_headers(e: Exception) -> Any:
+    return getattr(getattr(e, "response", None), "headers", None)
+
+def _total_tokens(usage: Dict[str, Any]) -> Optional[int]:
+    return usage.get("total_tokens") if usage else None
+
+def _log_call(
+    kind: str,
+    key: str,
+    model: str,
+    started: float,
+    cache: str,
+    usage: Optional[Dict[str, Any]] = None,
+    ttft: Optional[float] = None,
+    error: Optional[BaseException] = None,
+) -> None:
+    """One utils.request_log record per request (buffered; no I/O here)."""
+    trace = current_trace()
+    usage = usage or {}
+    details = usage.get("prompt_tokens_details") or {}
+    log_request({
+        "ts": round(time.time(), 3),
+        "page": trace.page if trace else None,
+        "trace_id": trace.id if trace else None,
+        "module_id": trace.attrs.get("module_id") if trace else None,
+        "kind": kind,
+        "model": model,
+        "prompt_hash": key,
+        "cache": cache,
+        "prompt_tokens": usage.get("prompt_tokens"),
+        "completion_tokens": usage.get("completion_tokens"),
+        "cached_tokens": details.get("cached_tokens"),
+        "latency_ms": round((time.perf_counter() - started) * 1000, 3),
+        "ttft_ms": None if ttft is None else round(ttft * 1000, 3),
+        "outcome": "ok" if error is None else f"error:{type(error).__name__}",
+    })
+
+def _create(client: Any, params: Dict[str, Any], est_tokens: int) -> Any:
+    """
+    Send one request through the shared rate limiter.
+
+    Waits in the limiter queue for RPM/TPM budget, retries 429s (honouring
+    Retry-After / x-ratelimit-reset-*) and transient errors with jittered
+    exponential backoff, and feeds x-ratelimit-remaining-* back to the limiter.
+    """
+    limiter = get_limiter()
+    rate_limit_error, transient = _errors()
+    for attempt in range(MAX_ATTEMPTS):
+        limiter.acquire(est_tokens)
+        try:
+            raw = client.chat.completions.with_raw_response.create(**params)
+        except rate_limit_error as e:
+            limiter.release(est_tokens)
+            if attempt + 1 >= MAX_ATTEMPTS:
+                raise
+            limiter.note_retry()
+            time.sleep(limiter.throttled(_error_headers(e), attempt))
+            continue
+        except transient:
+            limiter.release(est_tokens)
+            if attempt + 1 >= MAX_ATTEMPTS:
+                raise
+            limiter.note_retry()
+            time.sleep(backoff_delay(attempt))
+            continue
+        limiter.observe(raw.headers)
+        return raw.parse()
+    raise RuntimeError("unreachable")
+
+async def _acreate(client: Any, params: Dict[str, Any], est_tokens: int) -> Any:
+    """asyncio flavour of _create() for AsyncAzureOpenAI clients."""
+    limiter = get_limiter()
+    rate_limit_error, transient = _errors()
+    for attempt in range(MAX_ATTEMPTS):
+        await limiter.acquire_async(est_tokens)
+        try:
+            raw = await client.chat.completions.with_raw_response.create(**params)
+        except rate_limit_error as e:
+            limiter.release(est_tokens)
+            if attempt + 1 >= MAX_ATTEMPTS:
+                raise
+            limiter.note_retry()
+            await asyncio.sleep(limiter.throttled(_error_headers(e), attempt))
+            continue
+        except transient:
+            limiter.release(est_tokens)
+            if attempt + 1 >= MAX_ATTEMPTS:
+                raise
+            limiter.note_retry()
+            await asyncio.sleep(backoff_delay(attempt))
+            continue
+        limiter.observe(raw.headers)
+        return raw.parse()
+    raise RuntimeError("unreachable")
+
+def chat_completion(
+    client: Any,
+    *,
+    model: str,
+    messages: List[Dict[str, str]],
+    temperature: Optional[float] = None,
+    max_tokens: Optional[int] = None,
+    response_format: Optional[Dict[str, Any]] = None,
+    bypass_cache: bool = False,
+) -> Completion:
+    """
+    Cached wrapper around client.chat.completions.create.
+
+    Identical (deployment, api_version, messages, temperature, max_tokens,
+    response_format) requests are answered from utils.response_cache. bypass_cache=True always
+    calls the model but still stores the fresh answer. Model calls go through
+    the shared utils.rate_limiter budget.
+    """
+    started = time.perf_counter()
+    key = cache_key(model, api_version_of(client), messages, temperature, max_tokens, response_format)
+    cache = get_cache()
+
+    if not bypass_cache:
+        hit = cache.get(key)
+        if hit is not None:
+            annotate(cache="hit")
+            result = Completion(
+                text=hit.get("text", ""),
+                usage=hit.get("usage", {}),
+                model=hit.get("model", model),
+                cached=True,
+                key=key,
+            )
+            _log_call("unary", key, model, started, "hit", result.usage)
+            return result
+
+    status = "bypass" if bypass_cache else "miss"
+    annotate(cache=status)
+
+    def call() -> Completion:
+        est = estimate_request_tokens(messages, max_tokens)
+        resp = _create(client, _params(model, messages, temperature, max_tokens, response_format), est)
+        text = resp.choices[0].message.content or ""
+        usage = _usage_dict(getattr(resp, "usage", None))
+        get_limiter().reconcile(est, _total_tokens(usage))
+        result = Completion(text=text, usage=usage, model=getattr(resp, "model", model) or model, key=key)
+        if text:
+            cache.put(key, {"text": text, "usage": usage, "model": result.model})
+        return result
+
+    # Identical concurrent requests (other sessions) share one upstream call
+    try:
+        with stage("upstream"):
+            result, coalesced = get_singleflight().do(key, call)
+    except Exception as e:
+        _log_call("unary", key, model, started, status, error=e)
+        raise
+    if coalesced:
+        annotate(cache="coalesced")
+        result = replace(result, coalesced=True)
+    # Non-streamed: the first token arrives with the whole body
+    record_upstream(time.perf_counter() - started, result.usage)
+    _log_call("unary", key, model, started, "coalesced" if coalesced else status, result.usage)
+    return result
+
+async def achat_completion(
+    client: Any,
+    *,
+    model: str,
+    messages: List[Dict[str, str]],
+    temperature: Optional[float] = None,
+    max_tokens: Optional[int] = None,
+    response_format: Optional[Dict[str, Any]] = None,
+    bypass_cache: bool = False,
+) -> Completion:
+    """Async counterpart of chat_completion() for an AsyncAzureOpenAI client."""
+    started = time.perf_counter()
+    key = cache_key(model, api_version_of(client), messages, temperature, max_tokens, response_format)
+    cache = get_cache()
+
+    if not bypass_cache:
+        hit = cache.get(key)
+        if hit is not None:
+            annotate(cache="hit")
+            result = Completion(
+                text=hit.get("text", ""),
+                usage=hit.get("usage", {}),
+                model=hit.get("model", model),
+                cached=True,
+                key=key,
+            )
+            _log_call("async", key, model, started, "hit", result.usage)
+            return result
+
+    status = "bypass" if bypass_cache else "miss"
+    annotate(cache=status)
+
+    async def call() -> Completion:
+        est = estimate_request_tokens(messages, max_tokens)
+        resp = await _acreate(client, _params(model, messages, temperature, max_tokens, response_format), est)
+        text = resp.choices[0].message.content or ""
+        usage = _usage_dict(getattr(resp, "usage", None))
+        get_limiter().reconcile(est, _total_tokens(usage))
+        result = Completion(text=text, usage=usage, model=getattr(resp, "model", model) or model, key=key)
+        if text:
+            cache.put(key, {"text": text, "usage": usage, "model": result.model})
+        return result
+
+    try:
+        with stage("upstream"):
+            result, coalesced = await get_singleflight().ado(key, call)
+    except Exception as e:
+        _log_call("async", key, model, started, status, error=e)
+        raise
+    if coalesced:
+        annotate(cache="coalesced")
+        result = replace(result, coalesced=True)
+    record_upstream(time.perf_counter() - started, result.usage)
+    _log_call("async", key, model, started, "coalesced" if coalesced else status, result.usage)
+    return result
+
+class ChatStream:
+    """
+    Iterable of text deltas for a streamed chat completion.
+
+    Pass it straight to st.write_stream(). Once iteration finishes, `text`,
+    `usage`, `ttft` (seconds to first token) and `elapsed` (total seconds)
+    are populated and the full answer has been written to the response cache.
+
+    Identical streams started while one is in flight follow it: they replay
+    its deltas so far and then tail it, without a second upstream call.
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        *,
+        model: str,
+        messages: List[Dict[str, str]],
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        response_format: Optional[Dict[str, Any]] = None,
+        bypass_cache: bool = False,
+    ):
+        self.client = client
+        self.model = model
+        self.messages = messages
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+        self.response_format = response_format
+        self.bypass_cache = bypass_cache
+        self.key = cache_key(model, api_version_of(client), messages, temperature, max_tokens, response_format)
+        self.text = ""
+        self.usage: Dict[str, Any] = {}
+        self.cached = False
+        self.ttft: Optional[float] = None
+        self.elapsed: Optional[float] = None
+        self.coalesced = False
+
+    def __iter__(self) -> Iterator[str]:
+        started = time.perf_counter()
+        cache = get_cache()
+
+        if not self.bypass_cache:
+            hit = cache.get(self.key)
+            if hit is not None:
+                self.cached = True
+                self.text = hit.get("text", "")
+                self.usage = hit.get("usage", {})
+                self.ttft = self.elapsed = time.perf_counter() - started
+                annotate(cache="hit")
+                _log_call("stream", self.key, self.model, started, "hit", self.usage, self.ttft)
+                yield self.text
+                return
+
+        status = "bypass" if self.bypass_cache else "miss"
+        annotate(cache=status)
+
+        # The upstream stream is pumped by a worker thread into a shared flight;
+        # this session and any identical concurrent ones all tail that flight.
+        # The pump finishes (and fills the cache) even if a viewer navigates away.
+        flight, leader = get_singleflight().join("stream", self.key)
+        if leader:
+            threading.Thread(target=self._pump, args=(flight,), name="clarity-stream", daemon=True).start()
+        else:
+            annotate(cache="coalesced")
+            self.coalesced = True
+            status = "coalesced"
+
+        parts: List[str] = []
+        try:
+            for delta in flight.follow():
+                if self.ttft is None:
+                    self.ttft = time.perf_counter() - started
+                parts.append(delta)
+                yield delta
+        except Exception as e:
+            _log_call("stream", self.key, self.model, started, status, ttft=self.ttft, error=e)
+            raise
+
+        self.elapsed = time.perf_counter() - started
+        self.text = "".join(parts)
+        self.usage = (flight.result or {}).get("usage", {})
+        trace = current_trace()
+        if trace is not None:
+            trace.add("upstream", self.elapsed)
+        record_upstream(self.ttft, self.usage)
+        _log_call("stream", self.key, self.model, started, status, self.usage, self.ttft)
+
+    def _pump(self, flight: Flight) -> None:
+        flights = get_singleflight()
+        parts: List[str] = []
+        try:
+            for delta in self._upstream():
+                parts.append(delta)
+                flight.push(delta)
+        except BaseException as e:  # never leave followers waiting
+            flights.release(flight, error=e)
+            return
+        text = "".join(parts)
+        if text:
+            get_cache().put(self.key, {"text": text, "usage": self.usage, "model": self.model})
+        flights.release(flight, {"usage": self.usage})
+
+    def _upstream(self) -> Iterator[str]:
+        """One streamed upstream call: yields non-empty deltas, sets usage, settles the limiter."""
+        params = _params(self.model, self.messages, self.temperature, self.max_tokens, self.response_format)
+        params.update(stream=True, stream_options={"include_usage": True})
+        est = estimate_request_tokens(self.messages, self.max_tokens)
+        stream = _create(self.client, params, est)
+        for chunk in stream:
+            if getattr(chunk, "usage", None):
+                self.usage = _usage_dict(chunk.usage)
+            if not chunk.choices:
+                continue  # Azure sends a prompt-filter chunk first and a usage-only chunk last
+            delta = chunk.choices[0].delta.content or ""
+            if delta:
+                yield delta
+        get_limiter().reconcile(est, _total_tokens(self.usage))
+
+def stream_chat_completion(client: Any, **kwargs: Any) -> ChatStream:
+    """Streaming counterpart of chat_completion(); see ChatStream."""
+    return ChatStream(client, **kwargs)
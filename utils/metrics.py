@@ -0,0 +1,392 @@
+# utils/metrics.py
+from __future__ import annotations
+import contextvars
+import json
+import math
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, TypeVar
+
+from config import env
+
+TRACE_PATH   = env("CLARITY_TRACE_PATH", "")    # e.g. "logs/traces.jsonl"; empty = no trace file
+METRICS_PORT = int(env("CLARITY_METRICS_PORT", "0"))  # >0 serves /metrics on this port
+# Prompt-cache savings estimate: list price per 1M input tokens and the cached-token discount
+INPUT_PRICE_PER_1M = float(env("AOAI_INPUT_PRICE_PER_1M", "2.50"))
+CACHED_DISCOUNT    = float(env("AOAI_CACHED_DISCOUNT", "0.5"))
+
+# Prometheus-style cumulative buckets (seconds)
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+def _labels(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items() if v is not None))
+
+def _fmt_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    body = ",".join(f'{k}="{v}"' for k, v in pairs)
+    return "{" + body + "}"
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """Exact nearest-rank percentile (the smallest value with at least pct% of samples at or below it)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered) - 1, math.ceil(pct / 100.0 * len(ordered)) - 1))]
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bucket bound containing the q-quantile (coarse, like Prometheus)."""
+        if not self.count:
+            return None
+        target = q * self.count
+        running = 0
+        for bound, c in zip(self.buckets + (float("inf"),), self.counts):
+            running += c
+            if running >= target:
+                return bound
+        return float("inf")
+
+class MetricsRegistry:
+    """Process-wide counters and histograms shared by every session."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._histograms: Dict[str, Dict[LabelKey, Histogram]] = {}
+        self._help: Dict[str, str] = {}
+
+    def inc(self, name: str, value: float = 1.0, help: str = "", **labels: Any) -> None:
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            key = _labels(labels)
+            series[key] = series.get(key, 0.0) + value
+            if help:
+                self._help.setdefault(name, help)
+
+    def observe(self, name: str, value: float, help: str = "", **labels: Any) -> None:
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            key = _labels(labels)
+            hist = series.get(key)
+            if hist is None:
+                hist = series[key] = Histogram()
+            hist.observe(value)
+            if help:
+                self._help.setdefault(name, help)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """JSON-friendly view: counters plus count/sum/p50/p95 per histogram series."""
+        with self._lock:
+            return {
+                "counters": {
+                    name: {_fmt_labels(k) or "{}": v for k, v in series.items()}
+                    for name, series in self._counters.items()
+                },
+                "histograms": {
+                    name: {
+                        _fmt_labels(k) or "{}": {
+                            "count": h.count,
+                            "sum": round(h.sum, 6),
+                            "p50": h.quantile(0.5),
+                            "p95": h.quantile(0.95),
+                        }
+                        for k, h in series.items()
+                    }
+                    for name, series in self._histograms.items()
+                },
+            }
+
+    def prometheus(self) -> str:
+        lines: List[str] = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} counter")
+                for key, value in series.items():
+                    lines.append(f"{name}{_fmt_labels(key)} {value:g}")
+            for name, series in sorted(self._histograms.items()):
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} histogram")
+                for key, h in series.items():
+                    running = 0
+                    for bound, c in zip(h.buckets, h.counts):
+                        running += c
+                        lines.append(f"{name}_bucket{_fmt_labels(key, ('le', f'{bound:g}'))} {running}")
+                    lines.append(f"{name}_bucket{_fmt_labels(key, ('le', '+Inf'))} {h.count}")
+                    lines.append(f"{name}_sum{_fmt_labels(key)} {h.sum:.6f}")
+                    lines.append(f"{name}_count{_fmt_labels(key)} {h.count}")
+        return "\n".join(lines) + "\n"
+
+REGISTRY = MetricsRegistry()
+
+# ---------- per-request traces ----------
+class Trace:
+    """
+    Stage timings, TTFT and token usage for one page run.
+
+    Stages may repeat (e.g. three prompt files loaded) and are summed. Stages
+    are measured independently, so nested ones (render around a streamed
+    upstream call) overlap rather than add up to `total`.
+    """
+
+    def __init__(self, page: str, **attrs: Any):
+        self.id = uuid.uuid4().hex[:16]
+        self.page = page
+        self.attrs: Dict[str, Any] = dict(attrs)
+        self.started_at = time.time()
+        self._t0 = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        self.ttft: Optional[float] = None
+        self.usage: Dict[str, Any] = {}
+        self.messages: List[Dict[str, str]] = []
+        self.total: Optional[float] = None
+
+    def add(self, stage_name: str, seconds: float) -> None:
+        self.stages[stage_name] = self.stages.get(stage_name, 0.0) + seconds
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.id,
+            "ts": round(self.started_at, 3),
+            "page": self.page,
+            **self.attrs,
+            "stages_ms": {k: round(v * 1000, 3) for k, v in self.stages.items()},
+            "ttft_ms": None if self.ttft is None else round(self.ttft * 1000, 3),
+            "total_ms": None if self.total is None else round(self.total * 1000, 3),
+            "usage": self.usage,
+        }
+
+_CURRENT: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("clarity_trace", default=None)
+_TRACE_LOCK = threading.Lock()
+
+def start_trace(page: str, **attrs: Any) -> Trace:
+    """Begin a trace and make it current for stage()/record_* helpers."""
+    trace = Trace(page, **attrs)
+    _CURRENT.set(trace)
+    return trace
+
+def current_trace() -> Optional[Trace]:
+    return _CURRENT.get()
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time a block into the current trace (no-op without one)."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace = _CURRENT.get()
+        if trace is not None:
+            trace.add(name, time.perf_counter() - t0)
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+def timed(name: str) -> Callable[[F], F]:
+    """Decorator form of stage()."""
+    def deco(fn: F) -> F:
+        @wraps(fn)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with stage(name):
+                return fn(*args, **kwargs)
+        return wrapper  # type: ignore[return-value]
+    return deco
+
+def timed_fragment(page: str, name: str) -> Callable[[F], F]:
+    """
+    Time every run of a st.fragment body into clarity_fragment_seconds.
+
+    Compare with clarity_run_seconds (whole-page runs) to see what a
+    fragment-scoped rerun saves. Apply beneath @st.fragment.
+    """
+    def deco(fn: F) -> F:
+        @wraps(fn)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            t0 = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                REGISTRY.observe("clarity_fragment_seconds", time.perf_counter() - t0,
+                                 help="Fragment run latency", page=page, fragment=name)
+        return wrapper  # type: ignore[return-value]
+    return deco
+
+def record_upstream(ttft: Optional[float], usage: Dict[str, Any]) -> None:
+    trace = _CURRENT.get()
+    if trace is None:
+        return
+    if ttft is not None and trace.ttft is None:
+        trace.ttft = ttft
+    if usage:
+        trace.usage = usage
+
+def annotate(**attrs: Any) -> None:
+    """Attach attributes (cache status, tier, ...) to the current trace."""
+    trace = _CURRENT.get()
+    if trace is not None:
+        trace.attrs.update(attrs)
+
+def record_messages(messages: List[Dict[str, str]]) -> None:
+    trace = _CURRENT.get()
+    if trace is not None:
+        trace.messages = messages
+
+def _record_prompt_cache(trace: Trace) -> None:
+    """Per-module prompt-cache accounting from usage.prompt_tokens_details.cached_tokens."""
+    prompt = trace.usage.get("prompt_tokens") or 0
+    if not prompt:
+        return
+    cached = (trace.usage.get("prompt_tokens_details") or {}).get("cached_tokens") or 0
+    module = trace.attrs.get("module_id", trace.page)
+    labels = {"page": trace.page, "module": module}
+    REGISTRY.inc("clarity_prompt_tokens_total", prompt, help="Prompt tokens sent", **labels)
+    REGISTRY.inc("clarity_prompt_cached_tokens_total", cached, help="Prompt tokens served from Azure prompt cache", **labels)
+    REGISTRY.inc("clarity_prompt_cache_savings_usd_total", cached * INPUT_PRICE_PER_1M * CACHED_DISCOUNT / 1e6,
+                 help="Estimated input cost saved by prompt caching", **labels)
+    upstream = trace.stages.get("upstream")
+    if upstream is not None:
+        REGISTRY.observe("clarity_upstream_seconds", upstream, help="Upstream latency by prompt-cache hit",
+                         prefix_cached="yes" if cached else "no", **labels)
+
+def prompt_cache_ratios() -> Dict[str, float]:
+    """cached / prompt tokens per module label, for the debug panel."""
+    snap = REGISTRY.snapshot()["counters"]
+    prompt = snap.get("clarity_prompt_tokens_total", {})
+    cached = snap.get("clarity_prompt_cached_tokens_total", {})
+    return {k: round(cached.get(k, 0.0) / v, 4) for k, v in prompt.items() if v}
+
+def finish_trace(trace: Optional[Trace] = None) -> Optional[Trace]:
+    """Close the trace: feed histograms/counters and append it to the JSONL trace file."""
+    trace = trace or _CURRENT.get()
+    if trace is None or trace.total is not None:
+        return trace
+    trace.total = time.perf_counter() - trace._t0
+    page = trace.page
+
+    for name, seconds in trace.stages.items():
+        REGISTRY.observe("clarity_stage_seconds", seconds, help="Per-stage latency", page=page, stage=name)
+    REGISTRY.observe("clarity_run_seconds", trace.total, help="Whole page run latency", page=page)
+    if trace.ttft is not None:
+        REGISTRY.observe("clarity_ttft_seconds", trace.ttft, help="Time to first token", page=page)
+    if trace.usage:
+        _record_prompt_cache(trace)
+        details = trace.usage.get("prompt_tokens_details") or {}
+        for kind, value in (
+            ("prompt", trace.usage.get("prompt_tokens")),
+            ("completion", trace.usage.get("completion_tokens")),
+            ("cached", details.get("cached_tokens")),
+        ):
+            if value:
+                REGISTRY.inc("clarity_tokens_total", value, help="Token usage from resp.usage", page=page, kind=kind)
+
+    if TRACE_PATH:
+        line = json.dumps(trace.to_dict(), ensure_ascii=False)
+        with _TRACE_LOCK:
+            path = Path(TRACE_PATH)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with path.open("a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+    if _CURRENT.get() is trace:
+        _CURRENT.set(None)
+    return trace
+
+# ---------- export ----------
+def _component_stats() -> Dict[str, Dict[str, Any]]:
+    # Imported lazily: these modules themselves record into this one
+    from utils.bundle import get_bundle
+    from utils.demos import get_demo_store
+    from utils.jobs import get_queue
+    from utils.module_loader import registry_stats
+    from utils.openai_client import pool_stats
+    from utils.rate_limiter import get_limiter
+    from utils.request_log import get_request_log
+    from utils.response_cache import get_cache
+    from utils.router import get_router_stats
+    from utils.similarity import get_index
+    from utils.singleflight import get_singleflight
+    from utils.startup import startup_stats
+
+    pool = pool_stats()
+    return {
+        "registry": registry_stats(),
+        "bundle": (get_bundle().stats() if get_bundle() else {}),
+        "response_cache": get_cache().stats(),
+        "rate_limiter": get_limiter().stats(),
+        "client_pool": {k: v for k, v in pool.items() if isinstance(v, (int, float))},
+        "startup": startup_stats(),
+        "similarity": get_index().stats(),
+        "singleflight": get_singleflight().stats(),
+        "jobs": get_queue().stats(),
+        "router": get_router_stats().stats(),
+        "demos": (get_demo_store().stats() if get_demo_store() else {}),
+        "request_log": (get_request_log().stats() if get_request_log() else {}),
+    }
+
+def prometheus_text() -> str:
+    """Registry metrics plus component gauges in Prometheus text exposition format."""
+    lines = [REGISTRY.prometheus().rstrip("\n")]
+    for component, stats in _component_stats().items():
+        for key, value in stats.items():
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            name = f"clarity_{component}_{key}"
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {value:g}")
+    return "\n".join(l for l in lines if l) + "\n"
+
+def snapshot() -> Dict[str, Any]:
+    return {**REGISTRY.snapshot(), "components": _component_stats()}
+
+_SERVER: Optional[ThreadingHTTPServer] = None
+_SERVER_LOCK = threading.Lock()
+
+def ensure_metrics_server(port: int = METRICS_PORT) -> Optional[int]:
+    """Serve GET /metrics on `port` from a daemon thread (once per process; 0 = off)."""
+    global _SERVER
+    if port <= 0:
+        return None
+    with _SERVER_LOCK:
+        if _SERVER is None:
+            class Handler(BaseHTTPRequestHandler):
+                def log_message(self, fmt, *args):
+                    pass
+
+                def do_GET(self):
+                    if self.path.split("?", 1)[0] != "/metrics":
+                        self.send_response(404)
+                        self.end_headers()
+                        return
+                    body = prometheus_text().encode("utf-8")
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/plain; version=0.0.4")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+            _SERVER = ThreadingHTTPServer(("0.0.0.0", port), Handler)
+            _SERVER.daemon_threads = True
+            threading.Thread(target=_SERVER.serve_forever, name="clarity-metrics", daemon=True).start()
+        return _SERVER.server_port
@@ -1,26 +1,87 @@
 # utils/module_loader.py
 from __future__ import annotations
 import os
+import threading
 from pathlib import Path
-from typing import Optional, Sequence, Union
-import yaml
+from types import MappingProxyType
+from typing import Any, Callable, Dict, Mapping, Optional, Sequence, Tuple, Union
+
+from utils.bundle import get_bundle, module_key, prompt_key
+from utils.metrics import stage
 
 # ✅ Base folders (adjust if your layout differs)
 REPO_ROOT   = Path(os.getcwd())
 MODULE_DIR  = REPO_ROOT / "modules"         # numeric modules live here (unchanged)
 PROMPTS_DIR = REPO_ROOT / "prompts"         # dotted-path prompts live here
 
+PROMPT_EXTS = (".md", ".txt", ".yaml", ".yml", ".json")
+
+# ---------- process-wide registry ----------
+# Parsed modules and prompt texts are kept once per process and shared by every
+# Streamlit session. Each entry remembers the (mtime_ns, size) of its source
+# file and is re-read only when that signature changes.
+_REGISTRY_LOCK = threading.RLock()
+_REGISTRY: Dict[Tuple[str, str], Tuple[Path, Tuple[int, int], Any]] = {}
+_STATS = {"hits": 0, "misses": 0, "invalidations": 0}
+
+def _file_sig(path: Path) -> Optional[Tuple[int, int]]:
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+def _freeze(value: Any) -> Any:
+    """Recursively convert parsed YAML into read-only containers."""
+    if isinstance(value, dict):
+        return MappingProxyType({k: _freeze(v) for k, v in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+def _cached(kind: str, name: str, resolve: Callable[[], Path], parse: Callable[[Path], Any]) -> Any:
+    key = (kind, name)
+    with _REGISTRY_LOCK:
+        entry = _REGISTRY.get(key)
+        if entry is not None:
+            path, sig, value = entry
+            if _file_sig(path) == sig:
+                _STATS["hits"] += 1
+                return value
+            _STATS["invalidations"] += 1
+            del _REGISTRY[key]
+
+        _STATS["misses"] += 1
+        path = resolve()
+        sig = _file_sig(path)
+        value = parse(path)
+        if sig is not None and sig == _file_sig(path):
+            _REGISTRY[key] = (path, sig, value)
+        return value
+
+def registry_stats() -> Dict[str, int]:
+    """Snapshot of registry counters (hits, misses, invalidations, entries)."""
+    with _REGISTRY_LOCK:
+        return {**_STATS, "entries": len(_REGISTRY)}
+
+def clear_registry() -> None:
+    """Drop every cached module/prompt and reset the counters."""
+    with _REGISTRY_LOCK:
+        _REGISTRY.clear()
+        for k in _STATS:
+            _STATS[k] = 0
+
 # ---------- helpers ----------
 def _read_text(path: Path) -> str:
     if not path.exists():
         raise FileNotFoundError(f"Prompt file not found: {path}")
     return path.read_text(encoding="utf-8")
 
-def _try_with_extensions(base: Path, exts: Sequence[str]) -> Optional[str]:
+def _try_with_extensions(base: Path, exts: Sequence[str]) -> Optional[Path]:
     for ext in exts:
         candidate = base.with_suffix(ext)
         if candidate.exists():
-            return _read_text(candidate)
+            return candidate
     return None
 
 def _module_path_numeric(module_id: int) -> Path:
@@ -28,11 +89,24 @@ def _module_path_numeric(module_id: int) -> Path:
     fname = f"module{int(module_id)}.yaml"
     return MODULE_DIR / fname
 
-def _load_numeric_module(module_id: int) -> dict:
+def module_ids() -> Tuple[int, ...]:
+    """IDs of the numeric modules on disk (modules/module{ID}.yaml), ascending."""
+    ids = (path.stem[len("module"):] for path in MODULE_DIR.glob("module*.yaml"))
+    return tuple(sorted(int(i) for i in ids if i.isdigit()))
+
+def _resolve_numeric_module(module_id: int) -> Path:
     path = _module_path_numeric(module_id)
     if not path.exists():
         raise FileNotFoundError(f"Module file not found: {path}")
-    data = yaml.safe_load(path.read_text(encoding="utf-8")) or {}
+    return path
+
+def _read_yaml(path: Path) -> Dict[str, Any]:
+    import yaml  # deferred: only needed the first time a module is parsed
+
+    return yaml.safe_load(path.read_text(encoding="utf-8")) or {}
+
+def _module_fields(module_id: int, data: Dict[str, Any]) -> Dict[str, Any]:
+    """The loader's view of a module YAML (defaults filled in); also what the bundle stores."""
     return {
         "id": module_id,
         "title": data.get("title", f"Module {module_id}"),
@@ -43,9 +117,22 @@ def _load_numeric_module(module_id: int) -> dict:
         "checks": data.get("checks", []),
         "guidance": data.get("guidance", ""),
         "gaap_refs": data.get("gaap_refs", []),
+        "system_message": data.get("system_message", ""),
+        "instructions": data.get("instructions", []),
     }
 
-def _load_dotted_prompt(dotted: str) -> str:
+def _parse_numeric_module(module_id: int, path: Path) -> Mapping[str, Any]:
+    return _freeze(_module_fields(module_id, _read_yaml(path)))
+
+def _load_numeric_module(module_id: int) -> Mapping[str, Any]:
+    return _cached(
+        "module",
+        str(module_id),
+        lambda: _resolve_numeric_module(module_id),
+        lambda path: _parse_numeric_module(module_id, path),
+    )
+
+def _resolve_dotted_prompt(dotted: str) -> Path:
     """
     Map e.g. 'prompts.finance.clarifier.system' to:
       <repo>/prompts/finance/clarifier/system.(md|txt|yaml|yml|json)
@@ -63,31 +150,43 @@ def _load_dotted_prompt(dotted: str) -> str:
 
     base = PROMPTS_DIR.joinpath(*parts)  # e.g., prompts/finance/clarifier/system
     # Try common extensions
-    content = _try_with_extensions(base, [".md", ".txt", ".yaml", ".yml", ".json"])
-    if content is not None:
-        return content
+    found = _try_with_extensions(base, PROMPT_EXTS)
+    if found is not None:
+        return found
 
     # Special-case stems with a dot (e.g., user.tmpl.md)
     if "." in base.name:
         base_parent = base.parent / base.name
-        content = _try_with_extensions(base_parent, [".md", ".txt", ".yaml", ".yml", ".json"])
-        if content is not None:
-            return content
+        found = _try_with_extensions(base_parent, PROMPT_EXTS)
+        if found is not None:
+            return found
 
     raise FileNotFoundError(
         f"Prompt not found for '{dotted}'. Tried: {base}(.md|.txt|.yaml|.yml|.json)"
     )
 
+def _load_dotted_prompt(dotted: str) -> str:
+    dotted = (dotted or "").strip()
+    return _cached("prompt", dotted, lambda: _resolve_dotted_prompt(dotted), _read_text)
+
 # ---------- public API ----------
-def load_module(module_id: Union[int, str]) -> Union[dict, str]:
+def load_module(module_id: Union[int, str]) -> Union[Mapping[str, Any], str]:
     """
     Backward-compatible loader:
 
     - If module_id is an int OR a string of digits:
-        returns dict from modules/module{ID}.yaml  (same structure as before)
+        returns a read-only mapping from modules/module{ID}.yaml  (same keys as before)
     - Otherwise (string with dots):
         returns text contents of the prompt file resolved under /prompts
+
+    The compiled bundle (utils.bundle) answers first; otherwise results come
+    from a process-wide registry and files are only re-read when their
+    mtime/size changes. See registry_stats() for hit/miss counters.
     """
-    if isinstance(module_id, int) or (isinstance(module_id, str) and module_id.isdigit()):
-        return _load_numeric_module(int(module_id))
-    return _load_dotted_prompt(str(module_id))
+    with stage("module_load"):
+        bundle = get_bundle()
+        if isinstance(module_id, int) or (isinstance(module_id, str) and module_id.isdigit()):
+            value = bundle.get(module_key(int(module_id))) if bundle else None
+            return value if value is not None else _load_numeric_module(int(module_id))
+        value = bundle.get(prompt_key(str(module_id))) if bundle else None
+        return value if value is not None else _load_dotted_prompt(str(module_id))
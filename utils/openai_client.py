@@ -0,0 +1,162 @@
+# utils/openai_client.py
+from __future__ import annotations
+import hashlib
+import importlib.util
+import os
+import threading
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
+
+from config import env
+
+# httpx / openai are imported on first client creation (see utils.startup):
+# importing this module stays cheap for pages that have not called the model yet.
+if TYPE_CHECKING:
+    import httpx
+    from openai import AsyncAzureOpenAI, AzureOpenAI
+
+# ✅ Pool / timeout knobs (override via env vars)
+POOL_MAX_CONNECTIONS = int(env("AOAI_POOL_MAX_CONNECTIONS", "20"))
+POOL_MAX_KEEPALIVE   = int(env("AOAI_POOL_MAX_KEEPALIVE", "10"))
+POOL_KEEPALIVE_EXPIRY = float(env("AOAI_POOL_KEEPALIVE_EXPIRY", "60"))
+CONNECT_TIMEOUT = float(env("AOAI_CONNECT_TIMEOUT", "5"))
+READ_TIMEOUT    = float(env("AOAI_READ_TIMEOUT", "120"))
+WRITE_TIMEOUT   = float(env("AOAI_WRITE_TIMEOUT", "30"))
+POOL_TIMEOUT    = float(env("AOAI_POOL_TIMEOUT", "10"))
+# SDK-level retries stay off: utils.llm retries through the shared rate limiter
+MAX_RETRIES     = int(env("AOAI_MAX_RETRIES", "0"))
+# HTTP/2 needs the optional `h2` package; fall back to HTTP/1.1 keep-alive without it.
+HTTP2_ENABLED = (env("AOAI_HTTP2", "1") == "1") and importlib.util.find_spec("h2") is not None
+
+_LOCK = threading.Lock()
+_CLIENTS: Dict[Tuple[str, str, str], AzureOpenAI] = {}
+_STATS = {"created": 0, "reused": 0}
+
+# ---------- helpers ----------
+def _key(endpoint: str, api_version: str, api_key: str) -> Tuple[str, str, str]:
+    # Never keep the raw key around as a dict key / in stats output
+    digest = hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:12]
+    return (endpoint.rstrip("/"), api_version, digest)
+
+def _limits() -> httpx.Limits:
+    import httpx
+
+    return httpx.Limits(
+        max_connections=POOL_MAX_CONNECTIONS,
+        max_keepalive_connections=POOL_MAX_KEEPALIVE,
+        keepalive_expiry=POOL_KEEPALIVE_EXPIRY,
+    )
+
+def _timeout() -> httpx.Timeout:
+    import httpx
+
+    return httpx.Timeout(
+        connect=CONNECT_TIMEOUT,
+        read=READ_TIMEOUT,
+        write=WRITE_TIMEOUT,
+        pool=POOL_TIMEOUT,
+    )
+
+def _pool_connections(http_client: httpx.Client) -> Dict[str, int]:
+    """Best-effort peek at the httpcore pool behind an httpx client."""
+    pool = getattr(getattr(http_client, "_transport", None), "_pool", None)
+    conns = list(getattr(pool, "connections", []) or [])
+    return {
+        "open": len(conns),
+        "idle": sum(1 for c in conns if getattr(c, "is_idle", lambda: False)()),
+        "http2": sum(1 for c in conns if "HTTP/2" in repr(c)),
+    }
+
+# ---------- public API ----------
+def get_client(
+    endpoint: Optional[str] = None,
+    api_version: Optional[str] = None,
+    api_key: Optional[str] = None,
+) -> AzureOpenAI:
+    """
+    Return the process-wide AzureOpenAI client for (endpoint, api_version, key).
+
+    Missing arguments fall back to AZURE_OPENAI_ENDPOINT / _API_VERSION / _KEY.
+    The underlying httpx pool is shared across pages, sessions and reruns so
+    TLS connections are kept alive and reused.
+    """
+    endpoint = endpoint or os.environ["AZURE_OPENAI_ENDPOINT"]
+    api_version = api_version or os.environ["AZURE_OPENAI_API_VERSION"]
+    api_key = api_key or os.environ["AZURE_OPENAI_KEY"]
+    key = _key(endpoint, api_version, api_key)
+
+    with _LOCK:
+        client = _CLIENTS.get(key)
+        if client is not None:
+            _STATS["reused"] += 1
+            return client
+
+        import httpx
+        from openai import AzureOpenAI
+
+        http_client = httpx.Client(
+            limits=_limits(),
+            timeout=_timeout(),
+            http2=HTTP2_ENABLED,
+        )
+        client = AzureOpenAI(
+            api_key=api_key,
+            api_version=api_version,
+            azure_endpoint=endpoint,
+            http_client=http_client,
+            timeout=_timeout(),
+            max_retries=MAX_RETRIES,
+        )
+        _CLIENTS[key] = client
+        _STATS["created"] += 1
+        return client
+
+def get_async_client(
+    endpoint: Optional[str] = None,
+    api_version: Optional[str] = None,
+    api_key: Optional[str] = None,
+) -> AsyncAzureOpenAI:
+    """
+    New AsyncAzureOpenAI client with the same pool limits and timeouts.
+
+    Async connections are bound to the event loop that opened them, so this is
+    not shared process-wide: create one per asyncio.run() and close it
+    (`async with get_async_client() as client: ...`).
+    """
+    import httpx
+    from openai import AsyncAzureOpenAI
+
+    http_client = httpx.AsyncClient(
+        limits=_limits(),
+        timeout=_timeout(),
+        http2=HTTP2_ENABLED,
+    )
+    return AsyncAzureOpenAI(
+        api_key=api_key or os.environ["AZURE_OPENAI_KEY"],
+        api_version=api_version or os.environ["AZURE_OPENAI_API_VERSION"],
+        azure_endpoint=endpoint or os.environ["AZURE_OPENAI_ENDPOINT"],
+        http_client=http_client,
+        timeout=_timeout(),
+        max_retries=MAX_RETRIES,
+    )
+
+def pool_stats() -> Dict[str, object]:
+    """Counters plus per-client connection pool occupancy."""
+    with _LOCK:
+        clients = {
+            f"{endpoint}|{version}|{digest}": _pool_connections(c._client)
+            for (endpoint, version, digest), c in _CLIENTS.items()
+        }
+        return {
+            **_STATS,
+            "clients": clients,
+            "http2": HTTP2_ENABLED,
+            "max_connections": POOL_MAX_CONNECTIONS,
+            "max_keepalive": POOL_MAX_KEEPALIVE,
+        }
+
+def close_clients() -> None:
+    """Close every pooled client (tests / shutdown hooks)."""
+    with _LOCK:
+        for c in _CLIENTS.values():
+            c.close()
+        _CLIENTS.clear()
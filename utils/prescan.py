@@ -0,0 +1,187 @@
+# utils/prescan.py
+"""
+Offline vague-language scanner for audit notes.
+
+One combined, case-insensitive regex is compiled from the quoted examples in
+every module's `instructions` (e.g. "various activities") plus the curated
+LEXICON below. Longer phrases are tried first, so "various activities" wins
+over "various". The scanner is rebuilt only when a module's instructions
+change, and a scan of a typical note takes microseconds.
+"""
+from __future__ import annotations
+import html
+import re
+import threading
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+from config import env
+from utils.module_loader import load_module, module_ids as _module_ids
+
+# ✅ Pre-scan knobs (override via env vars)
+SKIP_CLEAN      = env("PRESCAN_SKIP_CLEAN", "0") == "1"    # opt-in: skip the model when no listed phrase matches
+CLEAN_MAX_WORDS = int(env("PRESCAN_CLEAN_MAX_WORDS", "40"))  # longer notes always go to the model
+
+# phrase -> why it is vague (curated; module instructions add to this)
+LEXICON: Dict[str, str] = {
+    "various": "Name the specific items instead of “various”.",
+    "certain": "Say which ones.",
+    "numerous": "Give a count or amount.",
+    "several": "Give a count or amount.",
+    "a number of": "Give a count or amount.",
+    "multiple sources": "List the funding sources and amounts.",
+    "significant": "Quantify it.",
+    "substantial": "Quantify it.",
+    "as needed": "State the policy or trigger.",
+    "from time to time": "State the frequency or dates.",
+    "periodically": "State the frequency.",
+    "may or may not": "State whether it happened and under which policy.",
+    "if applicable": "State whether it applies.",
+    "where appropriate": "State the criteria.",
+    "as appropriate": "State the criteria.",
+    "generally": "State the rule and its exceptions.",
+    "typically": "State the rule and its exceptions.",
+    "in some cases": "Say which cases.",
+    "etc": "Complete the list.",
+    "and so on": "Complete the list.",
+    "miscellaneous": "Break out the components.",
+    "other activities": "Name the activities.",
+    "over time": "Give the schedule or period.",
+    "in the future": "Give the period or date.",
+    "at management's discretion": "Describe the allocation/approval method.",
+    "reasonable": "State the basis or method.",
+    "adequate": "State the standard it meets.",
+    "tbd": "Fill in the value before issuing.",
+}
+
+_QUOTED = re.compile(r"[\"“]([^\"”]+)[\"”]")
+_APOSTROPHE = re.compile(r"['’]")
+_SPACE = re.compile(r"\s+")
+# Concrete figures: money, percentages, scaled amounts and dates. Bare numbers
+# do not count, so "Note 3" or "Section 4.2" alone never makes a note specific.
+_MONTHS = (r"(?:jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|june?|july?|aug(?:ust)?"
+           r"|sep(?:t(?:ember)?)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?)\.?")
+_SPECIFIC = re.compile(
+    r"[$€£]\s?\d"                                               # $1,200 / € 5
+    r"|\b\d+(?:\.\d+)?\s?(?:%|percent\b)"                        # 15% / 4.5 percent
+    r"|\b\d[\d,.]*\s?(?:thousand|million|billion|[km]\b|bn\b)"   # 3 million / 250k
+    r"|\b(?:usd|eur|gbp)\s?\d"                                   # USD 400
+    rf"|\b{_MONTHS}\s+\d{{1,2}}\b|\b\d{{1,2}}\s+{_MONTHS}"          # March 31 / 31 March
+    r"|\b\d{1,2}/\d{1,2}/\d{2,4}\b|\b\d{4}-\d{2}-\d{2}\b"         # 03/31/2024 / 2024-03-31
+    r"|\b(?:fy|fiscal\s|year\s|in\s|since\s|through\s|until\s)'?\d{2,4}\b"  # FY24, fiscal 2023, in 2021
+    r"|\b(?:19|20)\d{2}\b(?!\.\d)",                             # a year: 2024 (not section 2024.1)
+    re.IGNORECASE,
+)
+
+@dataclass(frozen=True)
+class Span:
+    start: int
+    end: int
+    text: str      # as written in the note
+    phrase: str    # canonical lexicon phrase
+    source: str    # "lexicon" or "module N"
+    hint: str
+
+def _canon(phrase: str) -> str:
+    return _SPACE.sub(" ", _APOSTROPHE.sub("'", phrase.strip().lower()))
+
+def _pattern(phrase: str) -> str:
+    parts = [re.escape(w).replace("'", "['’]") for w in phrase.split(" ")]
+    body = r"\s+".join(parts)
+    return rf"(?<!\w){body}(?!\w)"
+
+def instruction_phrases(module_data: Mapping) -> List[str]:
+    """Quoted examples from a module's `instructions`, e.g. 'Flag vague terms (e.g., "restricted use")'."""
+    found: List[str] = []
+    for line in module_data.get("instructions") or ():
+        found.extend(m.group(1) for m in _QUOTED.finditer(str(line)))
+    return found
+
+class VagueScanner:
+    """Compiled multi-phrase matcher; build with VagueScanner.from_sources()."""
+
+    def __init__(self, phrases: Mapping[str, Tuple[str, str]]):
+        # canonical phrase -> (source, hint)
+        self.phrases = dict(phrases)
+        ordered = sorted(self.phrases, key=len, reverse=True)
+        self._regex = re.compile("|".join(_pattern(p) for p in ordered), re.IGNORECASE) if ordered else None
+
+    @classmethod
+    def from_sources(cls, modules: Iterable[Tuple[int, Mapping]], lexicon: Mapping[str, str] = LEXICON) -> "VagueScanner":
+        phrases: Dict[str, Tuple[str, str]] = {_canon(p): ("lexicon", hint) for p, hint in lexicon.items()}
+        for module_id, data in modules:
+            title = data.get("title", f"Module {module_id}")
+            for p in instruction_phrases(data):
+                phrases.setdefault(_canon(p), (f"module {module_id}", f"Flagged by {title}: be specific."))
+        return cls(phrases)
+
+    def scan(self, note: str) -> List[Span]:
+        if self._regex is None or not note:
+            return []
+        spans = []
+        for m in self._regex.finditer(note):
+            phrase = _canon(m.group(0))
+            source, hint = self.phrases.get(phrase, ("lexicon", ""))
+            spans.append(Span(m.start(), m.end(), m.group(0), phrase, source, hint))
+        return spans
+
+_SCANNER: Optional[VagueScanner] = None
+_SCANNER_KEY: Optional[tuple] = None
+_SCANNER_LOCK = threading.Lock()
+
+def get_scanner(module_ids: Optional[Sequence[int]] = None) -> VagueScanner:
+    """
+    Process-wide scanner over every module on disk (or just `module_ids`);
+    recompiled only when some module's instructions change.
+    """
+    global _SCANNER, _SCANNER_KEY
+    modules = []
+    for module_id in (_module_ids() if module_ids is None else module_ids):
+        try:
+            modules.append((module_id, load_module(module_id)))
+        except FileNotFoundError:
+            continue
+    key = tuple((mid, tuple(data.get("instructions") or ())) for mid, data in modules)
+    with _SCANNER_LOCK:
+        if _SCANNER is None or key != _SCANNER_KEY:
+            _SCANNER = VagueScanner.from_sources(modules)
+            _SCANNER_KEY = key
+        return _SCANNER
+
+def scan_note(note: str) -> List[Span]:
+    return get_scanner().scan(note)
+
+def is_trivially_clean(note: str, spans: Sequence[Span]) -> bool:
+    """
+    Opt-in shortcut (PRESCAN_SKIP_CLEAN=1): no listed vague phrase matched,
+    the note is short and it carries a concrete amount, percentage or date
+    (note and section numbers do not count). This is not a clean audit: the
+    scan cannot see missing disclosures, so the answer says only that.
+    """
+    if not SKIP_CLEAN or spans:
+        return False
+    words = len(note.split())
+    return 0 < words <= CLEAN_MAX_WORDS and bool(_SPECIFIC.search(note))
+
+def clean_review() -> str:
+    return (
+        "**Local pre-scan only (not a disclosure review)**\n"
+        "- None of the listed vague phrases were found, and the note cites at least one "
+        "figure or date.\n"
+        "- Completeness, accuracy and GAAP disclosure requirements were **not** checked.\n\n"
+        "**Recommendations**\n"
+        "- Run the model review for an actual audit of this note.\n"
+    )
+
+def highlight_html(note: str, spans: Sequence[Span]) -> str:
+    """Escape the note and wrap each vague span in <mark> with its hint as a tooltip."""
+    out, pos = [], 0
+    for s in spans:
+        out.append(html.escape(note[pos:s.start]))
+        out.append(
+            f"<mark title='{html.escape(s.hint, quote=True)}' "
+            f"style='background:#fde68a;padding:0 2px;border-radius:3px'>{html.escape(s.text)}</mark>"
+        )
+        pos = s.end
+    out.append(html.escape(note[pos:]))
+    return "".join(out).replace("\n", "<br>")
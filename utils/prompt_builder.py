@@ -1,16 +1,53 @@
 # utils/prompt_builder.py
 
-from typing import List, Dict
+import hashlib
+import os
+from typing import Any, List, Dict, Optional
+
+from utils.bundle import rendered
+from utils.metrics import annotate, record_messages, stage, timed
+from utils.module_loader import load_module
+
+def _record(messages: List[Dict[str, str]]) -> None:
+    # Attach the messages and their cacheable-prefix hash to the current trace
+    record_messages(messages)
+    annotate(prefix=prefix_hash(messages))
 
 def _bulletize(items):
     if not items:
         return ""
     return "\n".join([f"- {x}" for x in items])
 
-def build_prompt(module_data: Dict, audit_note: str) -> List[Dict[str, str]]:
+# Shared by every audit module, so it leads the system prompt. Keep it
+# byte-stable: any edit here invalidates Azure's prompt cache for all modules.
+AUDIT_PREAMBLE = """
+You are an expert nonprofit audit reviewer and technical writer.
+Your goal is to improve clarity, specificity, and GAAP-aligned disclosure quality.
+
+Output format:
+- Start with a concise summary of issues.
+- Provide improved wording (redlines or “before → after”).
+- Include clarifying questions to fill gaps.
+- Note risks or compliance considerations.
+- Keep recommendations specific and actionable.
+""".strip()
+
+DEFAULT_CHECKS = (
+    "- Identify vague or ambiguous language\n"
+    "- Provide precise, supportable alternatives\n"
+    "- Flag missing or risky disclosures"
+)
+DEFAULT_GUIDANCE = (
+    "Use plain, specific language; avoid boilerplate; include concrete amounts, "
+    "dates, policies, restrictions, and constraints when known."
+)
+DEFAULT_REFS = "- Use relevant GAAP guidance when applicable."
+
+def audit_system_prompt(module_data: Dict) -> str:
     """
-    Construct Azure OpenAI chat messages from a module YAML and the user note.
-    Expects module_data from utils.module_loader.load_module(...)
+    Stable per-module system prompt: shared preamble first, then the module
+    block. Depends only on the module YAML, so it is byte-identical across
+    runs and sessions and forms the cacheable prompt prefix.
     """
     title = module_data.get("title", "")
     objective = module_data.get("objective", "")
@@ -19,24 +56,11 @@ def build_prompt(module_data: Dict, audit_note: str) -> List[Dict[str, str]]:
     guidance = module_data.get("guidance", "")
     gaap_refs = module_data.get("gaap_refs", [])
 
-    checks_block = _bulletize(checks)
-    refs_block = _bulletize(gaap_refs)
-
     # Apply default text if no checks or GAAP references exist
-    if not checks_block:
-        checks_block = (
-            "- Identify vague or ambiguous language\n"
-            "- Provide precise, supportable alternatives\n"
-            "- Flag missing or risky disclosures"
-        )
-
-    if not refs_block:
-        refs_block = "- Use relevant GAAP guidance when applicable."
-
-    system_prompt = f"""
-You are an expert nonprofit audit reviewer and technical writer.
-Your goal is to improve clarity, specificity, and GAAP-aligned disclosure quality.
+    checks_block = _bulletize(checks) or DEFAULT_CHECKS
+    refs_block = _bulletize(gaap_refs) or DEFAULT_REFS
 
+    module_block = f"""
 Module: {title}
 Objective: {objective}
 Audit Context: {context}
@@ -45,27 +69,150 @@ Primary review checks:
 {checks_block}
 
 Additional guidance:
-{guidance if guidance else "Use plain, specific language; avoid boilerplate; include concrete amounts, dates, policies, restrictions, and constraints when known."}
+{guidance if guidance else DEFAULT_GUIDANCE}
 
 If GAAP references are relevant, consider:
 {refs_block}
-
-Output format:
-- Start with a concise summary of issues.
-- Provide improved wording (redlines or “before → after”).
-- Include clarifying questions to fill gaps.
-- Note risks or compliance considerations.
-- Keep recommendations specific and actionable.
 """.strip()
 
-    user_prompt = f"""Audit note to review:
+    return f"{AUDIT_PREAMBLE}\n\n{module_block}"
+
+FACTS_HEADER = (
+    "Computed figures (exact, from a local payoff/savings simulation). Quote them as given; "
+    "do not recalculate or invent other totals, dates or budget amounts:"
+)
+
+def finance_system_prompt(system: str, developer: str) -> str:
+    """system.md and developer.md joined into the one stable finance system message."""
+    return f"{system.strip()}\n\n{developer.strip()}"
+
+@timed("prompt_build")
+def build_prompt(module_data: Dict, audit_note: str) -> List[Dict[str, str]]:
+    """
+    Construct Azure OpenAI chat messages from a module YAML and the user note.
+    Expects module_data from utils.module_loader.load_module(...)
+
+    Layout is prefix-cache friendly: the stable system prompt comes first and
+    the only variable content (the note) is the last message.
+    """
+    user_prompt = f"""Please apply the checks and return a reviewer-friendly output as described.
+
+Audit note to review:
 ---
 {audit_note.strip()}
 ---
-Please apply the checks and return a reviewer-friendly output as described.
 """
 
-    return [
-        {"role": "system", "content": system_prompt},
+    messages = [
+        # Modules served from the compiled bundle carry their system prompt pre-rendered
+        {"role": "system", "content": module_data.get("system_prompt") or audit_system_prompt(module_data)},
         {"role": "user", "content": user_prompt},
     ]
+    _record(messages)
+    return messages
+
+def build_finance_prompt(
+    user_text: str,
+    income: str = "",
+    goals: str = "",
+    debts: str = "",
+    time_horizon: str = "",
+    constraints: str = "",
+    facts: str = "",
+) -> List[Dict[str, str]]:
+    """
+    Construct the Financial Clarity chat messages from the prompts/finance/clarifier
+    files (system, developer, user template) and the sidebar context.
+
+    system.md and developer.md are joined into one stable system message so the
+    request starts with a byte-identical prefix; the template puts its fixed
+    instruction before the per-user context and note. `facts` (from
+    utils.finance_sim.facts_block) is appended last, only when present, so
+    requests without numbers keep their existing cache keys.
+    """
+    system = rendered("finance.system") or finance_system_prompt(
+        str(load_module("prompts.finance.clarifier.system")),
+        str(load_module("prompts.finance.clarifier.developer")),
+    )
+    user_tmpl = str(load_module("prompts.finance.clarifier.user.tmpl"))
+
+    with stage("template_format"):
+        user_msg = user_tmpl.format(
+            user_text=user_text.strip(),
+            income=income or "TBD",
+            goals=goals or "TBD",
+            debts=debts or "TBD",
+            time_horizon=time_horizon or "TBD",
+            constraints=constraints or "None",
+        )
+        if facts:
+            user_msg += f"\n{FACTS_HEADER}\n{facts}\n"
+
+    messages = [
+        {"role": "system", "content": system},
+        {"role": "user", "content": user_msg},
+    ]
+    _record(messages)
+    return messages
+
+def finance_request(
+    user_text: str,
+    *,
+    income: str = "",
+    goals: str = "",
+    debts: str = "",
+    time_horizon: str = "",
+    constraints: str = "",
+    expenses: Optional[float] = None,
+    scenario: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """
+    One Financial Clarity plan request exactly as the page sends it, minus the
+    deployment and cache flags. The context numbers run through the local
+    simulator first (utils.finance_sim); its facts go into the prompt and
+    lower max_tokens. `scenario` is a committed what-if ({"extra", "rate"}).
+    Returns the chat parameters (messages, temperature, max_tokens,
+    response_format) plus "sim" (the analyze() report or None) and "facts"
+    (the fact lines sent, or ""). Used by the
+    page and by tools/replay.py, so replayed traffic matches the app.
+    """
+    from utils.demos import FINANCE_MAX_TOKENS, FINANCE_TEMPERATURE
+    from utils.finance_sim import FACTS_MAX_TOKENS, analyze, facts_block, parse_inputs
+    from utils.schema_finance import finance_response_format
+
+    with stage("simulate"):
+        inputs = parse_inputs(debts, income, goals, expenses)
+        if scenario and inputs.income is not None and inputs.expenses is not None:
+            inputs.extra_payment, inputs.savings_rate = scenario["extra"], scenario["rate"]
+        sim = analyze(inputs)
+    facts = facts_block(sim)
+    messages = build_finance_prompt(
+        user_text,
+        income=income,
+        goals=goals,
+        debts=debts,
+        time_horizon=time_horizon,
+        constraints=constraints,
+        facts=facts,
+    )
+    # Strict json_schema response_format derived from FinancePlan (set FINANCE_STRUCTURED_OUTPUT=0 to disable)
+    structured = os.environ.get("FINANCE_STRUCTURED_OUTPUT", "1") == "1"
+    return {
+        "messages": messages,
+        "temperature": float(FINANCE_TEMPERATURE),
+        # no arithmetic left for the model when the facts are supplied
+        "max_tokens": int(FACTS_MAX_TOKENS if facts else FINANCE_MAX_TOKENS),
+        "response_format": finance_response_format() if structured else None,
+        "sim": sim,
+        "facts": facts,
+    }
+
+def prompt_version(module_data: Dict) -> str:
+    """Short hash of the module's audit system prompt; changes with the YAML or the preamble."""
+    system = module_data.get("system_prompt") or audit_system_prompt(module_data)
+    return hashlib.sha256(system.encode("utf-8")).hexdigest()[:12]
+
+def prefix_hash(messages: List[Dict[str, str]]) -> str:
+    """Short hash of everything before the final message (the cacheable prefix)."""
+    blob = "\x1e".join(f"{m['role']}\x1f{m['content']}" for m in messages[:-1])
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()[:12]
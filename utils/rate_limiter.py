@@ -0,0 +1,244 @@
+# utils/rate_limiter.py
+from __future__ import annotations
+import asyncio
+import random
+import threading
+import time
+from typing import Any, Dict, List, Mapping, Optional
+
+from config import env
+
+# ✅ Deployment quota (override via env vars). Azure grants ~6 RPM per 1k TPM.
+RPM_LIMIT = float(env("AOAI_RPM", "180"))
+TPM_LIMIT = float(env("AOAI_TPM", "30000"))
+MAX_QUEUE_WAIT = float(env("AOAI_MAX_QUEUE_WAIT", "120"))   # seconds a request may wait for budget
+MAX_ATTEMPTS   = int(env("AOAI_MAX_ATTEMPTS", "6"))          # total tries incl. the first
+BACKOFF_BASE   = float(env("AOAI_BACKOFF_BASE", "1.0"))
+BACKOFF_MAX    = float(env("AOAI_BACKOFF_MAX", "30"))
+DEFAULT_COMPLETION_TOKENS = int(env("AOAI_DEFAULT_COMPLETION_TOKENS", "800"))
+
+# ---------- token estimates ----------
+def estimate_prompt_tokens(messages: List[Dict[str, str]]) -> int:
+    """Cheap pre-send estimate (~4 chars/token plus per-message framing)."""
+    chars = sum(len(m.get("content") or "") for m in messages)
+    return chars // 4 + 4 * len(messages) + 3
+
+def estimate_request_tokens(messages: List[Dict[str, str]], max_tokens: Optional[int]) -> int:
+    # Azure charges the TPM window with prompt tokens + max_tokens up front
+    return estimate_prompt_tokens(messages) + int(max_tokens or DEFAULT_COMPLETION_TOKENS)
+
+# ---------- header parsing ----------
+def _header(headers: Optional[Mapping[str, str]], name: str) -> Optional[str]:
+    if not headers:
+        return None
+    try:
+        return headers.get(name)
+    except Exception:
+        return None
+
+def _seconds(value: Optional[str]) -> Optional[float]:
+    """Parse '12', '1.5', '250ms', '6s', '1m30s' style durations."""
+    if value is None:
+        return None
+    v = str(value).strip().lower()
+    try:
+        if v.endswith("ms"):
+            return float(v[:-2]) / 1000.0
+        if v.endswith("m") or ("m" in v and v.endswith("s")):
+            mins, _, rest = v.partition("m")
+            return float(mins) * 60 + (float(rest.rstrip("s")) if rest.rstrip("s") else 0.0)
+        return float(v.rstrip("s"))
+    except ValueError:
+        return None
+
+def retry_after(headers: Optional[Mapping[str, str]]) -> Optional[float]:
+    """Server-suggested wait from retry-after-ms / Retry-After / x-ratelimit-reset-*."""
+    ms = _header(headers, "retry-after-ms")
+    if ms is not None:
+        try:
+            return float(ms) / 1000.0
+        except ValueError:
+            pass
+    for name in ("retry-after", "x-ratelimit-reset-requests", "x-ratelimit-reset-tokens"):
+        secs = _seconds(_header(headers, name))
+        if secs is not None:
+            return secs
+    return None
+
+def backoff_delay(attempt: int, headers: Optional[Mapping[str, str]] = None) -> float:
+    """Retry-After if the server sent one, else full-jitter exponential backoff."""
+    hinted = retry_after(headers)
+    if hinted is not None:
+        return min(BACKOFF_MAX, hinted) + random.uniform(0, 0.25)
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt)))
+
+class RateLimiter:
+    """
+    Client-side RPM + TPM token buckets shared by every chat completion.
+
+    acquire() queues the caller until both buckets hold enough budget (or a
+    server 429 pause has passed) instead of failing; reconcile() corrects the
+    token bucket once real usage is known; observe() adopts the server's
+    x-ratelimit-remaining-* view when it is stricter than ours.
+    """
+
+    def __init__(self, rpm: float = RPM_LIMIT, tpm: float = TPM_LIMIT, max_wait: float = MAX_QUEUE_WAIT):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_wait = max_wait
+        self._lock = threading.Lock()
+        self._requests = rpm
+        self._tokens = tpm
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._stats = {
+            "acquired": 0, "queued": 0, "queue_depth": 0, "max_queue_depth": 0,
+            "wait_seconds": 0.0, "throttled": 0, "retries": 0, "reconciled_tokens": 0,
+        }
+
+    # ---------- bucket maths ----------
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._updated
+        self._updated = now
+        if self.rpm > 0:
+            self._requests = min(self.rpm, self._requests + elapsed * self.rpm / 60.0)
+        if self.tpm > 0:
+            self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60.0)
+
+    def _try_acquire(self, tokens: int) -> float:
+        """Take budget and return 0, or return seconds until it could succeed."""
+        now = time.monotonic()
+        with self._lock:
+            self._refill(now)
+            if now < self._paused_until:
+                return self._paused_until - now
+            need = min(float(tokens), self.tpm) if self.tpm > 0 else 0.0
+            waits = [0.0]
+            if self.rpm > 0 and self._requests < 1:
+                waits.append((1 - self._requests) * 60.0 / self.rpm)
+            if self.tpm > 0 and self._tokens < need:
+                waits.append((need - self._tokens) * 60.0 / self.tpm)
+            wait = max(waits)
+            if wait > 0:
+                return wait
+            if self.rpm > 0:
+                self._requests -= 1
+            if self.tpm > 0:
+                self._tokens -= need
+            self._stats["acquired"] += 1
+            return 0.0
+
+    def _enter_queue(self) -> None:
+        with self._lock:
+            self._stats["queued"] += 1
+            self._stats["queue_depth"] += 1
+            self._stats["max_queue_depth"] = max(self._stats["max_queue_depth"], self._stats["queue_depth"])
+
+    def _leave_queue(self, waited: float) -> None:
+        with self._lock:
+            self._stats["queue_depth"] -= 1
+            self._stats["wait_seconds"] += waited
+
+    # ---------- public API ----------
+    def acquire(self, tokens: int) -> float:
+        """Block until budget is available; returns seconds spent queued."""
+        wait = self._try_acquire(tokens)
+        if wait <= 0:
+            return 0.0
+        started = time.monotonic()
+        self._enter_queue()
+        try:
+            while wait > 0:
+                if time.monotonic() - started + wait > self.max_wait:
+                    raise TimeoutError(f"Rate limit queue wait exceeded {self.max_wait:.0f}s")
+                time.sleep(min(wait, 1.0))
+                wait = self._try_acquire(tokens)
+        finally:
+            waited = time.monotonic() - started
+            self._leave_queue(waited)
+        return waited
+
+    async def acquire_async(self, tokens: int) -> float:
+        """asyncio flavour of acquire() (never blocks the event loop)."""
+        wait = self._try_acquire(tokens)
+        if wait <= 0:
+            return 0.0
+        started = time.monotonic()
+        self._enter_queue()
+        try:
+            while wait > 0:
+                if time.monotonic() - started + wait > self.max_wait:
+                    raise TimeoutError(f"Rate limit queue wait exceeded {self.max_wait:.0f}s")
+                await asyncio.sleep(min(wait, 1.0))
+                wait = self._try_acquire(tokens)
+        finally:
+            waited = time.monotonic() - started
+            self._leave_queue(waited)
+        return waited
+
+    def release(self, tokens: int) -> None:
+        """Give back budget for a request that never reached the model."""
+        with self._lock:
+            if self.rpm > 0:
+                self._requests = min(self.rpm, self._requests + 1)
+            if self.tpm > 0:
+                self._tokens = min(self.tpm, self._tokens + tokens)
+
+    def reconcile(self, estimated: int, actual: Optional[int]) -> None:
+        """Correct the token bucket with the real usage.total_tokens."""
+        if actual is None or self.tpm <= 0:
+            return
+        with self._lock:
+            self._tokens = min(self.tpm, self._tokens + (estimated - actual))
+            self._stats["reconciled_tokens"] += estimated - actual
+
+    def observe(self, headers: Optional[Mapping[str, str]]) -> None:
+        """Adopt x-ratelimit-remaining-* when the server has less budget than we think."""
+        with self._lock:
+            for name, attr in (("x-ratelimit-remaining-requests", "_requests"),
+                               ("x-ratelimit-remaining-tokens", "_tokens")):
+                raw = _header(headers, name)
+                try:
+                    remaining = float(raw) if raw is not None else None
+                except ValueError:
+                    remaining = None
+                if remaining is not None and remaining < getattr(self, attr):
+                    setattr(self, attr, remaining)
+
+    def throttled(self, headers: Optional[Mapping[str, str]], attempt: int) -> float:
+        """Record a 429: pause every caller for the backoff delay and return it."""
+        delay = backoff_delay(attempt, headers)
+        with self._lock:
+            self._stats["throttled"] += 1
+            self._paused_until = max(self._paused_until, time.monotonic() + delay)
+        self.observe(headers)
+        return delay
+
+    def note_retry(self) -> None:
+        with self._lock:
+            self._stats["retries"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        with self._lock:
+            self._refill(now)
+            return {
+                **self._stats,
+                "wait_seconds": round(self._stats["wait_seconds"], 3),
+                "requests_available": round(self._requests, 2),
+                "tokens_available": int(self._tokens),
+                "rpm_limit": self.rpm,
+                "tpm_limit": self.tpm,
+                "paused_for": round(max(0.0, self._paused_until - now), 2),
+            }
+
+_LIMITER: Optional[RateLimiter] = None
+_LIMITER_LOCK = threading.Lock()
+
+def get_limiter() -> RateLimiter:
+    """Process-wide limiter shared by both pages (AOAI_RPM / AOAI_TPM)."""
+    global _LIMITER
+    with _LIMITER_LOCK:
+        if _LIMITER is None:
+            _LIMITER = RateLimiter()
+        return _LIMITER
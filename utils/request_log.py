@@ -0,0 +1,186 @@
+# utils/request_log.py
+"""
+Append-only JSONL log of model requests (for cache analysis, replay and cost).
+
+log() only appends a dict to an in-memory deque; a daemon thread serializes
+and writes the buffer every FLUSH_SECONDS (or sooner once BATCH records are
+waiting), so the request path never touches the disk. Segments rotate by
+size or age, rotated segments are optionally gzipped, and read_records()
+streams every segment back in order.
+"""
+from __future__ import annotations
+import atexit
+import gzip
+import json
+import os
+import shutil
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterator, List, Optional, TextIO
+
+from config import env
+
+# ✅ Request log knobs (override via env vars)
+LOG_DIR        = env("CLARITY_REQUEST_LOG_DIR", "logs")  # empty = no request log
+MAX_BYTES      = int(env("REQUEST_LOG_MAX_BYTES", str(16 * 1024 * 1024)))  # rotate after this many bytes
+MAX_SECONDS    = float(env("REQUEST_LOG_MAX_SECONDS", "3600"))  # ...or after this long
+GZIP_ROTATED   = env("REQUEST_LOG_GZIP", "1") == "1"
+KEEP_SEGMENTS  = int(env("REQUEST_LOG_KEEP_SEGMENTS", "168"))  # oldest rotated segments are deleted
+FLUSH_SECONDS  = float(env("REQUEST_LOG_FLUSH_SECONDS", "1.0"))
+BATCH          = int(env("REQUEST_LOG_BATCH", "256"))  # wake the flusher early at this many records
+MAX_BUFFER     = int(env("REQUEST_LOG_MAX_BUFFER", "50000"))  # beyond this, new records are dropped
+
+PREFIX = "requests-"
+
+class RequestLog:
+    """Buffered writer; one active segment at a time, named by its open time."""
+
+    def __init__(self, directory: str, max_bytes: int = MAX_BYTES, max_seconds: float = MAX_SECONDS,
+                 gzip_rotated: bool = GZIP_ROTATED, keep: int = KEEP_SEGMENTS,
+                 flush_seconds: float = FLUSH_SECONDS, batch: int = BATCH, max_buffer: int = MAX_BUFFER):
+        self.dir = Path(directory)
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.gzip_rotated = gzip_rotated
+        self.keep = keep
+        self.flush_seconds = flush_seconds
+        self.batch = batch
+        self.max_buffer = max_buffer
+        self._buf: Deque[Dict[str, Any]] = deque()
+        self._wake = threading.Event()
+        self._io_lock = threading.Lock()  # one writer: the flusher, or flush() at exit
+        self._file: Optional[TextIO] = None
+        self._path: Optional[Path] = None
+        self._opened = 0.0
+        self._size = 0
+        self._stats = {"logged": 0, "written": 0, "dropped": 0, "rotations": 0, "flushes": 0, "write_errors": 0}
+        self._thread = threading.Thread(target=self._run, name="clarity-request-log", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    # ---------- request path ----------
+    def log(self, record: Dict[str, Any]) -> None:
+        """Queue one record; never blocks on I/O."""
+        if len(self._buf) >= self.max_buffer:
+            self._stats["dropped"] += 1
+            return
+        self._buf.append(record)  # deque.append is atomic
+        self._stats["logged"] += 1
+        if len(self._buf) >= self.batch:
+            self._wake.set()
+
+    # ---------- flusher thread ----------
+    def _run(self) -> None:
+        while True:
+            self._wake.wait(self.flush_seconds)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:  # keep the flusher alive whatever a flush raises
+                self._stats["write_errors"] += 1
+
+    def flush(self) -> None:
+        """Write everything buffered so far (called by the flusher and at exit)."""
+        with self._io_lock:
+            if self._file is not None and time.time() - self._opened >= self.max_seconds:
+                try:
+                    self._rotate()
+                except OSError:
+                    self._stats["write_errors"] += 1
+                    return
+            if not self._buf:
+                return
+            lines: List[str] = []
+            while self._buf:
+                lines.append(json.dumps(self._buf.popleft(), ensure_ascii=False, default=str))
+            try:
+                for line in lines:
+                    if self._file is None or self._size >= self.max_bytes:
+                        self._rotate()
+                    data = line + "\n"
+                    self._file.write(data)
+                    self._size += len(data.encode("utf-8"))
+                self._file.flush()
+            except OSError:
+                self._stats["write_errors"] += 1
+                return
+            self._stats["written"] += len(lines)
+            self._stats["flushes"] += 1
+
+    def _rotate(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            closed, self._file = self._path, None
+            self._stats["rotations"] += 1
+            if self.gzip_rotated and closed is not None:
+                with closed.open("rb") as src, gzip.open(f"{closed}.gz", "wb") as dst:
+                    shutil.copyfileobj(src, dst)
+                closed.unlink()
+            self._prune()
+        self.dir.mkdir(parents=True, exist_ok=True)
+        stamp = time.strftime("%Y%m%dT%H%M%S", time.gmtime())
+        self._path = self.dir / f"{PREFIX}{stamp}-{os.getpid()}-{self._stats['rotations']:04d}.jsonl"
+        self._file = self._path.open("a", encoding="utf-8")
+        self._opened = time.time()
+        self._size = 0
+
+    def _prune(self) -> None:
+        rotated = [p for p in segments(self.dir) if p != self._path]
+        for old in rotated[:max(0, len(rotated) - self.keep)]:
+            old.unlink(missing_ok=True)
+
+    def close(self) -> None:
+        self.flush()
+        with self._io_lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self._stats, "buffered": len(self._buf), "segment_bytes": self._size}
+
+# ---------- reader API ----------
+def segments(directory: str | Path = LOG_DIR) -> List[Path]:
+    """Log segments oldest first (names sort by open time)."""
+    d = Path(directory)
+    if not d.is_dir():
+        return []
+    return sorted(p for p in d.iterdir() if p.name.startswith(PREFIX) and p.name.endswith((".jsonl", ".jsonl.gz")))
+
+def read_records(directory: str | Path = LOG_DIR, since: Optional[float] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Stream records from every segment (gzipped or not), oldest first.
+    `since` (unix seconds) skips older records; a torn last line is skipped.
+    """
+    for path in segments(directory):
+        opener = gzip.open if path.suffix == ".gz" else open
+        with opener(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if since is None or record.get("ts", 0) >= since:
+                    yield record
+
+_LOG: Optional[RequestLog] = None
+_LOG_LOCK = threading.Lock()
+
+def get_request_log() -> Optional[RequestLog]:
+    """Process-wide log, or None when CLARITY_REQUEST_LOG_DIR is empty."""
+    global _LOG
+    if not LOG_DIR:
+        return None
+    if _LOG is not None:
+        return _LOG
+    with _LOG_LOCK:
+        if _LOG is None:
+            _LOG = RequestLog(LOG_DIR)
+        return _LOG
+
+def log_request(record: Dict[str, Any]) -> None:
+    log = get_request_log()
+    if log is not None:
+        log.log(record)
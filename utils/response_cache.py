@@ -0,0 +1,179 @@
+# utils/response_cache.py
+from __future__ import annotations
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import env
+
+# ✅ Cache knobs (override via env vars)
+MEMORY_MAX_ENTRIES = int(env("LLM_CACHE_MAX_ENTRIES", "512"))
+MEMORY_MAX_BYTES   = int(env("LLM_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+DISK_MAX_ENTRIES   = int(env("LLM_CACHE_DISK_MAX_ENTRIES", "5000"))
+TTL_SECONDS        = float(env("LLM_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+DISK_PATH          = env("LLM_CACHE_DB", "")  # e.g. ".cache/llm_cache.sqlite3"; empty = memory only
+
+def cache_key(
+    deployment: str,
+    api_version: str,
+    messages: List[Dict[str, str]],
+    temperature: Optional[float] = None,
+    max_tokens: Optional[int] = None,
+    response_format: Optional[Dict[str, Any]] = None,
+) -> str:
+    """Content address for a chat request: sha256 of its canonical JSON form."""
+    payload = {
+        "deployment": deployment,
+        "api_version": api_version,
+        "messages": [{"role": m.get("role"), "content": m.get("content")} for m in messages],
+        "temperature": temperature,
+        "max_tokens": max_tokens,
+    }
+    if response_format is not None:
+        payload["response_format"] = response_format
+    blob = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+class ResponseCache:
+    """
+    Two-tier response cache.
+
+    - memory: LRU bounded by entry count and total payload bytes
+    - disk:   optional SQLite file that survives restarts, trimmed to the
+              newest DISK_MAX_ENTRIES rows
+
+    Entries older than `ttl` seconds are treated as misses in both tiers.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = MEMORY_MAX_ENTRIES,
+        max_bytes: int = MEMORY_MAX_BYTES,
+        ttl: float = TTL_SECONDS,
+        disk_path: Optional[str] = None,
+        disk_max_entries: int = DISK_MAX_ENTRIES,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.disk_max_entries = disk_max_entries
+        self._lock = threading.Lock()
+        self._mem: "OrderedDict[str, Tuple[float, int, Dict[str, Any]]]" = OrderedDict()
+        self._mem_bytes = 0
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0, "writes": 0}
+        self._db: Optional[sqlite3.Connection] = None
+        if disk_path:
+            Path(disk_path).parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(disk_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY, created REAL NOT NULL, payload TEXT NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS responses_created ON responses(created)")
+            self._db.commit()
+
+    # ---------- memory tier ----------
+    def _mem_put(self, key: str, created: float, value: Dict[str, Any], size: int) -> None:
+        old = self._mem.pop(key, None)
+        if old is not None:
+            self._mem_bytes -= old[1]
+        self._mem[key] = (created, size, value)
+        self._mem_bytes += size
+        while self._mem and (len(self._mem) > self.max_entries or self._mem_bytes > self.max_bytes):
+            _, (_, evicted_size, _) = self._mem.popitem(last=False)
+            self._mem_bytes -= evicted_size
+            self._stats["evictions"] += 1
+
+    def _expired(self, created: float) -> bool:
+        return self.ttl > 0 and (time.time() - created) > self.ttl
+
+    # ---------- public API ----------
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._mem.get(key)
+            if entry is not None:
+                created, size, value = entry
+                if not self._expired(created):
+                    self._mem.move_to_end(key)
+                    self._stats["memory_hits"] += 1
+                    return value
+                self._mem.pop(key)
+                self._mem_bytes -= size
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT created, payload FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    created, payload = row
+                    if not self._expired(created):
+                        value = json.loads(payload)
+                        self._mem_put(key, created, value, len(payload))
+                        self._stats["disk_hits"] += 1
+                        return value
+                    self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self._db.commit()
+
+            self._stats["misses"] += 1
+            return None
+
+    def put(self, key: str, value: Dict[str, Any]) -> None:
+        payload = json.dumps(value, ensure_ascii=False)
+        created = time.time()
+        with self._lock:
+            self._mem_put(key, created, value, len(payload))
+            self._stats["writes"] += 1
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses (key, created, payload) VALUES (?, ?, ?)",
+                    (key, created, payload),
+                )
+                self._db.execute(
+                    "DELETE FROM responses WHERE created < ? OR key NOT IN ("
+                    " SELECT key FROM responses ORDER BY created DESC LIMIT ?)",
+                    (created - self.ttl if self.ttl > 0 else 0, self.disk_max_entries),
+                )
+                self._db.commit()
+
+    def discard(self, key: str) -> None:
+        """Drop one entry from both tiers (e.g. an answer that failed validation)."""
+        with self._lock:
+            old = self._mem.pop(key, None)
+            if old is not None:
+                self._mem_bytes -= old[1]
+            if self._db is not None:
+                self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._db.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._mem.clear()
+            self._mem_bytes = 0
+            if self._db is not None:
+                self._db.execute("DELETE FROM responses")
+                self._db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self._stats,
+                "memory_entries": len(self._mem),
+                "memory_bytes": self._mem_bytes,
+                "disk_enabled": self._db is not None,
+            }
+
+_CACHE: Optional[ResponseCache] = None
+_CACHE_LOCK = threading.Lock()
+
+def get_cache() -> ResponseCache:
+    """Process-wide cache instance (disk tier enabled when LLM_CACHE_DB is set)."""
+    global _CACHE
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            _CACHE = ResponseCache(disk_path=DISK_PATH or None)
+        return _CACHE
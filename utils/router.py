@@ -0,0 +1,260 @@
+# utils/router.py
+"""
+Tiered deployment routing with validation-driven escalation.
+
+Short notes with small expected outputs go to the small deployment
+(AZURE_OPENAI_DEPLOYMENT_SMALL). Its answer is checked locally: finance
+output must validate as a FinancePlan, and audit reviews must contain every
+required section from AUDIT_PREAMBLE's "Output format". Only a failed check
+escalates the request to the large deployment (the caller's `model`), and
+the rejected answer is dropped from the response cache so a repeat request
+tries the small tier afresh instead of replaying a known-bad answer.
+Without a small deployment configured, everything goes straight to `model`.
+
+The output threshold sits between the two finance budgets: a plan with the
+simulator's facts (FACTS_MAX_TOKENS, 700) routes small, a plan that still
+needs arithmetic (900) goes large; audit notes route small up to ~275 tokens.
+"""
+from __future__ import annotations
+import threading
+import time
+from dataclasses import dataclass, replace
+from typing import Any, Callable, Dict, Iterator, Optional
+
+from config import env
+from utils.chunking import approx_tokens, missing_sections
+from utils.llm import Completion, achat_completion, chat_completion, stream_chat_completion
+from utils.metrics import REGISTRY, annotate
+from utils.response_cache import get_cache
+
+# ✅ Routing knobs (override via env vars)
+SMALL_DEPLOYMENT        = env("AZURE_OPENAI_DEPLOYMENT_SMALL", "")  # e.g. "gpt-4o-mini"; empty = no routing
+SMALL_MAX_NOTE_TOKENS   = int(env("ROUTER_SMALL_MAX_NOTE_TOKENS", "400"))
+SMALL_MAX_OUTPUT_TOKENS = int(env("ROUTER_SMALL_MAX_OUTPUT_TOKENS", "800"))
+LARGE_MODULES           = frozenset(int(m) for m in env("ROUTER_LARGE_MODULES", "").split(",") if m.strip())
+LATENCY_ALPHA           = 0.2  # EWMA weight for the per-tier latency baseline
+
+@dataclass(frozen=True)
+class Route:
+    tier: str        # "small" | "large"
+    deployment: str
+    reason: str
+
+def expected_output_tokens(note_tokens: int, max_tokens: Optional[int] = None) -> int:
+    # Audit reviews restate the note (before → after) plus a few hundred tokens of findings
+    return max_tokens if max_tokens else 250 + 2 * note_tokens
+
+def choose(note: str, *, large: str, module_id: Optional[int] = None, max_tokens: Optional[int] = None) -> Route:
+    """Pick a tier from note length, module and expected output size."""
+    if not SMALL_DEPLOYMENT:
+        return Route("large", large, "routing off")
+    if module_id is not None and int(module_id) in LARGE_MODULES:
+        return Route("large", large, f"module {module_id}")
+    tokens = approx_tokens(note)
+    if tokens > SMALL_MAX_NOTE_TOKENS:
+        return Route("large", large, "long note")
+    if expected_output_tokens(tokens, max_tokens) > SMALL_MAX_OUTPUT_TOKENS:
+        return Route("large", large, "large output")
+    return Route("small", SMALL_DEPLOYMENT, "short note")
+
+def check_output(kind: str, text: str) -> Optional[str]:
+    """None when the answer is usable, else why it is not."""
+    if not text.strip():
+        return "empty answer"
+    if kind == "finance":
+        from utils.schema_finance import parse_finance_plan  # pydantic: deferred until first use
+
+        try:
+            parse_finance_plan(text)
+        except Exception as e:
+            return f"invalid plan ({type(e).__name__})"
+        return None
+    missing = missing_sections(text)
+    if len(missing) > 2:
+        return f"missing {len(missing)} required sections"
+    return f"missing {', '.join(missing)}" if missing else None
+
+# ---------- accounting ----------
+class RouterStats:
+    """
+    Tier mix plus latency saved: an accepted small-tier answer saves the
+    large tier's typical (EWMA) latency minus its own; an escalation wastes
+    the small call's latency. Cache hits count toward the mix only.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._mean: Dict[tuple, float] = {}  # (kind, tier) -> EWMA seconds
+        self._stats = {"small": 0, "large": 0, "escalated": 0, "saved_seconds": 0.0, "wasted_seconds": 0.0}
+
+    def record(self, kind: str, tier: str, outcome: str, seconds: float, cached: bool) -> None:
+        REGISTRY.inc("clarity_route_total", help="Routed requests by tier and outcome", kind=kind, tier=tier, outcome=outcome)
+        with self._lock:
+            self._stats[tier] += 1
+            if outcome == "escalated":
+                self._stats["escalated"] += 1
+            if cached:
+                return
+            prev = self._mean.get((kind, tier))
+            self._mean[(kind, tier)] = seconds if prev is None else prev + LATENCY_ALPHA * (seconds - prev)
+            large = self._mean.get((kind, "large"))
+            saved = wasted = 0.0
+            if outcome == "accepted" and large is not None:
+                saved = max(0.0, large - seconds)
+            elif outcome == "escalated":
+                wasted = seconds
+            self._stats["saved_seconds"] += saved
+            self._stats["wasted_seconds"] += wasted
+        REGISTRY.observe("clarity_route_seconds", seconds, help="Upstream latency by tier", kind=kind, tier=tier)
+        if saved:
+            REGISTRY.inc("clarity_route_saved_seconds_total", saved, help="Latency saved by small-tier answers", kind=kind)
+        if wasted:
+            REGISTRY.inc("clarity_route_wasted_seconds_total", wasted, help="Small-tier latency lost to escalation", kind=kind)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            total = self._stats["small"] + self._stats["large"]
+            return {
+                **{k: round(v, 3) if isinstance(v, float) else v for k, v in self._stats.items()},
+                "small_share": round(self._stats["small"] / total, 3) if total else 0.0,
+                "net_saved_seconds": round(self._stats["saved_seconds"] - self._stats["wasted_seconds"], 3),
+            }
+
+_STATS = RouterStats()
+
+def get_router_stats() -> RouterStats:
+    return _STATS
+
+def _escalate(kind: str, small_seconds: float, cached: bool, problem: str, key: Optional[str]) -> None:
+    if key:
+        get_cache().discard(key)  # never serve (and re-escalate) the rejected answer again
+    _STATS.record(kind, "small", "escalated", small_seconds, cached)
+    annotate(tier="large", escalated=problem)
+
+def _accept(kind: str, route: Route, outcome: str, seconds: float, cached: bool) -> None:
+    _STATS.record(kind, route.tier, outcome, seconds, cached)
+    annotate(tier=route.tier, route_reason=route.reason)
+
+# ---------- routed calls ----------
+def routed_completion(
+    client: Any,
+    *,
+    kind: str,
+    note: str,
+    model: str,
+    module_id: Optional[int] = None,
+    **call: Any,
+) -> Completion:
+    """chat_completion() on the chosen tier, escalating to `model` when the answer fails check_output()."""
+    route = choose(note, large=model, module_id=module_id, max_tokens=call.get("max_tokens"))
+    problem = ""
+    if route.tier == "small":
+        started = time.perf_counter()
+        result = chat_completion(client, model=route.deployment, **call)
+        problem = check_output(kind, result.text) or ""
+        if not problem:
+            _accept(kind, route, "accepted", time.perf_counter() - started, result.cached)
+            return replace(result, tier="small")
+        _escalate(kind, time.perf_counter() - started, result.cached, problem, result.key)
+    started = time.perf_counter()
+    result = chat_completion(client, model=model, **call)
+    _accept(kind, Route("large", model, route.reason), "escalation" if problem else "direct",
+            time.perf_counter() - started, result.cached)
+    return replace(result, tier="large", escalated=problem)
+
+async def arouted_completion(
+    client: Any,
+    *,
+    kind: str,
+    note: str,
+    model: str,
+    module_id: Optional[int] = None,
+    **call: Any,
+) -> Completion:
+    """Async counterpart of routed_completion()."""
+    route = choose(note, large=model, module_id=module_id, max_tokens=call.get("max_tokens"))
+    problem = ""
+    if route.tier == "small":
+        started = time.perf_counter()
+        result = await achat_completion(client, model=route.deployment, **call)
+        problem = check_output(kind, result.text) or ""
+        if not problem:
+            _accept(kind, route, "accepted", time.perf_counter() - started, result.cached)
+            return replace(result, tier="small")
+        _escalate(kind, time.perf_counter() - started, result.cached, problem, result.key)
+    started = time.perf_counter()
+    result = await achat_completion(client, model=model, **call)
+    _accept(kind, Route("large", model, route.reason), "escalation" if problem else "direct",
+            time.perf_counter() - started, result.cached)
+    return replace(result, tier="large", escalated=problem)
+
+class RoutedStream:
+    """
+    Streamed counterpart of routed_completion(). The small tier's deltas are
+    yielded as they arrive; if its full answer fails the check, on_escalate
+    (reason) is called so the consumer can discard what it showed, and the
+    large tier's deltas follow. Afterwards it exposes the same attributes as
+    ChatStream (text, usage, ttft, elapsed, cached, coalesced) plus tier and
+    escalated.
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        *,
+        kind: str,
+        note: str,
+        model: str,
+        module_id: Optional[int] = None,
+        on_escalate: Optional[Callable[[str], None]] = None,
+        **call: Any,
+    ):
+        self.client = client
+        self.kind = kind
+        self.model = model
+        self.call = call
+        self.on_escalate = on_escalate
+        self.route = choose(note, large=model, module_id=module_id, max_tokens=call.get("max_tokens"))
+        self.tier = self.route.tier
+        self.escalated = ""
+        self.text = ""
+        self.usage: Dict[str, Any] = {}
+        self.ttft: Optional[float] = None
+        self.elapsed: Optional[float] = None
+        self.cached = False
+        self.coalesced = False
+        self.key: Optional[str] = None
+
+    def _run(self, deployment: str, started: float) -> Iterator[str]:
+        stream = stream_chat_completion(self.client, model=deployment, **self.call)
+        self.ttft = None
+        for delta in stream:
+            if self.ttft is None:
+                self.ttft = time.perf_counter() - started
+            yield delta
+        self.text, self.usage = stream.text, stream.usage
+        self.cached, self.coalesced = stream.cached, stream.coalesced
+        self.key = stream.key
+
+    def __iter__(self) -> Iterator[str]:
+        started = time.perf_counter()
+        if self.route.tier == "small":
+            yield from self._run(self.route.deployment, started)
+            problem = check_output(self.kind, self.text)
+            if problem is None:
+                self.elapsed = time.perf_counter() - started
+                _accept(self.kind, self.route, "accepted", self.elapsed, self.cached)
+                return
+            self.escalated, self.tier = problem, "large"
+            _escalate(self.kind, time.perf_counter() - started, self.cached, problem, self.key)
+            if self.on_escalate is not None:
+                self.on_escalate(problem)
+        large_started = time.perf_counter()
+        yield from self._run(self.model, started)
+        self.elapsed = time.perf_counter() - started
+        _accept(self.kind, Route("large", self.model, self.route.reason),
+                "escalation" if self.escalated else "direct", time.perf_counter() - large_started, self.cached)
+
+def routed_stream(client: Any, **kwargs: Any) -> RoutedStream:
+    """Streaming counterpart of routed_completion(); see RoutedStream."""
+    return RoutedStream(client, **kwargs)
@@ -1,4 +1,6 @@
-from typing import List
+import copy
+from functools import lru_cache
+from typing import Any, Dict, List
 from pydantic import BaseModel, Field
 
 class Action(BaseModel):
@@ -22,3 +24,48 @@ class FinancePlan(BaseModel):
 
 def validate_finance_plan(obj: dict) -> FinancePlan:
     return FinancePlan(**obj)
+
+def parse_finance_plan(raw: str) -> FinancePlan:
+    """Validate the model's JSON text straight into FinancePlan (no dict step)."""
+    return FinancePlan.model_validate_json(raw)
+
+def _strict(node: Any) -> Any:
+    # Structured-output strict mode: every property required, no extras, no defaults
+    if isinstance(node, list):
+        for v in node:
+            _strict(v)
+        return node
+    if not isinstance(node, dict):
+        return node
+    node.pop("default", None)
+    node.pop("title", None)
+    if node.get("type") == "object" and isinstance(node.get("properties"), dict):
+        node["additionalProperties"] = False
+        node["required"] = list(node["properties"])
+    for key, v in node.items():
+        if key in ("properties", "$defs"):
+            # name -> schema maps: recurse into the schemas, keep the names
+            for sub in v.values():
+                _strict(sub)
+        else:
+            _strict(v)
+    return node
+
+@lru_cache(maxsize=1)
+def _finance_plan_schema() -> Dict[str, Any]:
+    return _strict(FinancePlan.model_json_schema())
+
+def finance_plan_json_schema() -> Dict[str, Any]:
+    """Strict JSON schema derived from FinancePlan/Action/BudgetAdj (built once per process)."""
+    return copy.deepcopy(_finance_plan_schema())
+
+@lru_cache(maxsize=1)
+def _response_format() -> Dict[str, Any]:
+    return {
+        "type": "json_schema",
+        "json_schema": {"name": "FinancePlan", "strict": True, "schema": _finance_plan_schema()},
+    }
+
+def finance_response_format() -> Dict[str, Any]:
+    """response_format payload for chat.completions.create (cached; treat as read-only)."""
+    return _response_format()
@@ -0,0 +1,47 @@
+import string
+from typing import List, Optional, Tuple
+from pydantic import BaseModel, ConfigDict, Field
+
+class ModuleSpec(BaseModel):
+    """One modules/module{ID}.yaml. Unknown keys are errors, not silently dropped."""
+    model_config = ConfigDict(extra="forbid", strict=True)
+
+    id: int
+    title: str = Field(min_length=1)
+    objective: str = Field(min_length=1)
+    audit_context: str = Field(min_length=1)
+    system_message: str = ""
+    instructions: List[str] = Field(default_factory=list)
+    sample_note: str = ""
+    preferred_height: int = Field(default=175, ge=68, le=1200)
+    checks: List[str] = Field(default_factory=list)
+    guidance: str = ""
+    gaap_refs: List[str] = Field(default_factory=list)
+
+# Placeholders build_finance_prompt() fills in prompts/finance/clarifier/user/tmpl.md
+FINANCE_TEMPLATE_FIELDS = frozenset({"user_text", "income", "goals", "debts", "time_horizon", "constraints"})
+
+def validate_module(module_id: int, data: dict) -> Tuple[Optional[ModuleSpec], List[str]]:
+    """Return (spec, errors); errors are 'field: message' strings."""
+    from pydantic import ValidationError
+
+    try:
+        spec = ModuleSpec.model_validate(data)
+    except ValidationError as e:
+        return None, [f"{'.'.join(str(p) for p in err['loc']) or '<root>'}: {err['msg']}" for err in e.errors()]
+    if spec.id != module_id:
+        return None, [f"id: {spec.id} does not match the file name (module{module_id}.yaml)"]
+    return spec, []
+
+def validate_prompt(dotted: str, text: str) -> List[str]:
+    """Prompt files must be non-empty; templates may only use the known placeholders."""
+    if not text.strip():
+        return ["prompt is empty"]
+    if not dotted.endswith(".tmpl"):
+        return []
+    try:
+        fields = {name for _, name, _, _ in string.Formatter().parse(text) if name is not None}
+    except ValueError as e:
+        return [f"template does not parse: {e}"]
+    unknown = sorted(fields - FINANCE_TEMPLATE_FIELDS)
+    return [f"unknown placeholder {{{name}}}" for name in unknown]
@@ -0,0 +1,219 @@
+# utils/similarity.py
+from __future__ import annotations
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Optional, Set, Tuple
+
+if TYPE_CHECKING:
+    import numpy as np
+
+from config import env
+
+# ✅ Similarity knobs (override via env vars)
+SIMILARITY_THRESHOLD = float(env("SIMILARITY_THRESHOLD", "0.8"))  # estimated Jaccard over character 5-grams
+MAX_ENTRIES          = int(env("SIMILARITY_MAX_ENTRIES", "2000"))   # across all modules
+DB_PATH              = env("SIMILARITY_DB", "")                     # e.g. ".cache/similarity.sqlite3"; empty = memory only
+
+# MinHash with LSH banding: 64 hashes in 16 bands of 4 rows. A note sharing
+# ~80% of its shingles with a stored one lands in a common bucket with
+# probability > 0.999; candidates are then scored on the full signature.
+# Character shingles keep one edited word from knocking out whole word n-grams.
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE = 5
+
+_PRIME = (1 << 31) - 1
+
+@lru_cache(maxsize=1)
+def _perms() -> Tuple["np.ndarray", "np.ndarray"]:
+    # numpy is imported on first use, not when the audit page imports this module
+    import numpy as np
+
+    rng = np.random.default_rng(20240601)  # fixed seed: signatures must match across restarts
+    return (rng.integers(1, _PRIME, NUM_PERM, dtype=np.uint64),
+            rng.integers(0, _PRIME, NUM_PERM, dtype=np.uint64))
+
+_SPACE = re.compile(r"\s+")
+
+def normalize(note: str) -> str:
+    return _SPACE.sub(" ", note.lower()).strip()
+
+def signature(note: str) -> "np.ndarray":
+    """MinHash signature (uint32[NUM_PERM]) of the note's character shingles."""
+    import numpy as np
+
+    a, b = _perms()
+    text = normalize(note)
+    shingles = {text[i:i + SHINGLE] for i in range(max(1, len(text) - SHINGLE + 1))}
+    hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) & 0x7FFFFFFF for s in shingles),
+                         dtype=np.uint64, count=len(shingles))
+    # (a*h + b) mod p for every (permutation, shingle) pair; both factors < 2^31, so no overflow
+    return ((a[:, None] * hashes[None, :] + b[:, None]) % np.uint64(_PRIME)).min(axis=1).astype(np.uint32)
+
+def _bands(sig: "np.ndarray") -> List[bytes]:
+    return [sig[i * ROWS:(i + 1) * ROWS].tobytes() for i in range(BANDS)]
+
+def note_key(module_id: int, note: str, version: str = "") -> str:
+    return hashlib.sha256(f"{module_id}\x00{version}\x00{normalize(note)}".encode("utf-8")).hexdigest()
+
+@dataclass(frozen=True)
+class Match:
+    score: float          # estimated Jaccard similarity, 0..1
+    review: str
+    note_preview: str
+    created: float
+    key: str
+
+class SimilarityIndex:
+    """
+    Per-module near-duplicate index of reviewed notes.
+
+    Entries are scoped by (module, version): `version` is the module's prompt
+    hash (utils.prompt_builder.prompt_version), so reviews written against an
+    older module YAML or prompt are never served after it changes.
+
+    - memory: LRU bounded by `max_entries`; LSH buckets keyed by (module, version, band, band bytes)
+    - disk:   optional SQLite file, loaded at start and written on every add
+    """
+
+    def __init__(self, max_entries: int = MAX_ENTRIES, threshold: float = SIMILARITY_THRESHOLD,
+                 disk_path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[int, str, np.ndarray, str, str, float]]" = OrderedDict()
+        self._buckets: Dict[Tuple[int, str, int, bytes], Set[str]] = {}
+        self._stats = {"lookups": 0, "hits": 0, "misses": 0, "adds": 0, "evictions": 0, "lookup_us_total": 0.0}
+        self._db: Optional[sqlite3.Connection] = None
+        if disk_path:
+            Path(disk_path).parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(disk_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS notes ("
+                " key TEXT PRIMARY KEY, module INTEGER NOT NULL, created REAL NOT NULL,"
+                " sig BLOB NOT NULL, preview TEXT NOT NULL, review TEXT NOT NULL,"
+                " version TEXT NOT NULL DEFAULT '')"
+            )
+            columns = {row[1] for row in self._db.execute("PRAGMA table_info(notes)")}
+            if "version" not in columns:
+                # Files from before versioned keys: their rows keep version '' and never match again
+                self._db.execute("ALTER TABLE notes ADD COLUMN version TEXT NOT NULL DEFAULT ''")
+            self._db.commit()
+            rows = self._db.execute(
+                "SELECT key, module, version, created, sig, preview, review FROM notes ORDER BY created DESC LIMIT ?",
+                (self.max_entries,),
+            ).fetchall()
+            if rows:
+                import numpy as np
+
+                for key, module, version, created, sig, preview, review in reversed(rows):
+                    self._insert(key, int(module), version, np.frombuffer(sig, dtype=np.uint32).copy(),
+                                 preview, review, created)
+
+    # ---------- memory tier ----------
+    def _insert(self, key: str, module_id: int, version: str, sig: "np.ndarray", preview: str, review: str,
+                created: float) -> None:
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (module_id, version, sig, preview, review, created)
+        for i, band in enumerate(_bands(sig)):
+            self._buckets.setdefault((module_id, version, i, band), set()).add(key)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+            self._stats["evictions"] += 1
+
+    def _remove(self, key: str) -> None:
+        module_id, version, sig, _, _, _ = self._entries.pop(key)
+        for i, band in enumerate(_bands(sig)):
+            bucket = self._buckets.get((module_id, version, i, band))
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._buckets[(module_id, version, i, band)]
+
+    # ---------- public API ----------
+    def lookup(self, module_id: int, note: str, version: str = "",
+               threshold: Optional[float] = None) -> Optional[Match]:
+        """Best prior review for a near-duplicate of `note` under this module version, or None."""
+        import numpy as np
+
+        t0 = time.perf_counter()
+        threshold = self.threshold if threshold is None else threshold
+        sig = signature(note)
+        best: Optional[Match] = None
+        with self._lock:
+            candidates: Set[str] = set()
+            for i, band in enumerate(_bands(sig)):
+                candidates |= self._buckets.get((int(module_id), version, i, band), set())
+            for key in candidates:
+                _, _, other, preview, review, created = self._entries[key]
+                score = float(np.count_nonzero(other == sig)) / NUM_PERM
+                if score >= threshold and (best is None or score > best.score):
+                    best = Match(score, review, preview, created, key)
+            if best is not None:
+                self._entries.move_to_end(best.key)
+            self._stats["lookups"] += 1
+            self._stats["hits" if best else "misses"] += 1
+            self._stats["lookup_us_total"] += (time.perf_counter() - t0) * 1e6
+        return best
+
+    def add(self, module_id: int, note: str, review: str, version: str = "") -> None:
+        if not note.strip() or not review.strip():
+            return
+        key = note_key(module_id, note, version)
+        sig = signature(note)
+        preview = " ".join(note.split())[:200]
+        created = time.time()
+        with self._lock:
+            self._insert(key, int(module_id), version, sig, preview, review, created)
+            self._stats["adds"] += 1
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO notes (key, module, version, created, sig, preview, review)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (key, int(module_id), version, created, sig.tobytes(), preview, review),
+                )
+                self._db.execute(
+                    "DELETE FROM notes WHERE key NOT IN (SELECT key FROM notes ORDER BY created DESC LIMIT ?)",
+                    (self.max_entries,),
+                )
+                self._db.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM notes")
+                self._db.commit()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self._stats["lookups"]
+            return {
+                **{k: v for k, v in self._stats.items() if k != "lookup_us_total"},
+                "entries": len(self._entries),
+                "buckets": len(self._buckets),
+                "mean_lookup_us": round(self._stats["lookup_us_total"] / lookups, 1) if lookups else 0.0,
+                "disk_enabled": self._db is not None,
+            }
+
+_INDEX: Optional[SimilarityIndex] = None
+_INDEX_LOCK = threading.Lock()
+
+def get_index() -> SimilarityIndex:
+    """Process-wide index (persisted when SIMILARITY_DB is set)."""
+    global _INDEX
+    with _INDEX_LOCK:
+        if _INDEX is None:
+            _INDEX = SimilarityIndex(disk_path=DB_PATH or None)
+        return _INDEX
@@ -0,0 +1,132 @@
+# utils/singleflight.py
+from __future__ import annotations
+import asyncio
+import threading
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from utils.metrics import REGISTRY
+
+class Flight:
+    """
+    One in-flight upstream call shared by every identical concurrent request.
+
+    Unary calls publish a single result; streamed calls append deltas that
+    followers replay from the start and then tail until finish().
+    """
+
+    def __init__(self, key: Tuple[str, str]):
+        self.key = key
+        self.waiters = 0
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.chunks: List[str] = []
+        self.done = False
+        self._cond = threading.Condition()
+
+    # ---------- leader side ----------
+    def push(self, delta: str) -> None:
+        with self._cond:
+            self.chunks.append(delta)
+            self._cond.notify_all()
+
+    def finish(self, result: Any = None, error: Optional[BaseException] = None) -> None:
+        with self._cond:
+            self.result, self.error, self.done = result, error, True
+            self._cond.notify_all()
+
+    # ---------- follower side ----------
+    def wait(self) -> Any:
+        with self._cond:
+            self._cond.wait_for(lambda: self.done)
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+    def follow(self) -> Iterator[str]:
+        """Replay the deltas pushed so far, then yield new ones as they arrive."""
+        i = 0
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self.done or i < len(self.chunks))
+                pending = self.chunks[i:]
+                finished = self.done
+            for delta in pending:
+                yield delta
+            i += len(pending)
+            if finished and i >= len(self.chunks):
+                break
+        if self.error is not None:
+            raise self.error
+
+class SingleFlight:
+    """
+    Process-wide registry of in-flight calls keyed by (kind, request hash).
+
+    Streamlit runs every session in its own thread, so waiting uses threading
+    primitives; asyncio callers wait in a worker thread via asyncio.to_thread.
+    A flight leaves the registry as soon as it finishes: later identical
+    requests are answered by the response cache instead.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights: Dict[Tuple[str, str], Flight] = {}
+        self._stats = {"leaders": 0, "coalesced": 0}
+
+    def join(self, kind: str, key: str) -> Tuple[Flight, bool]:
+        """Return (flight, is_leader). The leader must call finish() (see release())."""
+        with self._lock:
+            flight = self._flights.get((kind, key))
+            if flight is not None:
+                flight.waiters += 1
+                self._stats["coalesced"] += 1
+                leader = False
+            else:
+                flight = self._flights[(kind, key)] = Flight((kind, key))
+                self._stats["leaders"] += 1
+                leader = True
+        REGISTRY.inc("clarity_singleflight_total", help="Upstream calls by single-flight role",
+                     kind=kind, role="leader" if leader else "coalesced")
+        return flight, leader
+
+    def release(self, flight: Flight, result: Any = None, error: Optional[BaseException] = None) -> None:
+        """Publish the outcome to every waiter; the leader calls this exactly once."""
+        with self._lock:
+            if self._flights.get(flight.key) is flight:
+                del self._flights[flight.key]
+        flight.finish(result, error)
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """Run fn() once for all concurrent callers with this key; returns (result, coalesced)."""
+        flight, leader = self.join("unary", key)
+        if not leader:
+            return flight.wait(), True
+        try:
+            result = fn()
+        except BaseException as e:
+            self.release(flight, error=e)
+            raise
+        self.release(flight, result)
+        return result, False
+
+    async def ado(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """asyncio flavour of do(); fn returns an awaitable."""
+        flight, leader = self.join("unary", key)
+        if not leader:
+            return await asyncio.to_thread(flight.wait), True
+        try:
+            result = await fn()
+        except BaseException as e:
+            self.release(flight, error=e)
+            raise
+        self.release(flight, result)
+        return result, False
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {**self._stats, "in_flight": len(self._flights)}
+
+_FLIGHTS = SingleFlight()
+
+def get_singleflight() -> SingleFlight:
+    return _FLIGHTS
@@ -0,0 +1,214 @@
+# utils/startup.py
+"""
+Cold-start helpers.
+
+Page scripts call boot() first thing and first_render() last thing. boot()
+starts one background thread per process that imports the heavy
+dependencies (openai, httpx, pydantic, yaml), maps the compiled module
+bundle (utils.bundle) and pulls every modules/*.yaml and prompts/** file
+through load_module, so the first review does not pay for them. With
+DEMO_AUTO_REFRESH=1 the same thread then regenerates any stale precomputed
+demo results (utils.demos); by default the build step does that. Timings
+land in a structured profile that is appended to CLARITY_STARTUP_PROFILE
+(JSONL, one line per process) once the preload has finished and the first
+page has rendered.
+"""
+from __future__ import annotations
+import importlib
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from config import env
+
+# ✅ Startup knobs (override via env vars)
+PRELOAD_ENABLED = env("CLARITY_PRELOAD", "1") == "1"
+PROFILE_PATH    = env("CLARITY_STARTUP_PROFILE", ".cache/startup_profile.jsonl")  # empty = don't write
+
+# Imported in the background, in this order (cheapest first)
+HEAVY_IMPORTS = ("yaml", "httpx", "pydantic", "openai", "utils.openai_client", "utils.schema_finance")
+
+_T0 = time.perf_counter()  # first import of this module ≈ first script run in the process
+_LOCK = threading.Lock()
+_BOOTED = False
+_PRELOADED = threading.Event()
+_WRITTEN = False
+_PROFILE: Dict[str, Any] = {
+    "boot_id": uuid.uuid4().hex[:12],
+    "pid": os.getpid(),
+    "started_at": time.time(),
+    "python": sys.version.split()[0],
+    "preload_enabled": PRELOAD_ENABLED,
+    "imports_ms": {},
+    "preload_ms": {},
+    "preload_errors": {},
+    "preload_total_ms": None,
+    "preload_done_ms": None,
+    "first_render_ms": {},
+}
+
+def _ms(seconds: float) -> float:
+    return round(seconds * 1000.0, 2)
+
+# ---------- background preload ----------
+def _put(section: str, key: str, value: Any) -> None:
+    # The preload thread writes while pages read/serialize the profile
+    with _LOCK:
+        _PROFILE[section][key] = value
+
+def _import_all() -> None:
+    for name in HEAVY_IMPORTS:
+        if name in sys.modules:
+            _put("imports_ms", name, 0.0)  # already pulled in by the page
+            continue
+        t0 = time.perf_counter()
+        try:
+            importlib.import_module(name)
+        except Exception as e:
+            _put("preload_errors", name, f"{type(e).__name__}: {e}")
+        _put("imports_ms", name, _ms(time.perf_counter() - t0))
+
+def _preload_assets() -> None:
+    from utils.bundle import get_bundle
+    from utils.module_loader import MODULE_DIR, PROMPT_EXTS, PROMPTS_DIR, load_module
+
+    t0 = time.perf_counter()
+    bundle = get_bundle()  # map the compiled bundle first so the loads below are served from it
+    if bundle is not None and bundle.error and Path(bundle.path).exists():
+        _put("preload_errors", str(bundle.path), bundle.error)
+    _put("preload_ms", "bundle", _ms(time.perf_counter() - t0))
+
+    for path in sorted(MODULE_DIR.glob("module*.yaml")):
+        module_id = path.stem[len("module"):]
+        if not module_id.isdigit():
+            continue
+        t0 = time.perf_counter()
+        try:
+            load_module(int(module_id))
+        except Exception as e:
+            _put("preload_errors", str(path), f"{type(e).__name__}: {e}")
+        _put("preload_ms", f"modules/{path.name}", _ms(time.perf_counter() - t0))
+
+    for path in sorted(PROMPTS_DIR.rglob("*")):
+        if not path.is_file() or path.suffix not in PROMPT_EXTS:
+            continue
+        rel = path.relative_to(PROMPTS_DIR)
+        dotted = "prompts." + ".".join(rel.with_suffix("").parts)  # same name prompt_builder uses
+        t0 = time.perf_counter()
+        try:
+            load_module(dotted)
+        except FileNotFoundError:
+            path.read_bytes()  # not addressable by dotted name; still warm the page cache
+        except Exception as e:
+            _put("preload_errors", str(rel), f"{type(e).__name__}: {e}")
+        _put("preload_ms", f"prompts/{rel.as_posix()}", _ms(time.perf_counter() - t0))
+
+def _compile_scanners() -> None:
+    t0 = time.perf_counter()
+    try:
+        from utils.prescan import get_scanner
+
+        get_scanner()
+    except Exception as e:
+        _put("preload_errors", "prescan", f"{type(e).__name__}: {e}")
+    _put("preload_ms", "prescan", _ms(time.perf_counter() - t0))
+
+def _refresh_demos() -> None:
+    # Model calls: runs after the preload is marked done so nothing waits on it
+    from utils import demos
+
+    if not demos.AUTO_REFRESH or not all(
+        os.environ.get(k) for k in ("AZURE_OPENAI_KEY", "AZURE_OPENAI_ENDPOINT", "AZURE_OPENAI_API_VERSION", "AZURE_OPENAI_DEPLOYMENT")
+    ):
+        return
+    try:
+        if not demos.stale():
+            return
+        from utils.openai_client import get_client
+
+        client = get_client(
+            api_key=os.environ["AZURE_OPENAI_KEY"],
+            api_version=os.environ["AZURE_OPENAI_API_VERSION"],
+            endpoint=os.environ["AZURE_OPENAI_ENDPOINT"],
+        )
+        report = demos.refresh(client, os.environ["AZURE_OPENAI_DEPLOYMENT"])
+    except Exception as e:  # demos fall back to live calls
+        _put("preload_errors", "demos", f"{type(e).__name__}: {e}")
+        return
+    for name, problem in report["failed"].items():
+        _put("preload_errors", f"demos/{name}", problem)
+
+def _preload() -> None:
+    t0 = time.perf_counter()
+    try:
+        _import_all()
+        _preload_assets()
+        _compile_scanners()
+    finally:
+        with _LOCK:
+            _PROFILE["preload_total_ms"] = _ms(time.perf_counter() - t0)
+            _PROFILE["preload_done_ms"] = _ms(time.perf_counter() - _T0)
+        _PRELOADED.set()
+        _maybe_write()
+    _refresh_demos()
+
+# ---------- public API ----------
+def boot() -> None:
+    """Start the background preload once per process (no-op afterwards or with CLARITY_PRELOAD=0)."""
+    global _BOOTED
+    with _LOCK:
+        if _BOOTED:
+            return
+        _BOOTED = True
+        if not PRELOAD_ENABLED:
+            _PRELOADED.set()
+            return
+        threading.Thread(target=_preload, name="clarity-preload", daemon=True).start()
+
+def first_render(page: str) -> None:
+    """Record time-to-first-render for `page` (first full script run in this process only)."""
+    with _LOCK:
+        if page in _PROFILE["first_render_ms"]:
+            return
+        _PROFILE["first_render_ms"][page] = _ms(time.perf_counter() - _T0)
+    _maybe_write()
+
+def wait_for_preload(timeout: Optional[float] = None) -> bool:
+    return _PRELOADED.wait(timeout)
+
+def startup_profile() -> Dict[str, Any]:
+    with _LOCK:
+        return json.loads(json.dumps(_PROFILE))
+
+def startup_stats() -> Dict[str, Any]:
+    """Flat numeric view for the metrics exporter."""
+    with _LOCK:
+        renders = _PROFILE["first_render_ms"]
+        return {
+            "preload_done": int(_PRELOADED.is_set()),
+            "preload_ms": _PROFILE["preload_total_ms"] or 0.0,
+            "imports_ms": round(sum(_PROFILE["imports_ms"].values()), 2),
+            "first_render_ms": min(renders.values()) if renders else 0.0,
+            "preload_errors": len(_PROFILE["preload_errors"]),
+        }
+
+def _maybe_write() -> None:
+    """Append the profile once both the preload and a first render have happened."""
+    global _WRITTEN
+    with _LOCK:
+        if _WRITTEN or not PROFILE_PATH or not _PRELOADED.is_set() or not _PROFILE["first_render_ms"]:
+            return
+        _WRITTEN = True
+        line = json.dumps(_PROFILE, sort_keys=True)
+    try:
+        path = Path(PROFILE_PATH)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with path.open("a", encoding="utf-8") as f:
+            f.write(line + "\n")
+    except OSError:
+        pass  # profiling must never break the app